@@ -0,0 +1,272 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import parse
+from Rule import Node, Occurrences
+
+
+class KnowledgeBase:
+    """
+    Owns a compiled rule base: the rule DAG, the initial facts and the queries of a file.
+    A KnowledgeBase is only modified while it is built (by parse.validate_file); afterwards it is a read-only description
+    of the rules, and each solve happens in its own Evaluation, so the same KnowledgeBase can be solved from many threads
+    at once, and several rule bases can live in the same process. Code that changes rules later works on a copy().
+    Attributes:
+        nodes (List[Node]): Every node of the rule DAG, node.index being its position in this list.
+        node_table (Dict[tuple, Node]): The hash-consing table, from (name, left, right) to the shared node.
+        variables (Dict[str, Node]): The leaf node of every variable.
+        rules (Dict[str, List[Node]]): The roots of the antecedents of the rules concluding each variable.
+        equivalences (List[Tuple[Tuple[str, ...], Node]]): The conclusions and the antecedent of each rule written with
+                                                           '<=>', which is also in rules in its '=>' direction.
+        first_reads (Dict[str, tuple]): The first read of each variable with rules that no line above its rules
+                                        mentioned, which the original parser made the first rule of the variable (see
+                                        parse.rule_first_reads); only the solve of cyclic rules reads it.
+        facts (Set[str]): The initial facts.
+        queries (List[str]): The queried variables, in the order of the file.
+        warnings (List[str]): The warnings raised while building the rule base.
+        revision (int): The number of times a rule was added or removed, so that what is derived from the rules can
+                        tell when it is out of date.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty rule base.
+        """
+        self.nodes: List[Node] = []
+        self.node_table: Dict[tuple, Node] = {}
+        self.variables: Dict[str, Node] = {}
+        self.rules: Dict[str, List[Node]] = {}
+        self.equivalences: List[Tuple[Tuple[str, ...], Node]] = []
+        self.first_reads: Dict[str, tuple] = {}
+        self.facts: Set[str] = set()
+        self.queries: List[str] = []
+        self.warnings: List[str] = []
+        self.revision = 0
+
+    @classmethod
+    def from_content(cls, parsed_content) -> "KnowledgeBase":
+        """
+        Builds a rule base from the content of a file, as returned by parse.read_file.
+        Args:    parsed_content (list): The (type, content) tuples of the lines of the file.
+        Returns: KnowledgeBase: The compiled rule base.
+        Raises:  parse.ParseError: If the content is not a valid rule base.
+        """
+        knowledge_base = cls()
+        parse.validate_file(parsed_content, knowledge_base)
+        return knowledge_base
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "KnowledgeBase":
+        """
+        Builds a rule base from the lines of a file, compiled one at a time as they are read.
+        Args:    lines (Iterable[str]): The lines, such as an open file.
+        Returns: KnowledgeBase: The compiled rule base.
+        Raises:  parse.ParseError: If the content is not a valid rule base.
+        """
+        knowledge_base = cls()
+        parse.load_lines(lines, knowledge_base)
+        return knowledge_base
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "KnowledgeBase":
+        """
+        Builds a rule base from a file, streamed line by line so the text of the file is never held in memory.
+        Args:    file_path (str): Path to the file.
+        Returns: KnowledgeBase: The compiled rule base.
+        Raises:  parse.ParseError: If the content is not a valid rule base.
+                 OSError: If the file cannot be read.
+        """
+        with open(file_path, "r") as file:
+            return cls.from_lines(file)
+
+    @classmethod
+    def from_slice(cls, file_path: str, queries: Optional[Iterable[str]] = None) -> "KnowledgeBase":
+        """
+        Builds a rule base from a file with only the rules the queries depend on; the rest of the file is validated
+        but not compiled.
+        Args:    file_path (str): Path to the file.
+                 queries (Iterable[str], optional): The variables to keep the rules of. Defaults to the queries of the file.
+        Returns: KnowledgeBase: The compiled slice, with every fact and query of the file.
+        Raises:  parse.ParseError: If the content is not a valid rule base.
+                 OSError: If the file cannot be read.
+        """
+        knowledge_base = cls()
+        with open(file_path, "r") as file:
+            parse.load_slice(file, knowledge_base, queries)
+        return knowledge_base
+
+    def intern_node(self, name: str, left: Optional[Node] = None, right: Optional[Node] = None) -> Node:
+        """
+        Returns the unique node of the rule DAG for the given operator or variable and its children.
+        Structurally identical subexpressions (same name, same children) are hash-consed into a single shared Node,
+        so an antecedent common to several rules is stored and evaluated only once.
+        Args:    name (str): The operator or variable name of the node.
+                 left (Node, optional): The left child, already interned. Defaults to None.
+                 right (Node, optional): The right child, already interned. Defaults to None.
+        Returns: Node: The shared node for this subexpression.
+        """
+        key = (name, left, right)
+        node = self.node_table.get(key)
+        if node is None:
+            node = Node(name, len(self.nodes))
+            node.left = left
+            node.right = right
+            self.node_table[key] = node
+            self.nodes.append(node)
+            if node.type == "VARIABLE":
+                self.variables[name] = node
+        return node
+
+    def add_rule(self, conclusion: str, antecedent: Node, position: Optional[int] = None):
+        """
+        Adds a rule to the rule base.
+        Args:    conclusion (str): The concluded variable, possibly negated ("!V"); negated conclusions are kept, but only
+                                   the propagation engine reads them.
+                 antecedent (Node): The root of the antecedent of the rule.
+                 position (int, optional): Its index among the rules of the conclusion. Defaults to after them.
+        """
+        self.intern_node(conclusion.lstrip("!"))
+        rules = self.rules.setdefault(conclusion, [])
+        if position is None:
+            rules.append(antecedent)
+        else:
+            rules.insert(position, antecedent)
+        self.revision += 1
+
+    def add_equivalence(self, conclusions: Tuple[str, ...], antecedent: Node):
+        """
+        Records that a rule was written with '<=>', so that its conclusions also imply its antecedent. Each conclusion
+        must be added with add_rule as well; the other engines only read that direction.
+        Args:    conclusions (Tuple[str, ...]): The concluded variables of the rule, possibly negated.
+                 antecedent (Node): The root of the antecedent of the rule.
+        """
+        self.equivalences.append((conclusions, antecedent))
+
+    def remove_rule(self, conclusion: str, antecedent: Node, position: Optional[int] = None):
+        """
+        Removes a rule from the rule base. Since the nodes are interned, compiling the same rule again gives the same antecedent.
+        Args:    conclusion (str): The concluded variable.
+                 antecedent (Node): The root of the antecedent of the rule.
+                 position (int, optional): Its index among the rules of the conclusion, which matters when the same
+                                           rule is written twice. Defaults to the first one.
+        Raises:  ValueError: If the rule base has no such rule.
+        """
+        rules = self.rules.get(conclusion, [])
+        if position is None and antecedent in rules:
+            position = rules.index(antecedent)
+        if position is None or not 0 <= position < len(rules) or rules[position] is not antecedent:
+            raise ValueError(f"Error: No such rule for '{conclusion}'.")
+        del rules[position]
+        if not self.rules[conclusion]:
+            del self.rules[conclusion]
+        self.revision += 1
+
+    def remove_equivalence(self, conclusions: Tuple[str, ...], antecedent: Node):
+        """
+        Forgets the reverse direction of a rule written with '<=>'; its conclusions are removed with remove_rule.
+        Args:    conclusions (Tuple[str, ...]): The concluded variables of the rule.
+                 antecedent (Node): The root of the antecedent of the rule.
+        Raises:  ValueError: If the rule base has no such equivalence.
+        """
+        if (conclusions, antecedent) not in self.equivalences:
+            raise ValueError(f"Error: No such equivalence for '{' + '.join(conclusions)}'.")
+        self.equivalences.remove((conclusions, antecedent))
+
+    def add_fact(self, fact: str):
+        """
+        Adds an initial fact to the rule base.
+        Args:    fact (str): The variable that is initially true.
+        """
+        self.intern_node(fact)
+        self.facts.add(fact)
+
+    def add_query(self, query: str):
+        """
+        Adds a query to the rule base.
+        Args:    query (str): The queried variable.
+        """
+        self.intern_node(query)
+        self.queries.append(query)
+
+    def copy(self) -> "KnowledgeBase":
+        """
+        Returns a rule base that can be modified without affecting this one. The nodes, which are never modified, are shared.
+        Returns: KnowledgeBase: The copy.
+        """
+        copy = KnowledgeBase()
+        copy.nodes = list(self.nodes)
+        copy.node_table = dict(self.node_table)
+        copy.variables = dict(self.variables)
+        copy.rules = {variable: list(roots) for variable, roots in self.rules.items()}
+        copy.equivalences = list(self.equivalences)
+        copy.first_reads = dict(self.first_reads)
+        copy.facts = set(self.facts)
+        copy.queries = list(self.queries)
+        copy.warnings = list(self.warnings)
+        return copy
+
+    def evaluation(self, facts: Optional[Iterable[str]] = None) -> "Evaluation":
+        """
+        Starts a new evaluation of the rule base.
+        Args:    facts (Iterable[str], optional): The initial facts, replacing the ones of the file. Defaults to None.
+        Returns: Evaluation: The new evaluation.
+        """
+        return Evaluation(self, self.facts if facts is None else facts)
+
+    def solve(self, queries: Optional[Iterable[str]] = None, facts: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """
+        Solves queries with backward chaining, in a new evaluation.
+        Args:    queries (Iterable[str], optional): The queried variables. Defaults to the queries of the file.
+                 facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+        Returns: Dict[str, bool]: The value of each query, in order.
+        """
+        evaluation = self.evaluation(facts)
+        return {query: evaluation.solve(query) for query in (self.queries if queries is None else queries)}
+
+
+class Evaluation:
+    """
+    Holds the state of one solve of a KnowledgeBase: the value found for each node so far, which the nodes themselves
+    no longer carry. An evaluation is meant to be used by a single thread; concurrent solves use one evaluation each.
+    Attributes:
+        knowledge_base (KnowledgeBase): The solved rule base.
+        rules (Dict[str, List[Node]]): The rules of each variable, shared with the rule base.
+        first_reads (Dict[str, tuple]): The key of the first read of each variable, shared with the rule base.
+        facts (Set[str]): The initial facts of this evaluation.
+        values (list): The value of each node by index: None while unsolved, Rule.BEING_SOLVED for a variable whose rules
+                       are being solved, then True or False.
+        occurrences (Occurrences): The values found for each read of the variables of a cycle, see Node.solve_occurrences.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase, facts: Iterable[str]):
+        """
+        Initializes an evaluation where only the initial facts are known.
+        Args:    knowledge_base (KnowledgeBase): The rule base to solve.
+                 facts (Iterable[str]): The initial facts. Those unknown to the rule base are only used if queried.
+        """
+        self.knowledge_base = knowledge_base
+        self.rules = knowledge_base.rules
+        self.first_reads = knowledge_base.first_reads
+        self.facts = set(facts)
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every value found, keeping only the initial facts.
+        """
+        knowledge_base = self.knowledge_base
+        self.values = [None] * len(knowledge_base.nodes)
+        self.occurrences = Occurrences()
+        for fact in self.facts:
+            node = knowledge_base.variables.get(fact)
+            if node is not None:
+                self.values[node.index] = True
+
+    def solve(self, variable: str) -> bool:
+        """
+        Solves a variable with backward chaining.
+        Args:    variable (str): The variable to solve.
+        Returns: bool: The value of the variable; False if the rule base knows nothing about it.
+        """
+        node = self.knowledge_base.variables.get(variable)
+        if node is None:
+            return variable in self.facts
+        return node.solve(self)
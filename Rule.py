@@ -1,134 +1,355 @@
-import parse
-from typing import List, Set
+from typing import Dict, Optional, Set
+
+# Value stored for a variable while its rules are being solved, used to detect circular references
+BEING_SOLVED = object()
+
+# Names of the operator nodes; every other name is a variable
+OPERATORS = frozenset("+|^!")
 
 class Node:
     """
     Represents a node in a logical tree, which can be either a variable or an operator.
+    Nodes are interned by a KnowledgeBase and never modified once built: the values found while solving belong to an
+    Evaluation, in a list indexed by the node's index, so one rule base can be solved by many evaluations at once.
     Attributes:
         name (str): The name of the node, which is either a logical operator or a variable.
-        value (bool): The logical value of the node.
-        hasBeenSolved (bool): Indicates whether the node's value has been resolved.
+        index (int): The position of the node in the KnowledgeBase, and of its value in an Evaluation.
         left (Node): The left child node in the tree.
         right (Node): The right child node in the tree.
         type (str): The type of the node, either 'OPERATOR' or 'VARIABLE'.
-        isBeingSolved (bool): Indicates if the node is currently being resolved, used to detect circular references.
     Constants:
         TYPES (Set[str]): A set containing the possible types of nodes - 'OPERATOR' and 'VARIABLE'.
     """
+    __slots__ = ("name", "index", "left", "right", "type")
+
     TYPES: Set[str] = {
             "OPERATOR",
             "VARIABLE"
             }
 
-    def __init__(self, name: str, value: bool = False):
+    def __init__(self, name: str, index: int = 0):
         """
         Initializes a new instance of the Node class.
         Args: name (str): The name of the node.
-              value (bool, optional): The initial logical value of the node. Defaults to False.
+              index (int, optional): The position of the node in its KnowledgeBase. Defaults to 0.
         """
         self.name = name
-        self.value = value
-        self.hasBeenSolved = value
+        self.index = index
         self.left = None
         self.right = None
-        self.type = "OPERATOR" if name in "+|^!" else "VARIABLE"
-        self.isBeingSolved = False
+        self.type = "OPERATOR" if name in OPERATORS else "VARIABLE"
+
+    def solve(self, evaluation, tracer=None) -> bool:
+        """
+        Solves the logical value of the node and its descendants in a logical tree.
+
+        The rule DAG shares every subexpression, while the original solver built a tree per rule and stored the value of
+        each variable in every leaf of those trees. Both give the same values as long as no variable is reached while it
+        is being solved, and then walk stores the value of every node once. When the walk meets a cycle, the node is
+        solved again by solve_occurrences, which keeps the value of a variable for each place it is read in, like the
+        leaves of the original trees did, so cyclic rules give the answers they always gave.
+
+        Args:
+            evaluation (Evaluation): The evaluation holding the rules and the values found so far, which are updated.
+            tracer (optional): The object whose enter and leave methods follow the walk, see walk. Defaults to None.
+
+        Returns:
+            bool: The resolved logical value of the node.
+        """
+        result = None
+        if evaluation.values[self.index] is not BEING_SOLVED:
+            result = self.walk(evaluation, tracer)
+        return self.solve_occurrences(evaluation, tracer) if result is None else result
 
-    def solve(self, explain=False):
+    def walk(self, evaluation, tracer=None) -> Optional[bool]:
         """
-        Recursively solves the logical value of the node and its descendants in a logical tree.
+        Solves the node as long as no variable is reached while it is being solved, storing the value of every node.
 
         This method is responsible for evaluating the logical value of the node based on its type (either 'OPERATOR' or 'VARIABLE')
-        and its children, if any. It uses a recursive approach to traverse the tree structure and compute the logical value.
-        If the node is a 'VARIABLE', it checks if its value has already been resolved and returns it. If not, it recursively
-        evaluates its value based on the rules associated with the variable.
+        and its children, if any. The traversal is a depth-first walk driven by an explicit stack instead of recursion, so a
+        long implication chain (A => B, B => C, ...) is bounded by memory rather than by the recursion limit.
+        If the node is a 'VARIABLE', it checks if its value has already been resolved and returns it. If not, it evaluates
+        its value based on the rules associated with the variable.
         If the node is an 'OPERATOR', it evaluates the logical operation based on its operator type and the values of its
         left and right children.
 
+        The stack is made of three parallel lists: the nodes being solved, the position of their next child (a rule of a
+        variable, or an operand of an operator) and the value accumulated from the children returned so far. Only existing
+        nodes, small integers and booleans are pushed, so this path allocates nothing per node.
+        The walk gives up as soon as it reaches a variable being solved, or left to solve_occurrences: the variables it
+        is solving keep the value Rule.BEING_SOLVED, which sends every later walk reaching them to solve_occurrences too.
+        The values stored before were found without any circular reference, so they hold wherever the nodes are read.
+
+        A tracer follows the walk without changing it: its enter method is called with every node reached and the value
+        it had then (None when the node is solved now, Rule.BEING_SOLVED for a circular reference), and its leave method
+        with every node solved, once its value is stored, or with Rule.BEING_SOLVED for every node being solved when
+        the walk gives up. Explanations (proof.Prover) and counters (stats.Profiler) are gathered this way, so they always
+        describe the walk of an ordinary solve.
+
+        Args:
+            evaluation (Evaluation): The evaluation holding the rules and the values found so far, which are updated.
+            tracer (optional): The object whose enter and leave methods follow the walk. Defaults to None.
+
+        Returns:
+            Optional[bool]: The resolved logical value of the node, or None if the walk met a cycle.
+        """
+        rules = evaluation.rules
+        values = evaluation.values
+        nodes, indexes, accumulated = [], [], []
+        node = self
+
+        while True:
+            # Entering a node: either its value is known right away, or it is pushed to solve its children
+            if node is None:
+                result = False
+            else:
+                result = values[node.index]
+                if tracer is not None:
+                    tracer.enter(node, result)
+                if result is None:
+                    if node.type == "VARIABLE":
+                        values[node.index] = BEING_SOLVED
+                    nodes.append(node)
+                    indexes.append(0)
+                    accumulated.append(False)
+                elif result is BEING_SOLVED:
+                    if tracer is not None:
+                        for current in reversed(nodes):
+                            tracer.leave(current, BEING_SOLVED)
+                    return None
+
+            # Returning: combine the result with the parent, and finish every node whose children are all solved
+            while nodes:
+                current = nodes[-1]
+                index = indexes[-1]
+                if result is not None:
+                    if current.type == "VARIABLE":
+                        accumulated[-1] = accumulated[-1] or result
+                    elif current.name == "!":
+                        accumulated[-1] = not result
+                    elif index == 0:
+                        accumulated[-1] = result
+                    elif current.name == "+":
+                        accumulated[-1] = accumulated[-1] and result
+                    elif current.name == "|":
+                        accumulated[-1] = accumulated[-1] or result
+                    else:
+                        accumulated[-1] = accumulated[-1] != result
+                    index += 1
+                    indexes[-1] = index
+
+                if current.type == "VARIABLE":
+                    children = rules.get(current.name, ())
+                    if index < len(children):
+                        node = children[index]
+                        break
+                elif current.name == "!":
+                    if index == 0:
+                        node = current.right
+                        break
+                elif index < 2:
+                    node = current.left if index == 0 else current.right
+                    break
+
+                nodes.pop()
+                indexes.pop()
+                result = accumulated.pop()
+                values[current.index] = result
+                if tracer is not None:
+                    tracer.leave(current, result)
+            else:
+                return result
+
+    def solve_occurrences(self, evaluation, tracer=None) -> bool:
+        """
+        Solves a node whose walk met a cycle the way the original solver did, with a tree per rule.
+
+        Each read of a variable has a key: the variable whose rule reads it, the index of that rule, and the path from
+        the root of the rule to the leaf (0 for a left operand, 1 for a right operand or the operand of '!'). A variable
+        is being solved at a key rather than everywhere: reading it again at the same key is a circular reference, which
+        counts as False, while reading it at another key solves it again there, as a leaf of another tree was solved on
+        its own. A value found without reading any circular reference is the same wherever it is read, so it is stored
+        in evaluation.values like walk does, and an operator stores its value when all its operands found theirs this
+        way; the walk of the variables and operators that do not depend on a cycle is left to walk. A value found
+        through a circular reference is only kept for its key, in evaluation.occurrences.
+        The original parser also made the leaf of the first read of a variable, when no line above mentioned it, the
+        first rule of that variable (see KnowledgeBase.first_reads): the variable is then solved at that key before its
+        own rules. Solved at that key, its first rule is the read being solved, which gives False without making the
+        value depend on where it is read, since the other rules then give the same value at every key.
+        The variable solved is a query: it is not marked as being solved, its rules stop at the first true one, and its
+        value is only stored if every rule was solved without circular reference, like the query loop of the original
+        program. The stack is made of frames [node, key, position of the next child, accumulated value, flag], the flag
+        telling whether a variable read a circular reference, or whether the operands of an operator have values found
+        without one.
+
         Args:
-            explain (bool, optional): Indicates whether to provide explanations during the solving process. Defaults to False.
+            evaluation (Evaluation): The evaluation holding the rules, the values and the occurrences found so far,
+                                     which are updated.
+            tracer (optional): The object whose enter and leave methods follow the walk, see walk. Defaults to None.
 
         Returns:
-            Tuple[bool, List[str]]: A tuple containing the resolved logical value of the node and a list of explanations, if
-            'explain' is True.
+            bool: The resolved logical value of the node.
         """
-        explanations = []
+        rules = evaluation.rules
+        values = evaluation.values
+        first_reads = evaluation.first_reads
+        occurrences = evaluation.occurrences
+        reads, varying, settled = occurrences.values, occurrences.variables, occurrences.settled
 
         if self.type == "VARIABLE":
-            if self.hasBeenSolved:
-                if explain:
-                    explanations.append(f"Variable '{self.name}' is already solved: {self.value}")
-                return self.value, explanations
-
-            if self.isBeingSolved:
-                if explain:
-                    print(f"We have a circular reference for '{self.name}'. Thus, {self.name}: False")
-                return False, explanations
-
-            self.isBeingSolved = True
-            result = False
-            for node in parse.global_dict[self.name]:
-                node_result, node_explanations = node.solve(explain)
-                explanations.extend(node_explanations)
-                result = result or node_result
-            self.value = result
-            self.hasBeenSolved = True
-            self.isBeingSolved = False
-            return self.value, explanations
-
-        # Handling operators
-        if self.name in ["+", "|", "^"]:
-            if explain:
-                operands = [self.left.name if self.left else "", self.right.name if self.right else ""]
-                op_explanation = f"Operator '{self.name}'. We are looking to know the value of its operands: {' and '.join(filter(None, operands))}."
-                explanations.append(op_explanation)
-
-            left_value, left_explanations = (False, [])
-            if self.left:
-                left_value, left_explanations = self.left.solve(explain)
-                explanations.extend(left_explanations)
-
-            right_value, right_explanations = (False, [])
-            if self.right:
-                right_value, right_explanations = self.right.solve(explain)
-                explanations.extend(right_explanations)
-
-            if self.name == "+":
-                self.value = left_value and right_value
-            elif self.name == "|":
-                self.value = left_value or right_value
-            elif self.name == "^":
-                self.value = left_value != right_value
-
-            if explain:
-                result_explanation = f"Operator '{self.name}' : {left_value} {self.name} {right_value} results in {self.value}"
-                explanations.append(result_explanation)
-
-        elif self.name == "!":
-            if explain:
-                op_explanation = f"Operator '!'. We are looking to know the value of its operand: {self.right.name}."
-                explanations.append(op_explanation)
-
-            right_value, right_explanations = self.right.solve(explain) if self.right else (False, [])
-            explanations.extend(right_explanations)
-
-            self.value = not right_value
-            if explain:
-                result_explanation = f"Operator '!' : not {right_value} results in {self.value}"
-                explanations.append(result_explanation)
-
-        self.hasBeenSolved = True
-        return self.value, explanations
+            result = settled.get(self.name)
+            if result is not None:
+                if tracer is not None:
+                    tracer.enter(self, result)
+                return result
+            frames = [[self, None, -1 if self.name in first_reads else 0, False, False]]
+            readers = [frames[0]]
+        else:
+            frames = [[self, (), 0, False, True]]
+            readers = [[None, None, 0, False, False]]
+        if tracer is not None:
+            tracer.enter(self, None)
+        result = pure = None
+        stopped = False
+
+        while True:
+            frame = frames[-1]
+            current, key, position = frame[0], frame[1], frame[2]
+
+            # Returning from a child: combine its value with the frame
+            if result is not None:
+                if current.type == "VARIABLE":
+                    if position < 0 and pure:
+                        # Solved at its first read without circular reference: the rules give that value again
+                        frame[3] = result
+                        position = len(rules.get(current.name, ()))
+                    else:
+                        frame[3] = frame[3] or result
+                        position += 1
+                        if frame[3] and len(frames) == 1:
+                            count = len(rules.get(current.name, ()))
+                            stopped = position < count
+                            position = count
+                else:
+                    if current.name == "!":
+                        frame[3] = not result
+                    elif position == 0:
+                        frame[3] = result
+                    elif current.name == "+":
+                        frame[3] = frame[3] and result
+                    elif current.name == "|":
+                        frame[3] = frame[3] or result
+                    else:
+                        frame[3] = frame[3] != result
+                    frame[4] = frame[4] and pure
+                    position += 1
+                frame[2] = position
+                result = None
+
+            # The next child of the frame, if any
+            child = child_key = None
+            if current.type == "VARIABLE":
+                roots = rules.get(current.name, ())
+                if position < 0:
+                    child, child_key = current, occurrences.key(first_reads[current.name], rules)
+                elif position < len(roots):
+                    child, child_key = roots[position], (current.name, position)
+            elif current.name == "!":
+                if position == 0:
+                    child, child_key = current.right, key + (1,)
+            elif position < 2:
+                child, child_key = (current.left, key + (0,)) if position == 0 else (current.right, key + (1,))
+
+            if child_key is None:
+                # Every child is solved: store the value where it holds
+                frames.pop()
+                result = frame[3]
+                if current.type == "VARIABLE":
+                    readers.pop()
+                    if frame[4] and frames:
+                        reads[key] = result
+                        varying.add(current.name)
+                        pure = False
+                    else:
+                        if frames:
+                            del reads[key]
+                        if frames or not (frame[4] or stopped):
+                            if current.name in varying:
+                                settled[current.name] = result
+                            else:
+                                values[current.index] = result
+                        pure = current.name not in varying
+                elif frame[4]:
+                    values[current.index] = result
+                    pure = True
+                else:
+                    pure = False
+                if tracer is not None:
+                    tracer.leave(current, result)
+                if not frames:
+                    return result
+                continue
+
+            # Entering the child: either its value is known right away, or it is pushed to solve its children
+            if child is None:
+                result, pure = False, True
+                continue
+            if child.type == "OPERATOR":
+                result = values[child.index]
+                if tracer is not None:
+                    tracer.enter(child, result)
+                if result is None:
+                    frames.append([child, child_key, 0, False, True])
+                else:
+                    pure = True
+                continue
+
+            result = reads.get(child_key)
+            if result is BEING_SOLVED:
+                readers[-1][4] = True
+                if tracer is not None:
+                    tracer.enter(child, BEING_SOLVED)
+                result, pure = False, False
+                continue
+            if result is not None:
+                if tracer is not None:
+                    tracer.enter(child, result)
+                pure = False
+                continue
+            result = values[child.index]
+            if result is None:
+                result = child.walk(evaluation, tracer)
+                if result is not None:
+                    pure = True
+                    continue
+            elif result is not BEING_SOLVED:
+                if tracer is not None:
+                    tracer.enter(child, result)
+                pure = True
+                continue
+            result = settled.get(child.name)
+            if tracer is not None:
+                tracer.enter(child, result)
+            if result is not None:
+                pure = False
+                continue
+            reads[child_key] = BEING_SOLVED
+            first = first_reads.get(child.name)
+            if first is not None:
+                first = occurrences.key(first, rules)
+            frame = [child, child_key, -1 if first is not None and first != child_key else 0, False, False]
+            frames.append(frame)
+            readers.append(frame)
 
     def __str__(self):
         """
-        Returns a string representation of the node, showing its name, value, and resolution status.
+        Returns a string representation of the node, showing its name and index.
         Returns: str: A string representing the node.
         """
         if self.type == "VARIABLE":
-            return f"{self.name} ({self.value}, {self.hasBeenSolved})\n"
+            return f"{self.name} (#{self.index})\n"
         else:
-            return f".{self.name}.\n"
+            return f".{self.name}. (#{self.index})\n"
 
     def __repr__(self):
         """
@@ -137,3 +358,56 @@ class Node:
         """
         return str(self)
 
+
+class Occurrences:
+    """
+    What Node.solve_occurrences keeps about the variables whose value depends on where they are read, which only
+    happens on a cycle of the rules.
+    Attributes:
+        values (Dict[tuple, object]): The value of a variable at each key it was solved at through a circular reference,
+                                      or Rule.BEING_SOLVED while it is being solved there (see Node.solve_occurrences).
+        variables (Set[str]): The variables with a value in values.
+        settled (Dict[str, bool]): The value such a variable was found to have without circular reference, which holds
+                                   at every key without a value of its own.
+        keys (Dict[tuple, tuple]): The key of each first read looked up so far (see key).
+    """
+    __slots__ = ("values", "variables", "settled", "keys")
+
+    def __init__(self):
+        self.values: Dict[tuple, object] = {}
+        self.variables: Set[str] = set()
+        self.settled: Dict[str, bool] = {}
+        self.keys: Dict[tuple, tuple] = {}
+
+    def key(self, first_read: tuple, rules: Dict[str, list]) -> tuple:
+        """
+        Finds the key of a first read (see KnowledgeBase.first_reads), the path to its leaf taking the place of its
+        position among the leaves of the rule.
+
+        Args:
+            first_read (tuple): The first read, (conclusion, index of the rule, position of the leaf) or (variable, -1).
+            rules (Dict[str, list]): The roots of the antecedents of the rules concluding each variable.
+
+        Returns:
+            tuple: The key of the read, or the first read itself when it has no leaf, which no read has.
+        """
+        key = self.keys.get(first_read)
+        if key is not None:
+            return key
+        key = first_read
+        if first_read[1] >= 0 and first_read[1] < len(rules.get(first_read[0], ())):
+            conclusion, index, position = first_read
+            stack = [(rules[conclusion][index], (conclusion, index))]
+            while stack:
+                node, path = stack.pop()
+                if node.type == "VARIABLE":
+                    if position == 0:
+                        key = path
+                        break
+                    position -= 1
+                else:
+                    stack.append((node.right, path + (1,)))
+                    if node.name != "!":
+                        stack.append((node.left, path + (0,)))
+        self.keys[first_read] = key
+        return key
@@ -0,0 +1,171 @@
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from Rule import Node
+from KnowledgeBase import KnowledgeBase
+from parse import split_variables
+
+# Number of scenarios packed into the bits of a single integer
+CHUNK_SIZE = 1 << 16
+
+
+def parse_scenario(line: str) -> Optional[Set[str]]:
+    """
+    Reads one scenario, written like the fact line of a file ("=ABG"); the leading "=" is optional.
+    Args:    line (str): A line of the scenario stream.
+    Returns: Optional[Set[str]]: The initial facts of the scenario, or None for a blank or comment line.
+    Raises:  ValueError: If the line contains something else than variables.
+    """
+    line = re.sub(r'#.*$', '', line).strip()
+    if line == "":
+        return None
+    if line.startswith("="):
+        line = line[1:].strip()
+    facts = split_variables(line)
+    if facts is None:
+        raise ValueError(f"Error: Invalid characters in scenario facts ({line}).")
+    return set(facts)
+
+
+def pack_facts(scenarios: List[Set[str]]) -> Dict[str, int]:
+    """
+    Packs the facts of the scenarios into one bit mask per variable, where bit i is set if the variable is a fact of scenario i.
+    Args:    scenarios (List[Set[str]]): The initial facts of each scenario.
+    Returns: Dict[str, int]: The bit mask of every variable that is a fact of at least one scenario.
+    """
+    bits = {}
+    size = (len(scenarios) + 7) // 8
+    for index, scenario in enumerate(scenarios):
+        for fact in scenario:
+            if fact not in bits:
+                bits[fact] = bytearray(size)
+            bits[fact][index >> 3] |= 1 << (index & 7)
+    return {fact: int.from_bytes(array, "little") for fact, array in bits.items()}
+
+
+def evaluate_masks(rules: Dict[str, List[Node]], fact_masks: Dict[str, int], everyone: int,
+                   queries: Iterable[str]) -> Tuple[Dict[str, int], int]:
+    """
+    Solves the queries for every scenario at once, each value being a bit mask over the scenarios.
+
+    The walk is the one of Node.walk, with an explicit stack and every operand and rule evaluated in order, but each
+    operator is applied to whole masks: '+', '|' and '^' become the bitwise operators and '!' a complement. Every node
+    keeps the scenarios its value is known in, and a variable the scenarios it is being solved in, so a node is only
+    walked for the scenarios Node.walk would walk it in: not those where it is an initial fact or already solved.
+    The scenarios where a variable is reached while it is being solved are only marked as circular: there Node.solve
+    solves the cycle at each place it is read in, which a single value per node cannot follow, so their values are
+    not those of Node.solve. The values are kept in local dictionaries, the nodes themselves are not modified.
+    Args:    rules (Dict[str, List[Node]]): The rules of each variable, as in KnowledgeBase.rules.
+             fact_masks (Dict[str, int]): The scenarios in which each variable is an initial fact.
+             everyone (int): The mask with the bit of every scenario set.
+             queries (Iterable[str]): The variables to solve.
+    Returns: Tuple[Dict[str, int], int]: The mask of the scenarios in which each query is true, and the mask of the
+             circular scenarios, whose answers must be found by Node.solve instead.
+    """
+    # By variable name or operator node: the scenarios the value is known in, and the value in those
+    known = dict(fact_masks)
+    values = dict(fact_masks)
+    solving: Dict[str, int] = {}
+    circular = 0
+    results = {}
+
+    for query in queries:
+        # A frame is [key, children, position, active scenarios, value of the known ones, accumulated value]
+        stack = []
+        key, children, active = query, rules.get(query, ()), everyone
+        while True:
+            # Entering a node: the scenarios it is known or being solved in are settled, the others walk its children
+            if key is None:
+                result = 0
+            else:
+                settled = known.get(key, 0)
+                if isinstance(key, str):
+                    circular |= active & solving.get(key, 0)
+                    settled |= solving.get(key, 0)
+                walked = active & ~settled
+                result = active & known.get(key, 0) & values.get(key, 0)
+                if walked:
+                    if isinstance(key, str):
+                        solving[key] = solving.get(key, 0) | walked
+                    stack.append([key, children, 0, walked, result, 0])
+                    result = None
+
+            # Returning: combine the result with the parent, and finish every node whose children are all solved
+            while stack:
+                frame = stack[-1]
+                current, children, position = frame[0], frame[1], frame[2]
+                if result is not None:
+                    if isinstance(current, str) or current.name == "|":
+                        frame[5] = frame[5] | result if position else result
+                    elif current.name == "!":
+                        frame[5] = ~result
+                    elif position == 0:
+                        frame[5] = result
+                    elif current.name == "+":
+                        frame[5] &= result
+                    else:
+                        frame[5] ^= result
+                    position = frame[2] = position + 1
+                if position < len(children):
+                    child = children[position]
+                    if child is None:
+                        key = None
+                    elif child.type == "VARIABLE":
+                        key, children, active = child.name, rules.get(child.name, ()), frame[3]
+                    else:
+                        key, active = child, frame[3]
+                        children = (child.right,) if child.name == "!" else (child.left, child.right)
+                    break
+
+                stack.pop()
+                walked = frame[3]
+                value = frame[5] & walked
+                known[current] = known.get(current, 0) | walked
+                values[current] = values.get(current, 0) & ~walked | value
+                if isinstance(current, str):
+                    solving[current] &= ~walked
+                result = frame[4] | value
+            else:
+                break
+        results[query] = result
+
+    return results, circular
+
+
+def evaluate_scenarios(knowledge_base: KnowledgeBase, scenarios: List[Set[str]], queries: List[str]) -> List[Dict[str, bool]]:
+    """
+    Answers the queries for a list of scenarios, evaluated together in a single pass over the rule DAG; the circular
+    scenarios are then solved one at a time by KnowledgeBase.solve.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             scenarios (List[Set[str]]): The initial facts of each scenario.
+             queries (List[str]): The variables to solve.
+    Returns: List[Dict[str, bool]]: The value of every query, for each scenario.
+    """
+    if not scenarios:
+        return []
+    count = len(scenarios)
+    masks, circular = evaluate_masks(knowledge_base.rules, pack_facts(scenarios), (1 << count) - 1, queries)
+    columns = {query: format(mask, f"0{count}b")[::-1] for query, mask in masks.items()}
+    return [knowledge_base.solve(queries, scenarios[index]) if circular >> index & 1 else
+            {query: columns[query][index] == "1" for query in queries} for index in range(count)]
+
+
+def batch_evaluate(knowledge_base: KnowledgeBase, lines: Iterable[str], queries: List[str], chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[Set[str], Dict[str, bool]]]:
+    """
+    Streams the results of a stream of scenarios, one per line, evaluating them chunk_size at a time.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             lines (Iterable[str]): The scenario lines, see parse_scenario.
+             queries (List[str]): The variables to solve.
+             chunk_size (int, optional): The number of scenarios evaluated together. Defaults to CHUNK_SIZE.
+    Returns: Iterator[Tuple[Set[str], Dict[str, bool]]]: The facts and the answers of each scenario, in input order.
+    Raises:  ValueError: If a scenario line is invalid.
+    """
+    chunk = []
+    for line in lines:
+        scenario = parse_scenario(line)
+        if scenario is None:
+            continue
+        chunk.append(scenario)
+        if len(chunk) == chunk_size:
+            yield from zip(chunk, evaluate_scenarios(knowledge_base, chunk, queries))
+            chunk = []
+    yield from zip(chunk, evaluate_scenarios(knowledge_base, chunk, queries))
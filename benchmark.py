@@ -0,0 +1,198 @@
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+from parse import parse_line, validate_file
+from KnowledgeBase import KnowledgeBase
+from codegen import solve_compiled
+
+# Times below this many seconds are too noisy to be compared with the baseline
+NOISE_FLOOR = 0.005
+
+
+def chain(size: int, rng: random.Random) -> List[str]:
+    """
+    A deep implication chain V0 => V1 => ... => Vn, solved from its last variable.
+    """
+    lines = [f"V{index} => V{index + 1}" for index in range(size)]
+    return lines + ["=V0", f"?V{size}"]
+
+
+def fan_in(size: int, rng: random.Random) -> List[str]:
+    """
+    Wide '|' rules, all concluding the same variable, which is only true through the last one.
+    """
+    width = 8
+    lines = [" | ".join(f"X{index * width + offset}" for offset in range(width)) + " => Goal" for index in range(size)]
+    return lines + [f"=X{size * width - 1}", "?Goal"]
+
+
+def xor_trees(size: int, rng: random.Random) -> List[str]:
+    """
+    XOR-heavy trees over the facts and the conclusions of earlier rules, so the rules form a deep DAG.
+    """
+    inputs = [f"X{index}" for index in range(16)]
+    lines = []
+    for index in range(size):
+        operands = [rng.choice(inputs) for _ in range(4)]
+        lines.append(f"({operands[0]} ^ {operands[1]}) ^ ({operands[2]} ^ !{operands[3]}) => Y{index}")
+        inputs.append(f"Y{index}")
+    facts = " ".join(f"X{index}" for index in range(0, 16, 3))
+    return lines + [f"={facts}", "?" + " ".join(f"Y{index}" for index in range(max(0, size - 4), size))]
+
+
+def conclusions(size: int, rng: random.Random) -> List[str]:
+    """
+    Rules with many '+' conclusions, split into one rule per conclusion by parse.compile_rule.
+    """
+    width = 8
+    lines = [f"A{index} + B{index} => " + " + ".join(f"C{index}_{offset}" for offset in range(width))
+             for index in range(size)]
+    return lines + ["=A0 B0", f"?C0_0 C{size - 1}_0"]
+
+
+def cycles(size: int, rng: random.Random) -> List[str]:
+    """
+    Rings of implications with random shortcuts, full of circular references.
+    """
+    lines = []
+    for index in range(size):
+        lines.append(f"R{index} | R{rng.randrange(size)} => R{(index + 1) % size}")
+    return lines + ["=", "?R0 " + f"R{size // 2}"]
+
+
+SHAPES: Dict[str, Callable[[int, random.Random], List[str]]] = {
+    "chain": chain,
+    "fan_in": fan_in,
+    "xor": xor_trees,
+    "conclusions": conclusions,
+    "cycles": cycles,
+}
+
+# The engines that can be timed, by the name of their --engine option in main.py
+ENGINES: Dict[str, Callable[[KnowledgeBase], Dict[str, bool]]] = {
+    "backward": KnowledgeBase.solve,
+    "codegen": solve_compiled,
+}
+
+
+def run_case(lines: List[str], engine: str = "backward") -> Dict[str, float]:
+    """
+    Loads and solves a rule base, timing each phase: parsing the lines, compiling the rules into the rule DAG,
+    solving the queries, and solving them again on the same rule base, like the server does for each request (the
+    codegen engine compiles its functions during the first solve and only calls them in the second one).
+    Args:    lines (List[str]): The lines of the rule file.
+             engine (str, optional): The engine solving the queries, a key of ENGINES. Defaults to "backward".
+    Returns: Dict[str, float]: The time of each phase, in seconds.
+    """
+    start = time.perf_counter()
+    parsed_content = [parse_line(line) for line in lines]
+    parsed = time.perf_counter()
+    knowledge_base = KnowledgeBase()
+    validate_file(parsed_content, knowledge_base)
+    compiled = time.perf_counter()
+    ENGINES[engine](knowledge_base)
+    solved = time.perf_counter()
+    ENGINES[engine](knowledge_base)
+    solved_again = time.perf_counter()
+    return {"parse": parsed - start, "compile": compiled - parsed, "solve": solved - compiled,
+            "again": solved_again - solved}
+
+
+def measure(shape: str, size: int, repeat: int, memory: bool, seed: int = 42,
+            engine: str = "backward") -> Dict[str, float]:
+    """
+    Benchmarks one shape at one size: the best time of each phase over repeat runs, and the peak memory of a last run.
+    Args:    shape (str): The name of the shape, a key of SHAPES.
+             size (int): The number of rules generated.
+             repeat (int): The number of timed runs.
+             memory (bool): Whether to measure the peak memory, in a separate run traced by tracemalloc.
+             seed (int, optional): The seed of the generator. Defaults to 42.
+             engine (str, optional): The engine solving the queries, a key of ENGINES. Defaults to "backward".
+    Returns: Dict[str, float]: The time of each phase in seconds, and the peak memory in KiB if measured.
+    """
+    lines = SHAPES[shape](size, random.Random(seed))
+    result = {}
+    for _ in range(repeat):
+        gc.collect()
+        for phase, seconds in run_case(lines, engine).items():
+            result[phase] = min(result.get(phase, seconds), seconds)
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        run_case(lines, engine)
+        result["peak_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """
+    Lists the measures that got worse than the baseline by more than the tolerance. Times under NOISE_FLOOR are ignored.
+    Args:    results (Dict[str, Dict[str, float]]): The measures of each case.
+             baseline (Dict[str, Dict[str, float]]): The stored measures of each case.
+             tolerance (float): The allowed slowdown, 0.25 for 25%.
+    Returns: List[str]: A description of each regression.
+    """
+    regressions = []
+    for case, measures in results.items():
+        for name, value in measures.items():
+            reference = baseline.get(case, {}).get(name)
+            if reference is None or (name != "peak_kib" and max(value, reference) < NOISE_FLOOR):
+                continue
+            if value > reference * (1 + tolerance):
+                regressions.append(f"{case} {name}: {value:.4g} instead of {reference:.4g} (+{value / reference - 1:.0%})")
+    return regressions
+
+
+def main():
+    """
+    Runs the benchmarks selected on the command line and prints one line per case.
+    The results can be saved as a baseline, and compared with a saved baseline, the exit status being 1 on a regression.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the parsing, compiling and solving of generated rule bases.")
+    parser.add_argument("--shapes", default=",".join(SHAPES), help=f"Comma-separated shapes, among {', '.join(SHAPES)}")
+    parser.add_argument("--sizes", default="10,1000,100000", help="Comma-separated numbers of rules, up to 1000000")
+    parser.add_argument("--engine", choices=ENGINES, default="backward", help="Engine solving the queries")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs, the best one being kept")
+    parser.add_argument("--no-memory", action="store_true", help="Do not measure the peak memory")
+    parser.add_argument("--save", metavar="FILE", help="Save the results as a baseline", default=None)
+    parser.add_argument("--baseline", metavar="FILE", help="Compare the results with a saved baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before reporting a regression")
+    args = parser.parse_args()
+
+    shapes = args.shapes.split(",")
+    for shape in shapes:
+        if shape not in SHAPES:
+            parser.error(f"unknown shape {shape}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = {}
+    print(f"{'case':<28}{'parse':>10}{'compile':>10}{'solve':>10}{'again':>10}{'peak KiB':>12}")
+    for shape in shapes:
+        for size in sizes:
+            # The cases of the default engine keep their name, so that older baselines still match
+            case = f"{shape}/{size}" + (f"/{args.engine}" if args.engine != "backward" else "")
+            result = measure(shape, size, args.repeat, not args.no_memory, engine=args.engine)
+            results[case] = result
+            peak = f"{result['peak_kib']:.0f}" if "peak_kib" in result else "-"
+            print(f"{case:<28}{result['parse']:>10.4f}{result['compile']:>10.4f}{result['solve']:>10.4f}"
+                  f"{result['again']:>10.4f}{peak:>12}", flush=True)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Optional
+from KnowledgeBase import KnowledgeBase
+
+# Magic number of a compiled rule base: format version and byte order of the integer arrays
+MAGIC = b"XSKB03" + (b"LE" if sys.byteorder == "little" else b"BE")
+
+# Counts following the magic number and the digest: names size, nodes, rules, equivalence integers, first read
+# integers, facts, queries, warnings size
+HEADER = struct.Struct("=8I")
+
+# Extension of a compiled rule base written next to its source file
+EXTENSION = ".kbc"
+
+
+def compiled_path(source_path: str, cache_dir: Optional[str] = None) -> str:
+    """
+    Returns the path of the compiled rule base of a source file: next to it, or in cache_dir under a name derived from
+    the absolute path of the source, so that files with the same name in different directories do not collide.
+    Args:    source_path (str): Path to the rule file.
+             cache_dir (str, optional): The cache directory. Defaults to None, for next to the source.
+    Returns: str: The path of the compiled rule base.
+    """
+    if not cache_dir:
+        return source_path + EXTENSION
+    name = hashlib.sha1(os.path.abspath(source_path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.basename(source_path)}-{name}{EXTENSION}")
+
+
+def pad(blob: bytes) -> bytes:
+    """
+    Pads a blob with zeros to a multiple of 4 bytes, so that the integer array following it is aligned.
+    """
+    return blob + b"\0" * (-len(blob) % 4)
+
+
+def dump(knowledge_base: KnowledgeBase, digest: bytes) -> bytes:
+    """
+    Serializes a rule base. The names are stored once, and the nodes, rules, equivalences, first reads, facts and
+    queries are arrays of int32 referring to names and nodes by index, so that they can be read in place from a memory
+    mapping.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             digest (bytes): The SHA-256 digest of the source it was compiled from.
+    Returns: bytes: The compiled rule base.
+    """
+    names = {}
+    for name in [node.name for node in knowledge_base.nodes] + list(knowledge_base.rules):
+        names.setdefault(name, len(names))
+
+    nodes = array("i")
+    for node in knowledge_base.nodes:
+        nodes.extend((names[node.name], node.left.index if node.left else -1, node.right.index if node.right else -1))
+    rules = array("i")
+    for conclusion, roots in knowledge_base.rules.items():
+        for root in roots:
+            rules.extend((names[conclusion], root.index))
+    equivalences = array("i")
+    for conclusions, root in knowledge_base.equivalences:
+        equivalences.extend((root.index, len(conclusions)))
+        equivalences.extend(names[conclusion] for conclusion in conclusions)
+    first_reads = array("i")
+    for variable, key in knowledge_base.first_reads.items():
+        first_reads.extend((names[variable], names[key[0]], len(key) - 1))
+        first_reads.extend(key[1:])
+    facts = array("i", sorted(names[fact] for fact in knowledge_base.facts))
+    queries = array("i", [names[query] for query in knowledge_base.queries])
+
+    name_blob = pad("\n".join(names).encode())
+    warning_blob = "\n".join(knowledge_base.warnings).encode()
+    header = HEADER.pack(len(name_blob), len(knowledge_base.nodes), len(rules) // 2, len(equivalences),
+                         len(first_reads), len(facts), len(queries), len(warning_blob))
+    return b"".join((MAGIC, digest, header, name_blob, nodes.tobytes(), rules.tobytes(), equivalences.tobytes(),
+                     first_reads.tobytes(), facts.tobytes(), queries.tobytes(), warning_blob))
+
+
+def load(path: str, digest: bytes) -> Optional[KnowledgeBase]:
+    """
+    Loads a compiled rule base through a read-only memory mapping, whose pages are shared by every process loading the
+    same file. The integer arrays are read in place through memoryviews, without being copied; only the nodes of the
+    rule base are built from them.
+    Args:    path (str): Path to the compiled rule base.
+             digest (bytes): The SHA-256 digest of the current source.
+    Returns: Optional[KnowledgeBase]: The rule base, or None if the file is missing, from another format, or compiled
+             from another version of the source.
+    """
+    try:
+        with open(path, "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    with mapping:
+        return loads(mapping, digest)
+
+
+def loads(mapping, digest: bytes) -> Optional[KnowledgeBase]:
+    """
+    Builds a rule base from a compiled rule base held in memory, as returned by dump or mapped by load. The size of
+    every section is checked against the header, and every name and node id against the names and nodes read so far,
+    so a truncated or corrupt file is a miss rather than an error.
+    Args:    mapping (bytes or mmap): The compiled rule base.
+             digest (bytes): The digest it must have been compiled with.
+    Returns: Optional[KnowledgeBase]: The rule base, or None if it is from another format or another source, or corrupt.
+    """
+    offset = len(MAGIC) + len(digest)
+    if len(mapping) < offset + HEADER.size or mapping[:len(MAGIC)] != MAGIC or mapping[len(MAGIC):offset] != digest:
+        return None
+    names_size, node_count, rule_count, equivalence_size, first_read_size, fact_count, query_count, warnings_size = \
+        HEADER.unpack_from(mapping, offset)
+    offset += HEADER.size
+    integer_count = 3 * node_count + 2 * rule_count + equivalence_size + first_read_size + fact_count + query_count
+    if names_size % 4 or len(mapping) != offset + names_size + 4 * integer_count + warnings_size:
+        return None
+    try:
+        names = mapping[offset:offset + names_size].rstrip(b"\0").decode().split("\n")
+        warnings = mapping[offset + names_size + 4 * integer_count:].decode()
+    except UnicodeDecodeError:
+        return None
+    offset += names_size
+
+    knowledge_base = KnowledgeBase()
+    name_count = len(names)
+    with memoryview(mapping) as view:
+        integers = view[offset:offset + 4 * integer_count].cast("i")
+        try:
+            nodes = knowledge_base.nodes
+            for position in range(0, 3 * node_count, 3):
+                name, left, right = integers[position], integers[position + 1], integers[position + 2]
+                count = len(nodes)
+                if not (0 <= name < name_count and -1 <= left < count and -1 <= right < count):
+                    return None
+                knowledge_base.intern_node(names[name], nodes[left] if left >= 0 else None,
+                                           nodes[right] if right >= 0 else None)
+            if len(nodes) != node_count:
+                return None
+            start = 3 * node_count
+            for position in range(start, start + 2 * rule_count, 2):
+                name, root = integers[position], integers[position + 1]
+                if not (0 <= name < name_count and 0 <= root < node_count):
+                    return None
+                knowledge_base.rules.setdefault(names[name], []).append(nodes[root])
+            start += 2 * rule_count
+            position = start
+            start += equivalence_size
+            while position < start:
+                root, count = integers[position], integers[position + 1] if position + 1 < start else -1
+                if not (0 <= root < node_count and 0 <= count <= start - position - 2):
+                    return None
+                conclusions = tuple(names[integers[name]] for name in range(position + 2, position + 2 + count)
+                                    if 0 <= integers[name] < name_count)
+                if len(conclusions) != count:
+                    return None
+                knowledge_base.equivalences.append((conclusions, nodes[root]))
+                position += 2 + count
+            start += first_read_size
+            while position < start:
+                if position + 3 > start:
+                    return None
+                variable, conclusion, count = integers[position], integers[position + 1], integers[position + 2]
+                if not (0 <= variable < name_count and 0 <= conclusion < name_count and 0 <= count <= start - position - 3):
+                    return None
+                key = (names[conclusion],) + tuple(integers[position + 3:position + 3 + count])
+                knowledge_base.first_reads[names[variable]] = key
+                position += 3 + count
+            variables = [integers[position] for position in range(start, start + fact_count + query_count)]
+            if not all(0 <= name < name_count for name in variables):
+                return None
+            knowledge_base.facts.update(names[name] for name in variables[:fact_count])
+            knowledge_base.queries.extend(names[name] for name in variables[fact_count:])
+        finally:
+            integers.release()
+    knowledge_base.warnings.extend(warnings.split("\n") if warnings else [])
+    return knowledge_base
+
+
+def load_knowledge_base(source_path: str, cache_dir: Optional[str] = None) -> KnowledgeBase:
+    """
+    Loads a rule file through its compiled cache. The cache is keyed by the SHA-256 digest of the content of the file:
+    on a hit nothing is parsed, and when the file changes the digest no longer matches, so it is compiled again and
+    the cache is replaced (atomically, so concurrent readers never see a partial file).
+    Args:    source_path (str): Path to the rule file.
+             cache_dir (str, optional): The cache directory. Defaults to None, for next to the source.
+    Returns: KnowledgeBase: The compiled rule base.
+    Raises:  parse.ParseError: If the file is not a valid rule base; nothing is cached then.
+             OSError: If the file cannot be read.
+    """
+    with open(source_path, "rb") as file:
+        source = file.read()
+    digest = hashlib.sha256(source).digest()
+    path = compiled_path(source_path, cache_dir)
+
+    knowledge_base = load(path, digest)
+    if knowledge_base is not None:
+        return knowledge_base
+
+    knowledge_base = KnowledgeBase.from_lines(source.decode().splitlines())
+    store(path, dump(knowledge_base, digest))
+    return knowledge_base
+
+
+def store(path: str, blob: bytes):
+    """
+    Writes a compiled rule base through a temporary file renamed over the previous one, so that concurrent readers
+    never see a partial file. The cache is only an optimization: a directory that cannot be written is ignored.
+    Args:    path (str): Path of the compiled rule base.
+             blob (bytes): The compiled rule base.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=EXTENSION)
+    except OSError:
+        return
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(blob)
+        os.replace(temporary, path)
+    except OSError:
+        os.unlink(temporary)
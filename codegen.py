@@ -0,0 +1,293 @@
+import sys
+from operator import itemgetter
+from threading import Lock
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from weakref import WeakKeyDictionary
+from Rule import Node, Occurrences
+from KnowledgeBase import KnowledgeBase
+from scc import strongly_connected_components
+
+# Nodes this deep inside an expression get a function of their own, far below the nesting limit of the parser
+MAX_DEPTH = 40
+# A chain of '+' or '|' reading at least this many variables without rules reads them all with a single itemgetter,
+# whose indices cost nothing to compile
+MIN_GETTER = 4
+
+# The compiled rule bases, with the revision of the rules they were generated from
+_compiled: "WeakKeyDictionary[KnowledgeBase, Tuple[int, CompiledRuleBase]]" = WeakKeyDictionary()
+
+
+def explore(rules: Dict[str, List[Node]], roots: Iterable[Node], explored: Set[Node], uses: Dict[Node, int],
+            cyclic: Set[Node]):
+    """
+    Explores the nodes reachable from some variables that were not explored yet, with a depth-first search driven by
+    an explicit stack, counting how many times each node is read (as an operand, or as the antecedent of a rule) and
+    finding the nodes whose value can depend on a cycle of the rules, whatever the facts: a node reading a node that
+    is still being explored, or a node depending on a cycle. Only their value can depend on where they are read and
+    on the order they are solved in, so they are solved by Node.solve rather than by generated functions. Only the
+    part of the rule base the queries reach is ever explored, each node once, apart from the variables without rules,
+    which are only ever read.
+    Args:    rules (Dict[str, List[Node]]): The rules of the rule base.
+             roots (Iterable[Node]): The variables to solve.
+             explored (Set[Node]): The nodes already explored; the new ones are added to it.
+             uses (Dict[Node, int]): The number of reads of each node; the reads by the new nodes are added to it.
+             cyclic (Set[Node]): The nodes depending on a cycle; the new ones are added to it.
+    """
+    def operands(node: Node):
+        if node.type == "VARIABLE":
+            return iter(rules.get(node.name, ()))
+        return iter([child for child in (node.left, node.right) if child is not None])
+
+    on_path = set()
+    for root in roots:
+        if root in explored:
+            continue
+        explored.add(root)
+        on_path.add(root)
+        work = [(root, operands(root))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child.type == "VARIABLE" and not rules.get(child.name):
+                    continue
+                uses[child] = uses.get(child, 0) + 1
+                if child in on_path or child in cyclic:
+                    cyclic.add(node)
+                elif child not in explored:
+                    explored.add(child)
+                    on_path.add(child)
+                    work.append((child, operands(child)))
+                    break
+            else:
+                work.pop()
+                on_path.discard(node)
+                if work and node in cyclic:
+                    cyclic.add(work[-1][0])
+
+
+def generate_source(rules: Dict[str, List[Node]], roots: Iterable[Node], uses: Dict[Node, int],
+                    defined: Set[Node]) -> Tuple[str, Dict[Node, Set[Node]], Dict[str, itemgetter]]:
+    """
+    Generates the Python source of the functions needed to solve some variables, reading and storing the values in
+    the list it is given, indexed like the nodes. Each function computes a chunk of the rule DAG as a single
+    expression of native operators, so solving no longer looks at the nodes at all: a variable or operator node read
+    only once is written inline in the expression of its reader, and only the queried variables, the nodes read
+    several times and the nodes MAX_DEPTH deep in an expression get a function (v<index> for a variable, n<index> for
+    an operator node), which stores their value so that it is computed once. A variable written inline is true if it
+    is a fact, and its rules are not evaluated then. A chain of the same '+' or '|' operator is a single 'and' or
+    'or', testing first the variables without rules it reads, with an itemgetter g<index> when they are many: the
+    cost of compile() grows with the number of subscripts in the source. The variables must not depend on a cycle
+    (see explore), so the expressions short-circuit, in any order, which cannot change a value.
+    Args:    rules (Dict[str, List[Node]]): The rules of the rule base.
+             roots (Iterable[Node]): The variables to solve.
+             uses (Dict[Node, int]): The number of reads of each node, as counted by explore.
+             defined (Set[Node]): The nodes whose function is already defined, which are skipped.
+    Returns: Tuple[str, Dict[Node, Set[Node]], Dict[str, itemgetter]]: The source of the functions, the nodes of
+             the functions each new function calls, by node, and the itemgetters the functions read, by name.
+    """
+    operators = {"+": " and ", "|": " or ", "^": " != "}
+    functions = [node for node in dict.fromkeys(roots) if rules.get(node.name) and node not in defined]
+    generated = set(functions)
+    calls: Dict[Node, Set[Node]] = {}
+    getters: Dict[str, itemgetter] = {}
+    callees: Set[Node] = set()
+    lines = []
+
+    def call(node: Node, prefix: str) -> str:
+        if node not in defined and node not in generated:
+            generated.add(node)
+            functions.append(node)
+        callees.add(node)
+        return f"{prefix}{node.index}(values)"
+
+    def inline(node: Node, depth: int) -> bool:
+        return depth < MAX_DEPTH and uses.get(node, 0) < 2 and node not in defined and node not in generated
+
+    def expression(node: Node, depth: int) -> str:
+        if node.type == "VARIABLE":
+            if not rules.get(node.name):
+                return f"(values[{node.index}] is True)"
+            if depth and inline(node, depth):
+                return f"(values[{node.index}] is True or {variable(node, depth)})"
+            return call(node, "v")
+        if depth and not inline(node, depth):
+            return call(node, "n")
+        if node.name == "!":
+            return f"(not {expression(node.right, depth + 1)})"
+        terms: List[str] = []
+        leaves: List[int] = []
+        operands(node, depth, terms, leaves)
+        if len(leaves) >= MIN_GETTER:
+            getters[f"g{node.index}"] = itemgetter(*leaves)
+            terms.insert(0, f"(True in g{node.index}(values))" if node.name == "|" else
+                         f"(g{node.index}(values).count(True) == {len(leaves)})")
+        else:
+            terms[:0] = [f"(values[{index}] is True)" for index in leaves]
+        return f"({operators[node.name].join(terms)})"
+
+    def operands(node: Node, depth: int, terms: List[str], leaves: List[int]):
+        # A chain of the same '+' or '|' operator is written as a single 'and' or 'or', but '!=' does not chain that way
+        for child in (node.left, node.right):
+            if node.name == "^":
+                terms.append(expression(child, depth + 1))
+            elif child.type == "VARIABLE" and not rules.get(child.name):
+                leaves.append(child.index)
+            elif child.name == node.name and child.type == "OPERATOR" and inline(child, depth + 1):
+                operands(child, depth + 1, terms, leaves)
+            else:
+                terms.append(expression(child, depth + 1))
+
+    def variable(node: Node, depth: int) -> str:
+        return " or ".join(expression(root, depth + 1) for root in rules[node.name])
+
+    position = 0
+    while position < len(functions):
+        node = functions[position]
+        position += 1
+        callees = calls[node] = set()
+        body = expression(node, 0) if node.type == "OPERATOR" else variable(node, 0)
+        name = f"{'v' if node.type == 'VARIABLE' else 'n'}{node.index}"
+        lines += [f"def {name}(values):", f"    value = values[{node.index}]", "    if value is None:",
+                  f"        value = values[{node.index}] = {body}", "    return value"]
+    return "\n".join(lines) + "\n", calls, getters
+
+
+def call_depths(calls: Dict[Node, Set[Node]], depths: Dict[Node, int]):
+    """
+    Bounds how deeply the functions generated for some nodes can call each other, since the functions of a chain of
+    rules call each other as deep as the chain goes, one call every MAX_DEPTH rules. No function depends on a cycle,
+    so they never call each other in a cycle.
+    Args:    calls (Dict[Node, Set[Node]]): The functions each new function calls, as returned by generate_source.
+             depths (Dict[Node, int]): The bound of the functions already defined; the new ones are added to it.
+    """
+    graph = {node: list(callees) for node, callees in calls.items()}
+    # Each function comes after the functions it calls, so their bounds are known
+    for node, in strongly_connected_components(graph, graph, set()):
+        if node in calls:
+            depths[node] = max((depths[callee] for callee in calls[node]), default=0) + 1
+
+
+class CompiledRuleBase:
+    """
+    A rule base compiled to Python functions, giving the same answers as the backward engine.
+    The functions are generated and compiled the first time a query needs them, so only the part of a large rule base
+    that is asked about is ever compiled, and each part only once; each solve calls them with a new list of values, so
+    several evaluations, even from several threads, never share their values. A query depending on a cycle of the
+    rules, or whose functions could call each other deeper than half the recursion limit, at the end of a long chain
+    of rules, is solved by the explicit stack of Node.solve instead, on the same values.
+    It keeps the containers of the rule base rather than the rule base itself, so that the cache of
+    compile_knowledge_base does not keep it alive.
+    Attributes:
+        nodes (List[Node]): The nodes of the rule base.
+        variables (Dict[str, Node]): The leaf node of every variable.
+        facts (Set[str]): The initial facts of the file.
+        queries (List[str]): The queries of the file.
+        rules (Dict[str, List[Node]]): The rules of the rule base.
+        first_reads (Dict[str, tuple]): The first reads of the variables, for Node.solve.
+        explored (Set[Node]): The nodes explored so far, see explore.
+        uses (Dict[Node, int]): The number of reads of each explored node.
+        cyclic (Set[Node]): The explored nodes depending on a cycle, which get no function.
+        defined (Set[Node]): The nodes whose function is compiled.
+        depths (Dict[Node, int]): The bound of the call depth of each compiled function, see call_depths.
+        functions (dict): The namespace the functions are compiled in.
+        lock (Lock): Held while checking and compiling functions, so that a thread never sees a node defined before
+                     its function is.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase):
+        self.nodes = knowledge_base.nodes
+        self.variables = knowledge_base.variables
+        self.facts = knowledge_base.facts
+        self.queries = knowledge_base.queries
+        self.rules = knowledge_base.rules
+        self.first_reads = knowledge_base.first_reads
+        self.explored: Set[Node] = set()
+        self.uses: Dict[Node, int] = {}
+        self.cyclic: Set[Node] = set()
+        self.defined: Set[Node] = set()
+        self.depths: Dict[Node, int] = {}
+        self.functions = {}
+        self.lock = Lock()
+
+    def prepare(self, variables: Iterable[str]):
+        """
+        Compiles the functions needed to solve variables that are not compiled yet, in a single call to compile(),
+        after exploring the part of the rule base they reach. The variables depending on a cycle are skipped. The
+        nodes are only marked as defined once their functions exist, so a failed compilation leaves nothing half
+        defined.
+        Args:    variables (Iterable[str]): The variables to solve.
+        """
+        roots = [self.variables[variable] for variable in variables if variable in self.variables]
+        with self.lock:
+            roots = [root for root in roots if root not in self.defined and self.rules.get(root.name)]
+            if not roots:
+                return
+            explore(self.rules, roots, self.explored, self.uses, self.cyclic)
+            roots = [root for root in roots if root not in self.cyclic]
+            if not roots:
+                return
+            source, calls, getters = generate_source(self.rules, roots, self.uses, self.defined)
+            self.functions.update(getters)
+            exec(compile(source, "<rules>", "exec"), self.functions)
+            call_depths(calls, self.depths)
+            self.defined.update(calls)
+
+    def solve(self, queries: Optional[Iterable[str]] = None, facts: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+        """
+        Solves queries in a new evaluation, like KnowledgeBase.solve.
+        Args:    queries (Iterable[str], optional): The queried variables. Defaults to the queries of the file.
+                 facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+        Returns: Dict[str, bool]: The value of each query, in order.
+        """
+        queries = list(self.queries if queries is None else queries)
+        facts = set(self.facts if facts is None else facts)
+        self.prepare(queries)
+        values: List[Optional[bool]] = [None] * len(self.nodes)
+        for fact in facts:
+            node = self.variables.get(fact)
+            if node is not None:
+                values[node.index] = True
+
+        results = {}
+        limit = sys.getrecursionlimit() // 2
+        evaluation = SimpleNamespace(rules=self.rules, values=values, first_reads=self.first_reads,
+                                     occurrences=Occurrences())
+        for query in queries:
+            node = self.variables.get(query)
+            if node is None:
+                results[query] = query in facts
+            elif node in self.defined and self.depths[node] <= limit:
+                results[query] = self.functions[f"v{node.index}"](values)
+            elif values[node.index] is True or values[node.index] is False or not self.rules.get(node.name):
+                results[query] = values[node.index] is True
+            else:
+                # On a cycle, or too deep for the generated functions: the explicit stack of Node.solve shares the values
+                results[query] = node.solve(evaluation)
+        return results
+
+
+def compile_knowledge_base(knowledge_base: KnowledgeBase) -> CompiledRuleBase:
+    """
+    Compiles a rule base to Python functions, once: the result is kept as long as the rule base is alive and its
+    rules do not change.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+    Returns: CompiledRuleBase: The compiled rule base.
+    """
+    cached = _compiled.get(knowledge_base)
+    if cached is None or cached[0] != knowledge_base.revision:
+        cached = (knowledge_base.revision, CompiledRuleBase(knowledge_base))
+        _compiled[knowledge_base] = cached
+    return cached[1]
+
+
+def solve_compiled(knowledge_base: KnowledgeBase, queries: Optional[Iterable[str]] = None,
+                   facts: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+    """
+    Solves queries with the compiled functions of a rule base, compiling it on first use.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             queries (Iterable[str], optional): The queried variables. Defaults to the queries of the file.
+             facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+    Returns: Dict[str, bool]: The value of each query, in order.
+    """
+    return compile_knowledge_base(knowledge_base).solve(queries, facts)
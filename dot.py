@@ -0,0 +1,98 @@
+from typing import Iterable, Iterator, List, Optional, Set, TextIO
+from Rule import BEING_SOLVED, Node
+from KnowledgeBase import KnowledgeBase
+
+# Number of lines written to the output at once
+FLUSH_SIZE = 4096
+
+# Fill colors of the nodes whose value was found while solving, or that got a value at each place they were read in
+COLORS = {True: "palegreen", False: "lightpink", BEING_SOLVED: "lightyellow"}
+
+
+def dependencies(knowledge_base: KnowledgeBase, node: Node, facts: Set[str]) -> List[Node]:
+    """
+    Lists what the value of a node depends on: the operands of an operator, and the antecedents of the rules of a
+    variable, negated conclusions included. An initial fact depends on nothing.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             node (Node): The node.
+             facts (Set[str]): The initial facts.
+    Returns: List[Node]: The nodes it depends on.
+    """
+    if node.type == "OPERATOR":
+        return [child for child in (node.left, node.right) if child is not None]
+    if node.name in facts:
+        return []
+    return knowledge_base.rules.get(node.name, []) + knowledge_base.rules.get("!" + node.name, [])
+
+
+def cone_of_influence(knowledge_base: KnowledgeBase, queries: Iterable[str], facts: Optional[Set[str]] = None,
+                      values: Optional[list] = None) -> Iterator[Node]:
+    """
+    Walks the nodes the answers to queries can depend on, each once, with an explicit stack.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             queries (Iterable[str]): The variables to start from; the ones the rule base does not know are skipped.
+             facts (Set[str], optional): The initial facts. Defaults to the facts of the file.
+             values (list, optional): The values of an Evaluation, to only walk the nodes solved in it. Defaults to None.
+    Returns: Iterator[Node]: The nodes, in depth-first order from the queries.
+    """
+    facts = knowledge_base.facts if facts is None else facts
+    stack = [knowledge_base.variables[query] for query in reversed(list(queries)) if query in knowledge_base.variables]
+    seen = set()
+    while stack:
+        node = stack.pop()
+        if node.index in seen or (values is not None and values[node.index] is None):
+            continue
+        seen.add(node.index)
+        yield node
+        stack.extend(reversed(dependencies(knowledge_base, node, facts)))
+
+
+def write_dot(knowledge_base: KnowledgeBase, stream: TextIO, queries: Optional[Iterable[str]] = None,
+              values: Optional[list] = None):
+    """
+    Writes the rule DAG as Graphviz DOT text, a line at a time as the nodes are walked, without building the graph in
+    memory. Nodes are named after their index, so a subexpression shared by several rules is drawn once. Operators
+    point to their operands, and variables to the antecedents of their rules with dashed edges (labeled '!' for a
+    negated conclusion); queries are boxes and initial facts are bold.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             stream (TextIO): The output stream.
+             queries (Iterable[str], optional): Only draw the cone of influence of these variables. Defaults to None,
+                                                for every rule.
+             values (list, optional): The values of an Evaluation the queries were solved in: only the nodes it solved
+                                      are drawn, colored after their value. Defaults to None.
+    """
+    if queries is None:
+        queries = [name for name in knowledge_base.variables]
+        shown = set(knowledge_base.queries)
+    else:
+        queries = list(queries)
+        shown = set(queries)
+    facts = knowledge_base.facts
+
+    buffer = ["digraph rules {", "    node [shape=circle];"]
+    for node in cone_of_influence(knowledge_base, queries, facts, values):
+        attributes = [f'label="{node.name}"']
+        if node.type == "VARIABLE":
+            attributes.append("shape=box" if node.name in shown else "shape=ellipse")
+            if node.name in facts:
+                attributes.append("penwidth=2")
+        if values is not None:
+            attributes.append(f"style=filled, fillcolor={COLORS[values[node.index]]}")
+        buffer.append(f"    n{node.index} [{', '.join(attributes)}];")
+
+        if node.type == "OPERATOR":
+            buffer.extend(f"    n{node.index} -> n{child.index};" for child in (node.left, node.right)
+                          if child is not None and (values is None or values[child.index] is not None))
+        elif node.name not in facts:
+            for conclusion in (node.name, "!" + node.name):
+                label = ", label=\"!\"" if conclusion != node.name else ""
+                buffer.extend(f"    n{node.index} -> n{root.index} [style=dashed{label}];"
+                              for root in knowledge_base.rules.get(conclusion, ())
+                              if values is None or values[root.index] is not None)
+
+        if len(buffer) >= FLUSH_SIZE:
+            stream.write("\n".join(buffer) + "\n")
+            buffer = []
+    buffer.append("}")
+    stream.write("\n".join(buffer) + "\n")
+    stream.flush()
@@ -0,0 +1,120 @@
+from collections import deque
+from typing import Dict, Iterable, Optional, Tuple
+from Rule import Node
+from KnowledgeBase import KnowledgeBase
+
+
+def build_antecedent_index(knowledge_base: KnowledgeBase) -> Tuple[dict, dict, dict]:
+    """
+    Indexes the rule DAG for forward chaining, in a single walk over the antecedents of every rule.
+    Args:    knowledge_base (KnowledgeBase): The rule base to index.
+    Returns: Tuple[dict, dict, dict]: Three mappings:
+             - parents: for each node, the operator nodes that use it as an operand. From the leaf of a variable
+               (KnowledgeBase.variables), this is the index to the rules that mention it.
+             - conclusions: for each rule root, the variables it concludes.
+             - pending: for each operator node, the number of operands whose value is not known yet.
+    """
+    parents, conclusions, pending = {}, {}, {}
+
+    for variable, roots in knowledge_base.rules.items():
+        for root in roots:
+            conclusions.setdefault(root, []).append(variable)
+            stack = [root]
+            while stack:
+                node = stack.pop()
+                if node.type == "VARIABLE" or node in pending:
+                    continue
+                children = [child for child in (node.left, node.right) if child is not None]
+                pending[node] = len(children)
+                for child in children:
+                    parents.setdefault(child, []).append(node)
+                    stack.append(child)
+
+    return parents, conclusions, pending
+
+
+def apply_operator(node: Node, values: list) -> bool:
+    """
+    Computes the value of an operator node from the values of its operands, which must all be known.
+    Args:    node (Node): The operator node.
+             values (list): The values of the nodes, by index.
+    Returns: bool: The value of the operator.
+    """
+    if node.name == "!":
+        return not values[node.right.index]
+    left_value = values[node.left.index] if node.left else False
+    right_value = values[node.right.index] if node.right else False
+    if node.name == "+":
+        return left_value and right_value
+    if node.name == "|":
+        return left_value or right_value
+    return left_value != right_value
+
+
+def forward_chain(knowledge_base: KnowledgeBase, facts: Optional[Iterable[str]] = None,
+                  queries: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+    """
+    Computes the value of every variable at once by propagating the facts forward through the rule DAG.
+
+    Each operator node waits for its operands and each variable waits for all of its rules: as soon as the last
+    one is known, the node is evaluated and pushed on the agenda, which in turn wakes up the nodes that use it.
+    Every node and every edge is handled once, so the whole pass is linear in the size of the rule base, and a
+    negated variable is only read once its value is final, which gives the same answers as backward chaining.
+
+    A rule whose antecedent is the concluded variable itself counts as False, like the circular reference it is for
+    Node.solve. Variables that are still waiting when the agenda runs dry depend on a cycle: only they, and the
+    queries, are solved with backward chaining, in the same evaluation, so every value the propagation has already
+    found is reused; the other variables are read straight from the values of the propagation. With cycles, a value
+    depends on the order the variables are solved in, so the queries are solved first, in order, like
+    KnowledgeBase.solve does: the values found by the propagation do not depend on any cycle, so the walk meets the
+    nodes of the cycles in the same order, and the queries get the same answers as with backward chaining.
+    Args:    knowledge_base (KnowledgeBase): The rule base to solve.
+             facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+             queries (Iterable[str], optional): The variables solved first. Defaults to the queries of the file.
+    Returns: Dict[str, bool]: The value of every variable of the rule base.
+    """
+    evaluation = knowledge_base.evaluation(facts)
+    values = evaluation.values
+    parents, conclusions, pending = build_antecedent_index(knowledge_base)
+    remaining = {}
+    accumulated = {}
+    agenda = deque()
+
+    def conclude(variable: str, value: bool):
+        node = knowledge_base.variables[variable]
+        values[node.index] = value
+        agenda.append(node)
+
+    for variable, node in knowledge_base.variables.items():
+        if values[node.index] is not None:
+            agenda.append(node)
+            continue
+        remaining[variable] = 0
+        accumulated[variable] = False
+        for root in knowledge_base.rules.get(variable, ()):
+            if root is not node:
+                remaining[variable] += 1
+        if remaining[variable] == 0:
+            conclude(variable, False)
+
+    while agenda:
+        node = agenda.popleft()
+        for parent in parents.get(node, ()):
+            pending[parent] -= 1
+            if pending[parent] == 0:
+                values[parent.index] = apply_operator(parent, values)
+                agenda.append(parent)
+        for variable in conclusions.get(node, ()):
+            if variable not in remaining or remaining[variable] == 0 or node is knowledge_base.variables[variable]:
+                continue
+            accumulated[variable] = accumulated[variable] or values[node.index]
+            remaining[variable] -= 1
+            if remaining[variable] == 0:
+                conclude(variable, accumulated[variable])
+
+    results = {query: evaluation.solve(query) for query in (knowledge_base.queries if queries is None else queries)}
+    for variable, node in knowledge_base.variables.items():
+        if variable not in results:
+            value = values[node.index]
+            results[variable] = evaluation.solve(variable) if value is None else value
+    return results
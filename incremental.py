@@ -0,0 +1,269 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import parse
+from Rule import Node
+from KnowledgeBase import KnowledgeBase
+from forward import build_antecedent_index
+from scc import dependency_graph, strongly_connected_components
+
+
+class IncrementalSession:
+    """
+    Keeps the answers to the queries of a rule base up to date while facts are asserted or retracted and rules are
+    added or removed, without solving everything again.
+
+    The session indexes, for every node, the operators that use it and the variables its rule concludes. When a
+    variable changes, only the values reachable upward from its leaf through this index are forgotten; every other
+    value of the evaluation is still valid and is reused when the queries are solved again.
+    On a cycle of the rules, a value depends on where the variable is read and on the order the queries were solved
+    in (see Rule.Node.solve_occurrences). When a change reaches a cycle, because a variable whose value it forgets, or
+    the variable that changed, has rules reaching one, every value is forgotten and the queries are solved again in
+    order, so the answers are always those of a new KnowledgeBase.solve.
+    The session works on its own copy of the rule base, so the original can still be shared and solved elsewhere.
+    Attributes:
+        knowledge_base (KnowledgeBase): The private copy of the rule base.
+        evaluation (Evaluation): The evaluation kept up to date.
+        parents (Dict[Node, List[Node]]): For each node, the operator nodes that use it as an operand.
+        conclusions (Dict[Node, List[str]]): For each rule root, the variables it concludes.
+        indexed (Set[Node]): The operator nodes whose operands are registered in parents.
+        stale (Set[Node]): The nodes whose value was forgotten since the queries were last solved.
+        cycles (Set[str]): The variables on a cycle of the rules, or None until they are needed again. Removing a rule
+                           keeps them, which can only cause a needless full solve.
+        answers (Dict[str, bool]): The current answer to each query.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase):
+        """
+        Starts a session on a rule base and solves its queries.
+        Args:    knowledge_base (KnowledgeBase): The rule base, which is copied.
+        """
+        self.knowledge_base = knowledge_base.copy()
+        self.evaluation = self.knowledge_base.evaluation()
+        self.parents, self.conclusions, pending = build_antecedent_index(self.knowledge_base)
+        self.indexed = set(pending)
+        self.stale = set()
+        self.cycles: Optional[Set[str]] = None
+        self.answers: Dict[str, bool] = {}
+        self.refresh()
+
+    def assert_fact(self, fact: str) -> Dict[str, bool]:
+        """
+        Makes a variable an initial fact.
+        Args:    fact (str): The variable.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        """
+        if fact in self.evaluation.facts:
+            return {}
+        node = self.knowledge_base.intern_node(fact)
+        self.grow()
+        self.evaluation.facts.add(fact)
+        self.settle(node, self.invalidate(node))
+        return self.refresh()
+
+    def retract_fact(self, fact: str) -> Dict[str, bool]:
+        """
+        Makes a variable no longer an initial fact; its value then comes from its rules.
+        Args:    fact (str): The variable.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        """
+        if fact not in self.evaluation.facts:
+            return {}
+        self.evaluation.facts.discard(fact)
+        node = self.knowledge_base.variables[fact]
+        self.settle(node, self.invalidate(node))
+        return self.refresh()
+
+    def add_rule(self, rule: str, compiled: Optional[Sequence[Tuple[str, Node]]] = None,
+                 positions: Optional[List[int]] = None) -> Dict[str, bool]:
+        """
+        Adds a rule, written like in a file ("A + B => C").
+        Args:    rule (str): The rule.
+                 compiled (Sequence[Tuple[str, Node]], optional): The rule as returned by parse.compile_rule, if it was
+                                                                  already compiled.
+                 positions (List[int], optional): The index of the rule among the rules of each of its conclusions, in
+                                                  order. Defaults to after them.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        Raises:  parse.ParseError: If the rule is invalid.
+        """
+        if compiled is None:
+            compiled = parse.compile_rule(rule, self.knowledge_base)
+        self.cycles = None
+        for number, (conclusion, antecedent) in enumerate(compiled):
+            self.knowledge_base.add_rule(conclusion, antecedent, None if positions is None else positions[number])
+            self.grow()
+            self.index(antecedent)
+            self.conclusions.setdefault(antecedent, []).append(conclusion)
+            if conclusion in self.knowledge_base.variables and conclusion not in self.evaluation.facts:
+                node = self.knowledge_base.variables[conclusion]
+                self.settle(node, self.invalidate(node))
+        if "<=>" in rule:
+            self.knowledge_base.add_equivalence(tuple(conclusion for conclusion, _ in compiled), compiled[0][1])
+        return self.refresh()
+
+    def remove_rule(self, rule: str, compiled: Optional[Sequence[Tuple[str, Node]]] = None,
+                    positions: Optional[List[int]] = None) -> Dict[str, bool]:
+        """
+        Removes a rule, written like in a file. The index keeps the links of its antecedent, which can only cause some
+        values to be solved again needlessly, never a wrong answer.
+        Args:    rule (str): The rule.
+                 compiled, positions: See add_rule; without positions, the first of the rules of each conclusion
+                                      equal to this one is removed.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        Raises:  parse.ParseError: If the rule is invalid.
+                 ValueError: If the rule base has no such rule.
+        """
+        if compiled is None:
+            compiled = parse.compile_rule(rule, self.knowledge_base)
+        if "<=>" in rule:
+            self.knowledge_base.remove_equivalence(tuple(conclusion for conclusion, _ in compiled), compiled[0][1])
+        self.grow()
+        for number, (conclusion, antecedent) in enumerate(compiled):
+            self.knowledge_base.remove_rule(conclusion, antecedent, None if positions is None else positions[number])
+            self.conclusions[antecedent].remove(conclusion)
+            if conclusion in self.knowledge_base.variables and conclusion not in self.evaluation.facts:
+                node = self.knowledge_base.variables[conclusion]
+                self.settle(node, self.invalidate(node), antecedent)
+        return self.refresh()
+
+    def grow(self):
+        """
+        Gives a value slot to the nodes interned since the evaluation started.
+        """
+        missing = len(self.knowledge_base.nodes) - len(self.evaluation.values)
+        if missing > 0:
+            self.evaluation.values.extend([None] * missing)
+
+    def index(self, root: Node):
+        """
+        Registers the operands of the operator nodes of an antecedent that are not indexed yet.
+        Args:    root (Node): The root of the antecedent.
+        """
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.type == "VARIABLE" or node in self.indexed:
+                continue
+            self.indexed.add(node)
+            for child in (node.left, node.right):
+                if child is not None:
+                    self.parents.setdefault(child, []).append(node)
+                    stack.append(child)
+
+    def invalidate(self, node: Node) -> Set[Node]:
+        """
+        Forgets the value of a variable and of everything that depends on it. An initial fact keeps its value, and the
+        walk does not go through the other initial facts, whose value cannot change.
+        Args:    node (Node): The leaf of the variable that changed.
+        Returns: Set[Node]: The nodes whose value was forgotten, with the leaf.
+        """
+        values = self.evaluation.values
+        facts = self.evaluation.facts
+        variables = self.knowledge_base.variables
+        values[node.index] = True if node.name in facts else None
+        visited = {node}
+        queue = deque([node])
+        while queue:
+            current = queue.popleft()
+            for parent in self.parents.get(current, ()):
+                if parent not in visited:
+                    visited.add(parent)
+                    values[parent.index] = None
+                    queue.append(parent)
+            for conclusion in self.conclusions.get(current, ()):
+                leaf = variables.get(conclusion)
+                if leaf is not None and leaf not in visited and conclusion not in facts:
+                    visited.add(leaf)
+                    values[leaf.index] = None
+                    queue.append(leaf)
+        self.stale |= visited
+        return visited
+
+    def cyclic_variables(self) -> Set[str]:
+        """
+        Finds the variables on a cycle of the rules, whatever the facts, again after a rule is added.
+        Returns: Set[str]: The variables on a cycle.
+        """
+        if self.cycles is None:
+            graph = dependency_graph(self.knowledge_base)
+            self.cycles = set()
+            for component in strongly_connected_components(graph, graph, set()):
+                if len(component) > 1 or component[0] in graph.get(component[0], ()):
+                    self.cycles.update(component)
+        return self.cycles
+
+    def reaches_cycle(self, roots: Iterable[Node]) -> bool:
+        """
+        Tells whether walking nodes, like Node.solve does, can reach a variable on a cycle of the rules.
+        Args:    roots (Iterable[Node]): The nodes walked.
+        Returns: bool: Whether a variable on a cycle is reachable.
+        """
+        cycles = self.cyclic_variables()
+        if not cycles:
+            return False
+        rules = self.knowledge_base.rules
+        stack = list(roots)
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node is None or node in seen:
+                continue
+            seen.add(node)
+            if node.type == "VARIABLE":
+                if node.name in cycles:
+                    return True
+                stack.extend(rules.get(node.name, ()))
+            else:
+                stack.extend((node.left, node.right))
+        return False
+
+    def settle(self, node: Node, forgotten: Iterable[Node], *removed: Node):
+        """
+        Forgets every value when a change of a variable reaches a cycle: when the rules walked below a variable whose
+        value the change forgot, the variable that changed included, reach one before or after the change. Either way
+        the values found through the cycle may differ from a new solve.
+        Args:    node (Node): The leaf of the variable that changed.
+                 forgotten (Iterable[Node]): The nodes whose value the change forgot, see invalidate.
+                 removed (Node): The antecedents of the rules removed from the variable, no longer in the rules.
+        """
+        if not self.cyclic_variables():
+            return
+        if not self.reaches_cycle([other for other in forgotten if other.type == "VARIABLE"] + [node, *removed]):
+            return
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every value, so the queries are all solved again in order.
+        """
+        self.evaluation.reset()
+        self.stale.update(self.knowledge_base.variables[query] for query in self.knowledge_base.queries)
+
+    def set_first_reads(self, first_reads: Dict[str, tuple]) -> Dict[str, bool]:
+        """
+        Replaces the first reads of the variables (KnowledgeBase.first_reads), found again after the rules changed.
+        Since they change values on a cycle of the rules, every value is then forgotten.
+        Args:    first_reads (Dict[str, tuple]): The key of the first read of each variable.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        """
+        if first_reads == self.knowledge_base.first_reads:
+            return {}
+        self.knowledge_base.first_reads.clear()
+        self.knowledge_base.first_reads.update(first_reads)
+        self.reset()
+        return self.refresh()
+
+    def refresh(self) -> Dict[str, bool]:
+        """
+        Solves again the queries whose value was forgotten.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        """
+        changed = {}
+        for query in self.knowledge_base.queries:
+            if query in self.answers and self.knowledge_base.variables[query] not in self.stale:
+                continue
+            answer = self.evaluation.solve(query)
+            if self.answers.get(query) != answer:
+                changed[query] = answer
+            self.answers[query] = answer
+        self.stale.clear()
+        return changed
@@ -1,5 +1,3 @@
-import os
-
 def add_content(parsed_content):
     """
     Adds new content (rule, fact, or query) to the parsed content.
@@ -127,11 +125,11 @@ def remove_empty_lines(parsed_content):
 
 def clear_terminal():
     """
-    Clears the terminal screen.
+    Clears the terminal screen with an ANSI escape sequence, without starting a process.
     Args:    None
     Returns: None
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    print("\033[H\033[2J", end="", flush=True)
 
 def interactive_mode(parsed_content):
     """
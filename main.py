@@ -1,103 +1,27 @@
 #!/usr/bin/env python3
 
-from typing import Tuple
-from parse import check_file, parse_file, read_file
-from parse import queries, global_dict
+from parse import check_file, read_file, join_variables, split_variables, ParseError
+from KnowledgeBase import KnowledgeBase
+from cache import load_knowledge_base
+from runner import list_files, evaluate_files, write_records
 from interactive import interactive_mode
 import argparse
-from graphviz import Digraph
-from Rule import Node
-from typing import Set
-
-
-
-explain: bool = False
-
-def print_tree(node, level=0):
-    """
-    Recursively prints the tree structure of logical rules starting from a given node.
-    The function traverses the tree in a post-order fashion, first visiting the right child,
-    then the current node, and finally the left child. Each node is printed with its name,
-    value, and resolution status. The output is indented to reflect the depth of each node
-    in the tree.
-    Args:    node: The starting node of the tree (or subtree) to be printed.
-             level: The initial level of depth in the tree, used for indentation. Defaults to 0.
-    Returns: None
-    """
-    if node is not None:
-        print_tree(node.right, level + 1)
-        status = "Resolved" if node.hasBeenSolved else "Unresolved"
-        print(' ' * 4 * level + f'-> {node.name} ({node.value}, {status})')
-        print_tree(node.left, level + 1)
-
-def extract_variable_fron_RPN(rpn_expression: str) -> Tuple[str, str]:
-    """
-    Extracts the variable and the remaining RPN expression from a given RPN string.
-    This function is specifically designed to work with RPN expressions that end
-    with a variable followed by its operator. It separates the last three characters
-    (assumed to be the variable and its operator) from the rest of the expression.
-    Args:    rpn_expression: A string representing the RPN expression.
-    Returns: A tuple containing the extracted variable and the modified RPN expression.
-    """
-    variable: str = rpn_expression[-3]
-    rpn_expression = rpn_expression[:-3]
-    return variable, rpn_expression
-
-
-def draw_binary_tree(node: Node, query: str, graph: Digraph, is_root: bool = True, added_nodes: Set[str] = set()) -> Digraph:
-    """
-    Draws a binary tree representing the structure of a set of logical rules.
-
-    This function takes as input a node of the tree, which represents a logical rule, and recursively draws
-    the binary tree starting from this node. The tree is drawn using the Graphviz library. Each node of the tree
-    is represented as a node in the graph, with edges connecting parent nodes to child nodes. The resulting
-    graph can be used to visualize the structure of the logical rules.
-
-    Args:
-        node (RuleNode): The node of the tree to start drawing from.
-        query (str): The logical query associated with the tree.
-        graph (Digraph): The Graphviz Digraph object used for drawing the graph.
-        is_root (bool): Indicates whether the current node is the root of the tree. Defaults to True.
-        added_nodes (set): A set of node names that have already been added to the graph to avoid duplicates.
-
-    Returns:
-        Digraph: The updated Digraph object with the binary tree graph.
-    """
-    if graph is None:
-        graph = Digraph()
-
-    if is_root and node is not None:
-        query_node_id = f"query_{query}"
-        graph.node(query_node_id, label=f"Query: {query}", shape="rectangle")
-        added_nodes.add(query_node_id)
-
-    if node is not None:
-        node_id = f"{node.name}_{id(node)}"
-
-        if node_id not in added_nodes:
-            graph.node(node_id, label=f"{node.name}")
-            added_nodes.add(node_id)
-
-        if is_root:
-            graph.edge(query_node_id, node_id)
-
-        if node.left:
-            left_id = f"{node.left.name}_{id(node.left)}"
-            if left_id not in added_nodes:
-                graph.node(left_id, label=f"{node.left.name}")
-                added_nodes.add(left_id)
-            graph.edge(node_id, left_id)
-            draw_binary_tree(node.left, query, graph, is_root=False, added_nodes=added_nodes)
-
-        if node.right:
-            right_id = f"{node.right.name}_{id(node.right)}"
-            if right_id not in added_nodes:
-                graph.node(right_id, label=f"{node.right.name}")
-                added_nodes.add(right_id)
-            graph.edge(node_id, right_id)
-            draw_binary_tree(node.right, query, graph, is_root=False, added_nodes=added_nodes)
-
-    return graph
+import os
+import sys
+from forward import forward_chain
+from scc import solve_components
+from propagation import solve_propagation
+from codegen import solve_compiled
+from vm import CompactRuleBase
+from session import Session, run_session
+from parallel import solve_parallel
+from result_cache import ResultCache, file_digest, result_key
+from batch import batch_evaluate
+from proof import Prover, TextWriter, JsonWriter, SEPARATOR
+from stats import Stats, Profiler
+from dot import write_dot
+from contextlib import nullcontext
+from io import StringIO
 
 
 def main():
@@ -120,89 +44,211 @@ def main():
                         help="Path to input file", default=None)
     parser.add_argument(
         "--interactive", help="Start in interactive mode", action="store_true")
+    parser.add_argument("--session", help="Keep the rules loaded and read commands from stdin (rules, =facts, ?queries, edit, undo, snapshot, restore...), answering each right away", action="store_true", default=False)
     parser.add_argument("--explain", help="Explain the reasoning", action="store_true", default=False)
+    parser.add_argument("--explain-format", help="Format of the explanations", choices=["text", "json"], default="text")
     parser.add_argument("--graph", help="Draw the graph", action="store_true", default=False)
+    parser.add_argument("--dot", metavar="FILE", help="Write the rules as Graphviz DOT to FILE (- for stdout) instead of answering the queries", default=None)
+    parser.add_argument("--dot-queries", metavar="VARIABLES", help="With --dot, only draw the rules these variables depend on, written like a query line (default: the queries of the file, or every rule with --dot-queries=)", default=None)
+    parser.add_argument("--dot-visited", help="With --dot, solve the queries and only draw the nodes solved, colored after their value", action="store_true", default=False)
+    parser.add_argument("--engine", help="Inference engine used to answer the queries", choices=["backward", "forward", "scc", "propagate", "codegen", "vm"], default="backward")
+    parser.add_argument("--split", help="With the propagate engine, split on variables to settle the queries propagation leaves undetermined", action="store_true", default=False)
+    parser.add_argument("--cache", nargs="?", const="", metavar="DIR", help="Load the compiled rules from a cache next to the input file, or in DIR, compiling and storing them when the file changed", default=None)
+    parser.add_argument("--result-cache", metavar="DIR", help="Keep the answers in DIR, keyed by the content of the input file, and print them without parsing anything when the file is unchanged", default=None)
+    parser.add_argument("--slice", help="Only compile the rules the queries depend on, the rest of the file being validated without being compiled", action="store_true", default=False)
+    parser.add_argument("--stats", help="Print the counters of the solver and the time of each phase to stderr", action="store_true", default=False)
+    parser.add_argument("--stats-format", help="Format of the statistics", choices=["text", "json"], default="text")
+    parser.add_argument("--batch", metavar="DIR", help="Evaluate every .txt file of DIR and print one JSON record per file", default=None)
+    parser.add_argument("--parallel", help="Solve the queries that depend on disjoint parts of the rules concurrently, in worker processes", action="store_true", default=False)
+    parser.add_argument("--jobs", type=int, metavar="N", help="Number of worker processes used by --batch and --parallel (default: one per CPU)", default=None)
+    parser.add_argument("--scenarios", metavar="FILE", help="Evaluate the rules for every set of initial facts of FILE, one per line (- for stdin)", default=None)
     args = parser.parse_args()
+    if args.batch is not None:
+        if args.input_file is not None or args.interactive or args.session or args.explain or args.graph or args.dot is not None \
+                or args.scenarios is not None or args.parallel or args.result_cache is not None or args.slice or args.stats \
+                or args.split:
+            parser.error("--batch only takes --engine, --cache and --jobs")
+        try:
+            paths = list_files(args.batch)
+        except OSError:
+            print(f"Error: Cannot access the directory {args.batch}.")
+            exit(1)
+        records = evaluate_files(paths, args.jobs or os.cpu_count() or 1, args.engine, args.cache)
+        if write_records(records, sys.stdout):
+            exit(1)
+        return
     if args.input_file is None:
         parser.print_help()
         return
+    if args.session and (args.interactive or args.explain or args.graph or args.dot is not None or args.scenarios is not None
+                         or args.cache is not None or args.slice or args.stats or args.engine != "backward"):
+        parser.error("--session is not available with other options")
+    if args.parallel and (args.engine != "backward" or args.explain or args.stats or args.interactive or args.session
+                          or args.dot is not None or args.scenarios is not None):
+        parser.error("--parallel is only available when solving the queries with the backward engine")
+    if args.result_cache is not None and (args.interactive or args.session or args.explain or args.stats or args.graph
+                                          or args.dot is not None or args.scenarios is not None):
+        parser.error("--result-cache is only available when answering the queries")
+    if args.split and args.engine != "propagate":
+        parser.error("--split is only available with the propagate engine")
+    if args.explain and args.engine != "backward":
+        parser.error("--explain is only available with the backward engine")
+    if args.explain and args.scenarios is not None:
+        parser.error("--explain is not available with --scenarios")
+    if args.slice and (args.interactive or args.cache is not None or args.engine == "propagate"):
+        parser.error("--slice is not available with --interactive, --cache or the propagate engine")
+    if (args.dot_queries is not None or args.dot_visited) and args.dot is None:
+        parser.error("--dot-queries and --dot-visited are only available with --dot")
+    if args.stats and (args.explain or args.engine != "backward" or args.scenarios is not None):
+        parser.error("--stats is only available when solving the queries with the backward engine")
 
     explain = args.explain
 
-    check_file(args.input_file)
-    parsed_content = read_file(args.input_file)
-
-    if args.interactive:
-        parsed_content = interactive_mode(parsed_content)
-
-
-
+    if not check_file(args.input_file):
+        exit(1)
+
+    if args.session:
+        try:
+            session = Session.from_file(args.input_file)
+        except ParseError as error:
+            print("\n".join(error.warnings + [str(error)]))
+            exit(1)
+        interactive = sys.stdin.isatty()
+        if interactive:
+            print("Type help for the list of commands.")
+        if not run_session(session, sys.stdin, sys.stdout, prompt=interactive) and not interactive:
+            exit(1)
+        return
 
-    parse_file(parsed_content)
+    result_cache = key = None
+    if args.result_cache is not None:
+        result_cache = ResultCache(directory=args.result_cache)
+        key = result_key(file_digest(args.input_file), (), (), args.engine + (" split" if args.split else ""))
+        entry = result_cache.get(key)
+        if entry is not None:
+            for warning in entry["warnings"]:
+                print(warning)
+            for query, value in entry["results"].items():
+                print(f"{query}: {value}")
+            return
+
+    stats = Stats() if args.stats else None
+    try:
+        if args.cache is not None and not args.interactive:
+            with stats.phase("load") if stats else nullcontext():
+                knowledge_base = load_knowledge_base(args.input_file, args.cache)
+        elif args.interactive:
+            knowledge_base = KnowledgeBase.from_content(interactive_mode(read_file(args.input_file)))
+        elif args.slice:
+            with stats.phase("load") if stats else nullcontext():
+                knowledge_base = KnowledgeBase.from_slice(args.input_file)
+        elif stats is not None:
+            with stats.phase("read"):
+                parsed_content = read_file(args.input_file)
+            with stats.phase("compile"):
+                knowledge_base = KnowledgeBase.from_content(parsed_content)
+        else:
+            knowledge_base = KnowledgeBase.from_file(args.input_file)
+    except ParseError as error:
+        print("\n".join(error.warnings + [str(error)]))
+        exit(1)
+    for warning in knowledge_base.warnings:
+        print(warning, file=sys.stderr if args.dot == "-" else sys.stdout)
 
     if args.graph:
         # Créer un seul graphique pour tous les arbres
-        master_graph = Digraph()
-
-        for variable in global_dict:
-            if variable in "!+^|":
-                continue
-            for rule in global_dict[variable]:
-                draw_binary_tree(rule, f"{variable}", master_graph)
+        from graphviz import Source
+        source = StringIO()
+        write_dot(knowledge_base, source)
+        Source(source.getvalue()).render("master_graph", view=True)
+
+    if args.dot is not None:
+        queries = knowledge_base.queries
+        if args.dot_queries is not None:
+            queries = split_variables(args.dot_queries) if args.dot_queries else None
+            if queries is None and args.dot_queries:
+                print(f"Error: Invalid variables ({args.dot_queries}).")
+                exit(1)
+        values = None
+        if args.dot_visited:
+            evaluation = knowledge_base.evaluation()
+            for query in queries if queries is not None else knowledge_base.queries:
+                evaluation.solve(query)
+            values = evaluation.values
+        try:
+            with nullcontext(sys.stdout) if args.dot == "-" else open(args.dot, "w") as stream:
+                write_dot(knowledge_base, stream, queries, values)
+        except OSError:
+            print(f"Error: Cannot write the file {args.dot}.")
+            exit(1)
+        return
 
-        master_graph.render("master_graph", view=True)
 
+    if args.scenarios is not None:
+        ordered_queries = sorted(knowledge_base.queries)
+        try:
+            with nullcontext(sys.stdin) if args.scenarios == "-" else open(args.scenarios, "r") as stream:
+                print("\t".join(["facts"] + ordered_queries))
+                sys.stdout.writelines(
+                    "\t".join(["=" + join_variables(sorted(scenario))] + [str(values[query]) for query in ordered_queries]) + "\n"
+                    for scenario, values in batch_evaluate(knowledge_base, stream, ordered_queries))
+        except OSError:
+            print(f"Error: Cannot access the file {args.scenarios}.")
+            exit(1)
+        except ValueError as error:
+            print(error)
+            exit(1)
+        return
 
     if explain:
-        print("\n-----------------------------------\n")
-    for query in queries:
-        if explain:
-            print(f"Trying to solve '{query}':")
-        if query in global_dict:
-
-            result = False
-            all_explanations = []
-            for node in global_dict[query]:
-                node_result, explanations = node.solve(explain=explain)
-                all_explanations.extend(explanations)
-                result = result or node_result
-                if result:
-                    break
-            if explain:
-                for explanation in all_explanations:
-                    print(explanation)
-            print(f"{query}: {result}")
+        prover = Prover(knowledge_base.evaluation())
+        if args.explain_format == "json":
+            writer = JsonWriter(sys.stdout)
         else:
-            if explain:
-                print(f"There is no rule for '{query}'. Therefore, {query}: False")
-            else:
-                print(f"{query}: False")
-        if explain:
-            print("\n-----------------------------------\n")
+            writer = TextWriter(sys.stdout)
+            print(SEPARATOR)
+        for query in knowledge_base.queries:
+            writer.write(prover.prove_query(query))
+        return
+
+    if stats is not None:
+        profiler = Profiler(knowledge_base.evaluation(), stats)
+        with stats.phase("solve"):
+            answers = [(query, profiler.solve(query)) for query in knowledge_base.queries]
+        for query, answer in answers:
+            print(f"{query}: {answer}")
+        sys.stdout.flush()
+        if args.stats_format == "json":
+            stats.write_json(sys.stderr)
+        else:
+            stats.write_text(sys.stderr)
+        return
 
+    warnings = knowledge_base.warnings
+    if args.engine == "forward":
+        values = forward_chain(knowledge_base)
+        answers = {query: values[query] for query in knowledge_base.queries}
+    elif args.engine == "scc":
+        answers = solve_components(knowledge_base)
+    elif args.engine == "propagate":
+        answers = solve_propagation(knowledge_base, split=args.split)
+    elif args.engine == "codegen":
+        answers = solve_compiled(knowledge_base)
+    elif args.engine == "vm":
+        compact = CompactRuleBase(knowledge_base)
+        del knowledge_base
+        answers = compact.solve()
+    elif args.parallel:
+        answers = solve_parallel(knowledge_base, jobs=args.jobs or os.cpu_count() or 1)
+    else:
+        evaluation = knowledge_base.evaluation()
+        answers = {query: evaluation.solve(query) for query in knowledge_base.queries}
+
+    for query, value in answers.items():
+        print(f"{query}: {value}")
+    if result_cache is not None:
+        result_cache.put(key, {"results": answers, "warnings": warnings})
 
-    # print(f"final global_dict:\n{global_dict}")
 
 if __name__ == "__main__":
     main()
-    pass
-
-    # Debug :
-    # print("-----------------------------------")
-    # print("Rules (RPN format):")
-    # for rule in rules:
-    #     print(rule)
-    # print("-----------------------------------")
-    # print("Queries:")
-    # for query in queries:
-    #     print(query)
-    # print("-----------------------------------")
-    # print("Known variables:")
-    # for variable in global_dict:
-    #     print(variable)
-    # print("-----------------------------------")
-
-
-    # print(global_dict)
-
-    # print("----------   SOLVING   ----------")
@@ -0,0 +1,107 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from KnowledgeBase import KnowledgeBase
+from cache import dump, loads
+
+# Digest the rule base sent to the workers is serialized with: it does not come from a source file
+DIGEST = bytes(32)
+
+# Number of tasks per worker, so that a slow component does not leave the other workers idle
+TASKS_PER_JOB = 4
+
+# The rule base of a worker process, loaded once by its initializer
+_worker_base: Optional[KnowledgeBase] = None
+
+
+def query_components(knowledge_base: KnowledgeBase, queries: Iterable[str], facts: Optional[Iterable[str]] = None) -> List[List[str]]:
+    """
+    Groups queries into components whose backward solves never meet: two queries are in the same component when the
+    nodes their solve can reach share a node other than an initial fact, whose value is known from the start. A node
+    reached by the walk of an earlier query is not walked again; its component is merged instead, so every node is
+    visited once.
+    Solving each component in its own evaluation then gives the same answers as solving every query in one, even
+    with cyclic rules, since the value of a node can only depend on the nodes it reaches.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             queries (Iterable[str]): The queried variables.
+             facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+    Returns: List[List[str]]: The queries of each component, in order, the components being ordered by their first query.
+    """
+    queries = list(queries)
+    facts = knowledge_base.facts if facts is None else set(facts)
+    rules = knowledge_base.rules
+    owners: List[int] = [-1] * len(knowledge_base.nodes)
+    parents = list(range(len(queries)))
+
+    def find(position: int) -> int:
+        while parents[position] != position:
+            parents[position] = parents[parents[position]]
+            position = parents[position]
+        return position
+
+    for position, query in enumerate(queries):
+        node = knowledge_base.variables.get(query)
+        stack = [node] if node is not None and query not in facts else []
+        while stack:
+            node = stack.pop()
+            owner = owners[node.index]
+            if owner >= 0:
+                parents[find(owner)] = find(position)
+                continue
+            owners[node.index] = position
+            if node.type == "OPERATOR":
+                stack.extend(child for child in (node.left, node.right) if child is not None and child.name not in facts)
+            else:
+                stack.extend(root for root in rules.get(node.name, ()) if root.name not in facts)
+
+    components: Dict[int, List[str]] = {}
+    for position, query in enumerate(queries):
+        components.setdefault(find(position), []).append(query)
+    return list(components.values())
+
+
+def load_worker(blob: bytes, facts: List[str]):
+    """
+    Initializes a worker process with the rule base, serialized once for all its tasks.
+    Args:    blob (bytes): The rule base, as serialized by cache.dump.
+             facts (List[str]): The initial facts to solve with.
+    """
+    global _worker_base
+    _worker_base = loads(blob, DIGEST)
+    _worker_base.facts = set(facts)
+
+
+def solve_component(queries: List[str]) -> Dict[str, bool]:
+    """
+    Solves the queries of a component in a worker, in a new evaluation.
+    Args:    queries (List[str]): The queries of the component, in order.
+    Returns: Dict[str, bool]: The value of each query.
+    """
+    return _worker_base.solve(queries)
+
+
+def solve_parallel(knowledge_base: KnowledgeBase, queries: Optional[Iterable[str]] = None,
+                   facts: Optional[Iterable[str]] = None, jobs: int = 1) -> Dict[str, bool]:
+    """
+    Solves queries with backward chaining, their independent components being solved concurrently by a pool of
+    worker processes. The rule base is sent to each worker once, when it starts, rather than with every task, and the
+    answers are the same as with KnowledgeBase.solve, in the same order. With a single component or a single job,
+    everything is solved in this process.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             queries (Iterable[str], optional): The queried variables. Defaults to the queries of the file.
+             facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+             jobs (int, optional): The number of worker processes. Defaults to 1.
+    Returns: Dict[str, bool]: The value of each query, in order.
+    """
+    queries = list(knowledge_base.queries if queries is None else queries)
+    facts = sorted(knowledge_base.facts if facts is None else set(facts))
+    components = query_components(knowledge_base, queries, facts)
+    jobs = min(jobs, len(components))
+    if jobs <= 1:
+        return knowledge_base.solve(queries, facts)
+
+    results = {}
+    chunk_size = max(1, len(components) // (jobs * TASKS_PER_JOB))
+    with ProcessPoolExecutor(jobs, initializer=load_worker, initargs=(dump(knowledge_base, DIGEST), facts)) as pool:
+        for values in pool.map(solve_component, components, chunksize=chunk_size):
+            results.update(values)
+    return {query: results[query] for query in queries}
@@ -1,83 +1,100 @@
-from typing import Tuple
+from typing import List, Optional, Tuple
 import re
-import Rule
 
-# global_dict est désormais un dictionnaire de listes de Node
-global_dict = {}  # Key: variable, Value: List[Rule.Node]
+# A variable: a single uppercase letter, or an identifier continued with lowercase letters, digits and underscores
+VARIABLE = re.compile(r'[A-Z][a-z0-9_]*')
 
-# Queries declared variable in files
-queries = set()
+# The tokens of an expression: variables, operators and parentheses
+TOKEN = re.compile(r'[A-Z][a-z0-9_]*|[!+|^()]')
 
-# List of rules
-rules = []
+# The tokens of a rule: variables, implications, operators and parentheses, and any other character but a space
+RULE_TOKEN = re.compile(r'[A-Z][a-z0-9_]*|[<=>]+|[!+|^()]|[^ ]')
 
-def pre_process_rpn(rpn_expression):
+# A character that cannot appear in a rule, or that cannot start a token
+INVALID_CHARACTER = re.compile(r'[^A-Za-z0-9_!+|^()<=> ]|(?<![A-Za-z0-9_])[a-z0-9_]')
+
+# A run of implication characters, of which a rule has exactly one, '=>' or '<=>'
+IMPLICATION = re.compile(r'[<=>]+')
+
+# The tokens of an expression that are not variables
+OPERATOR_TOKENS = frozenset("!+|^()")
+
+# Binding power of the binary operators: '+' binds tighter than '|', which binds tighter than '^'
+BINDING_POWER = {"+": 3, "|": 2, "^": 1}
+
+class ParseError(ValueError):
     """
-    Preprocesses a Reverse Polish Notation (RPN) expression by handling negation operators.
-    This function iterates over the RPN expression and adjusts it to correctly process negations.
-    It ensures that the '!' operator is immediately followed by its operand.
-    Args:    rpn_expression (str): The RPN expression to be preprocessed.
-    Returns: str: The preprocessed RPN expression with adjusted negations.
-    Raises:  ValueError: If a negation operator ('!') is incorrectly placed at the end of the expression.
+    Raised when the content of a file is not a valid rule base. When a file has several errors, a single ParseError
+    describes the first one and lists them all, one per line of its text.
+    Attributes:
+        message (str): The description of the error.
+        content (str, optional): The line, or part of a line, the error was found in.
+        line (int, optional): The number of the line the error was found in, counting from 1.
+        column (int, optional): The column of the error in its rule, counting from 1.
+        errors (List[ParseError]): Every error found, this one first.
+        warnings (List[str]): The warnings of the file, such as its unused facts, printed before the errors.
     """
-    tokens = list(rpn_expression)
-    processed_tokens = []
-    skip_next = False
 
-    for i, token in enumerate(tokens):
-        if skip_next:
-            skip_next = False
-            continue
+    def __init__(self, message: str, content: str = None, line: int = None, column: int = None):
+        location = ", ".join(f"{name} {value}" for name, value in (("line", line), ("column", column)) if value is not None)
+        super().__init__(f"{message} ({location})" if location else message)
+        self.message = message
+        self.content = content
+        self.line = line
+        self.column = column
+        self.errors = [self]
+        self.warnings: List[str] = []
+
+    @classmethod
+    def combine(cls, errors: List["ParseError"]) -> "ParseError":
+        """
+        Gathers several errors into one.
+        :param errors: The errors, in the order they were found.
+        :return: The first error, listing them all.
+        """
+        error = errors[0]
+        if len(errors) > 1:
+            error = cls(error.message, error.content, error.line, error.column)
+            error.args = ("\n".join(str(other) for other in errors),)
+            error.errors = list(errors)
+        return error
+
+def is_variable(token: str) -> bool:
+    """
+    Checks if a token is a variable name.
+    :param token: The token to check.
+    :return: True if the token is a variable, False otherwise.
+    """
+    if len(token) == 1:
+        return "A" <= token <= "Z"
+    return VARIABLE.fullmatch(token) is not None
 
-        if token == "!":
-            if i + 1 < len(tokens):
-                processed_tokens.append(tokens[i + 1])
-                processed_tokens.append(token)
-                skip_next = True
-            else:
-                raise ValueError(
-                    "Expression RPN invalide: '!' à la fin de l'expression")
-        else:
-            processed_tokens.append(token)
-
-    return ''.join(processed_tokens)
-
-def construct_tree(rpn_expression):
-    """
-    Constructs a logical tree from a given RPN expression.
-    This function uses the preprocessed RPN expression to build a tree structure where each node represents
-    a logical operator or a variable. The tree is constructed by creating nodes and stacking them according
-    to the RPN rules, ensuring correct logical evaluation order.
-    Args:    rpn_expression (str): The RPN expression used to construct the logical tree.
-    Returns: Rule.Node or None: The root node of the constructed logical tree, or None if the tree cannot be constructed.
-    Note:    The function relies on a global dictionary (global_dict) to store and access nodes associated with variables.
-    """
-    pre_rpn = pre_process_rpn(rpn_expression)
-    tokens = list(pre_rpn)
-    stack = []
-
-    for token in tokens:
-        if token in global_dict and token not in "+|^":
-            stack.append(Rule.Node(token, False))
-            continue
-
-        if token in "+|^":
-            node = Rule.Node(token)
-            node.right = stack.pop() if stack else None
-            node.left = stack.pop() if stack else None
-        elif token == "!":
-            node = Rule.Node(token)
-            node.right = stack.pop() if stack else None
+def split_variables(content: str) -> Optional[List[str]]:
+    """
+    Reads the variables of a fact or query line. A word of uppercase letters only is a list of single-letter
+    variables ("ABG"); longer names are written as separate words ("Rain, Cold" or "Rain Cold").
+    :param content: The content of the line, after its leading '=' or '?'.
+    :return: The variables in order, or None if a word is neither.
+    """
+    variables = []
+    for word in re.split(r'[\s,]+', content.strip()):
+        if re.fullmatch(r'[A-Z]*', word):
+            variables.extend(word)
+        elif is_variable(word):
+            variables.append(word)
         else:
-            node = Rule.Node(token)
-
-        if node.name not in global_dict:
-            global_dict[node.name] = []
-        global_dict[node.name].append(node)
-
-        stack.append(node)
+            return None
+    return variables
 
-    return stack.pop() if stack else None
+def join_variables(variables) -> str:
+    """
+    Writes variables the way split_variables reads them: concatenated when they are all single letters, separated
+    by spaces otherwise.
+    :param variables: The variables.
+    :return: The content of a fact or query line.
+    """
+    variables = list(variables)
+    return "".join(variables) if all(len(variable) == 1 for variable in variables) else " ".join(variables)
 
 def parse_line(line: str) -> Tuple[str, str]:
     """
@@ -90,7 +107,7 @@ def parse_line(line: str) -> Tuple[str, str]:
 
     if line == "":
         return ("empty", line)
-    if re.match(r'^[A-Z!+|^()=>< ]+=>', line) or re.match(r'^[A-Z!+|^()=>< ]+<=>', line):
+    if re.match(r'^[A-Za-z0-9_!+|^()=>< ]+=>', line) or re.match(r'^[A-Za-z0-9_!+|^()=>< ]+<=>', line):
         return ("rule", line)
     elif line.startswith("="):
         return ("fact", line[1:])
@@ -99,221 +116,408 @@ def parse_line(line: str) -> Tuple[str, str]:
     else:
         return ("unknown", line)
 
-def is_valid_rpn(rpn_expression: str) -> bool:
-    """
-    Checks if a given RPN (Reverse Polish Notation) expression is valid.
-    :param rpn_expression: The RPN expression to check.
-    :return: True if the expression is valid, False otherwise.
-    """
-    stack = 0
-    i = 0
-    while i < len(rpn_expression):
-        char = rpn_expression[i]
-
-        if char.isalpha() and char.isupper():
-            stack += 1
-        elif char in ['+', '|', '^']:
-            if stack < 2:
-                return False
-            stack -= 1
-        elif char == '!':
-            if i + 1 < len(rpn_expression) and rpn_expression[i + 1].isalpha() and rpn_expression[i + 1].isupper():
-                stack += 1
-                i += 1
-            else:
-                return False
-        else:
-            return False
-
-        i += 1
-    return stack == 1
-
-def to_rpn(expression: str) -> str:
-    """
-    Converts a regular mathematical/logical expression to Reverse Polish Notation (RPN).
-    :param expression: The expression to convert.
-    :return: The converted RPN expression as a string.
-    """
-    precedence = {'!': 4, '+': 3, '|': 2, '^': 1, '(': 0, ')': 0}
-    output = []
-    stack = []
-
-    i = 0
-    while i < len(expression):
-        char = expression[i]
-
-        if char.isalpha() and char.isupper():
-            output.append(char)
-        elif char == '!':
-            # Gérer le '!' comme opérateur unaire
-            if i + 1 < len(expression) and expression[i + 1].isalpha() and expression[i + 1].isupper():
-                output.append(char + expression[i + 1])
-                i += 1  # Passer le caractère suivant (la variable après '!')
-            else:
-                return "Error: operator mismatch"
-        elif char in ['+', '|', '^']:
-            while stack and precedence[stack[-1]] >= precedence[char]:
-                output.append(stack.pop())
-            stack.append(char)
-        elif char == '(':
-            stack.append(char)
-        elif char == ')':
-            while stack and stack[-1] != '(':
-                output.append(stack.pop())
-            if stack:
-                stack.pop()
-            else:
-                return "Error: parenthesis mismatch"
+def token_column(rule: str, index: int) -> int:
+    """
+    Finds where a token of a rule starts, to report an error; only called once the rule is known to be invalid.
+    :param rule: The rule.
+    :param index: The index of the token, as split by RULE_TOKEN.
+    :return: The column of the token, counting from 1, or the column after the last token.
+    """
+    column = 1
+    for position, match in enumerate(RULE_TOKEN.finditer(rule)):
+        if position == index:
+            return match.start() + 1
+        column = match.end() + 1
+    return column
+
+def scan_rule(rule: str) -> Tuple[List[str], int, str]:
+    """
+    Splits a rule into tokens and checks its characters and its implication.
+    :param rule: The rule.
+    :return: The tokens, the index of the implication among them, and the relation ('=>' or '<=>'); raises a
+             ParseError at the first invalid character or implication.
+    """
+    compact = rule.replace(" ", "")
+    invalid = INVALID_CHARACTER.search(rule)
+    if invalid:
+        raise ParseError(f"Error: Invalid characters in rule ({compact}).", compact, column=invalid.start() + 1)
+    implications = list(IMPLICATION.finditer(rule))
+    if len(implications) != 1 or implications[0].group() not in ("=>", "<=>"):
+        wrong = implications[0] if len(implications) != 2 and implications else implications[1] if implications else None
+        raise ParseError(f"Error: Rule must contain exactly one valid implication operator : => or <=> ({compact}).",
+                         compact, column=wrong.start() + 1 if wrong else None)
+    relation = implications[0].group()
+    tokens = RULE_TOKEN.findall(rule)
+    split = tokens.index(relation)
+    if split == 0 or split == len(tokens) - 1:
+        raise ParseError(f"Error: Rule must have at least one operand on each side ({compact}).", compact,
+                         column=implications[0].start() + 1 if split else 1)
+    return tokens, split, relation
+
+def parse_expression(rule: str, tokens: List[str], start: int, end: int, make):
+    """
+    Builds an expression from its tokens with a precedence-climbing parser, calling make for each node as soon as its
+    operands are built, so the nodes are made in postfix order and no intermediate notation is produced.
+    '!' applies to the variable that follows it, '+' binds tighter than '|', which binds tighter than '^', and binary
+    operators are left-associative: "A + B + C" is "(A + B) + C".
+    :param rule: The rule, for the error messages.
+    :param tokens: The tokens of the rule, as returned by scan_rule.
+    :param start: The index of the first token of the expression.
+    :param end: The index after its last token.
+    :param make: Called as make(name, left, right) to build a node from its operands (None when absent), such as
+                 KnowledgeBase.intern_node.
+    :return: The root of the expression, as returned by make; raises a ParseError at the first unexpected token.
+    """
+    position = start
+
+    def fail():
+        compact = rule.replace(" ", "")
+        raise ParseError(f"Error: Rule is not valid ({compact}).", compact, column=token_column(rule, position)
+                         if position < end else token_column(rule, end - 1) + len(tokens[end - 1]))
+
+    def operand():
+        nonlocal position
+        token = tokens[position] if position < end else ")"
+        position += 1
+        if token == "(":
+            node = expression(0)
+            if position == end or tokens[position] != ")":
+                fail()
+            position += 1
+            return node
+        if token == "!":
+            if position == end or tokens[position] in OPERATOR_TOKENS:
+                fail()
+            position += 1
+            return make("!", None, make(tokens[position - 1], None, None))
+        if token in OPERATOR_TOKENS:
+            position -= 1
+            fail()
+        return make(token, None, None)
+
+    def expression(minimum: int):
+        nonlocal position
+        left = operand()
+        while position < end:
+            operator = tokens[position]
+            power = BINDING_POWER.get(operator, 0)
+            if power <= minimum:
+                break
+            position += 1
+            left = make(operator, left, expression(power))
+        return left
+
+    root = expression(0)
+    if position < end:
+        fail()
+    return root
+
+def parse_rule(rule: str, make) -> Tuple[object, List[str], str]:
+    """
+    Parses a rule: its text is split into tokens, and each side is parsed from them directly into a tree.
+    The right side is parsed first, so nothing is built for a rule whose conclusions are invalid.
+    :param rule: The rule.
+    :param make: Called as make(name, left, right) to build each node of the antecedent, see parse_expression.
+    :return: The root of the antecedent, as returned by make, the concluded variables in order and without duplicates
+             ("!V" when negated), and the relation; raises a ParseError with the column of the error if the rule is
+             invalid.
+    """
+    tokens, split, relation = scan_rule(rule)
+    for index in range(split + 1, len(tokens)):
+        if tokens[index] in ("|", "^"):
+            compact = rule.replace(" ", "")
+            raise ParseError(f"Error: Right side of rule must not contain any operator ({compact}).", compact,
+                             column=token_column(rule, index))
+    try:
+        if len(tokens) == split + 2 and tokens[-1] not in OPERATOR_TOKENS:
+            conclusions = [tokens[-1]]
         else:
-            return "Error: invalid character"
-
-        i += 1
+            stack = [parse_expression(rule, tokens, split + 1, len(tokens), lambda name, left, right: (name, left, right))]
+            conclusions = {}
+            while stack:
+                name, left, right = stack.pop()
+                if name == "!":
+                    conclusions["!" + right[0]] = None
+                elif name == "+":
+                    stack += (right, left)
+                else:
+                    conclusions[name] = None
+            conclusions = list(conclusions)
+        return parse_expression(rule, tokens, 0, split, make), conclusions, relation
+    except RecursionError:
+        compact = rule.replace(" ", "")
+        raise ParseError(f"Error: Rule is nested too deeply ({compact}).", compact) from None
+
+def analyze_rule(rule: str) -> Tuple[List[str], List[str], str]:
+    """
+    Validates a single rule, ensuring it adheres to the defined syntax and structure, without building anything.
+    :param rule: The rule to validate.
+    :return: The variables of the left side of the rule, its concluded variables, and its relation; raises a
+             ParseError if the rule is invalid.
+    """
+    premises = {}
 
-    while stack:
-        if stack[-1] == '(':
-            return "Error: parenthesis mismatch"
-        output.append(stack.pop())
+    def make(name, left, right):
+        if name not in OPERATOR_TOKENS:
+            premises[name] = None
 
-    return ''.join(output)
+    _, conclusions, relation = parse_rule(rule, make)
+    return list(premises), conclusions, relation
 
-def fill_known_undefined_variables(parsed_content):
+def compile_rule(rule: str, knowledge_base) -> List[Tuple[str, object]]:
     """
-    Fills the global_dict dictionary with undefined variables found in rules, setting their value to -1 (undefined).
-    :param parsed_content: Parsed content containing types and contents including rules.
+    Validates a single rule, ensuring it adheres to the defined syntax and structure, and builds its antecedent.
+    The nodes are interned in the rule base, but the rule itself is not added to it. Since every node goes through
+    KnowledgeBase.intern_node, the antecedents of the whole rule base form a single DAG in which common subexpressions
+    are shared.
+    :param rule: The rule to compile.
+    :param knowledge_base: The rule base the nodes of the antecedent are interned in.
+    :return: A (conclusion, antecedent root) pair for each concluded variable, all sharing the same antecedent; raises
+             a ParseError if the rule is invalid.
     """
-    for line_type, content in parsed_content:
-        if line_type == "rule":
-            for char in content:
-                if char.isupper() and char not in global_dict:
-                    global_dict[char] = [Rule.Node(char, False)]
+    antecedent, conclusions, _ = parse_rule(rule, knowledge_base.intern_node)
+    return [(conclusion, antecedent) for conclusion in conclusions]
 
-def divide_rule(left_side: str, right_side: str, relation: str) -> dict:
+def unmentioned_variables(rule: str, variables: List[str], conclusions: List[str], mentioned) -> List[str]:
+    """
+    Finds the variables a rule reads before any rule above it mentioned them. The original parser made the leaf of
+    such a read the first rule of the variable, which only changes an answer when the variable is on a cycle (see
+    Rule.Node.solve_occurrences). A rule with a single conclusion mentioned it before its antecedent, and a rule with a
+    negated first conclusion was never read.
+    :param rule: The rule.
+    :param variables: The variables of its antecedent, in the order they are written.
+    :param conclusions: Its concluded variables, as returned by parse_rule.
+    :param mentioned: The sets or dicts holding the variables the rules above mentioned.
+    :return: The variables first read by the rule, in the order they are written.
+    """
+    first = conclusions[0]
+    if first.startswith("!"):
+        return []
+    unmentioned = set(variables)
+    for collection in mentioned:
+        unmentioned = unmentioned.difference(collection)
+    if len(conclusions) == 1 and "+" not in rule[rule.index(">") + 1:]:
+        unmentioned.discard(first)
+    return [variable for variable in variables if variable in unmentioned] if unmentioned else []
+
+def rule_first_reads(rule: str, compiled: List[Tuple[str, object]], index: int, mentioned) -> dict:
+    """
+    Finds the first reads of a rule (KnowledgeBase.first_reads): the concluded variable, the index of the rule among
+    its rules, and the position of the leaf among the leaves of the antecedent, in the order they are written. When the
+    first conclusion is written twice, the original parser dropped the tree holding the leaf, so the first read is
+    only (variable, -1), which no read ever has. The leaves are found in the text of the rule, without walking its
+    tree.
+    :param rule: The rule.
+    :param compiled: Its (conclusion, antecedent root) pairs, as returned by compile_rule.
+    :param index: The number of rules concluding its first conclusion above it.
+    :param mentioned: The sets or dicts holding the variables the rules above mentioned.
+    :return: The first read of each variable the rule reads first.
+    """
+    first = compiled[0][0]
+    leaves = VARIABLE.findall(rule, 0, rule.index("="))
+    unmentioned = unmentioned_variables(rule, leaves, [conclusion for conclusion, _ in compiled], mentioned)
+    if not unmentioned:
+        return {}
+    if rule.count(first, rule.index(">")) > 1:
+        written = TOKEN.findall(rule, rule.index(">") + 1)
+        if sum(token == first and (position == 0 or written[position - 1] != "!")
+               for position, token in enumerate(written)) > 1:
+            return {variable: (variable, -1) for variable in unmentioned}
+    return {variable: (first, index, leaves.index(variable)) for variable in unmentioned}
+
+def drop_unused_first_reads(knowledge_base):
     """
-    Divides a rule with a '+' operator into multiple rules, handling negations.
-    :param left_side: The left side of the rule.
-    :param right_side: The right side of the rule.
-    :param relation: The relation of the rule.
-    :return: A list of rules.
+    Forgets the first reads of the variables without rules: only a variable solved through its rules can be solved
+    again at its first read, so they are never used, and a file reading many variables it never concludes would keep
+    one for each.
+    :param knowledge_base: The rule base.
     """
-    divided_rules = {}
-    variables = re.findall(r'(!?[A-Z])', right_side)
-    for variable in variables:
-        divided_rules[variable] = construct_tree(left_side)
-    return divided_rules
+    for variable in [variable for variable in knowledge_base.first_reads if variable not in knowledge_base.rules]:
+        del knowledge_base.first_reads[variable]
 
-def validate_rule(rule: str) -> bool:
+def load_rule(rule: str, knowledge_base, mentioned=None) -> List[Tuple[str, object]]:
     """
-    Validates a single rule, ensuring it adheres to the defined syntax and structure.
+    Compiles a rule and adds it to the rule base, with the first reads of its variables (see rule_first_reads).
+    :param rule: The rule to compile.
+    :param knowledge_base: The rule base the rule is added to.
+    :param mentioned: The sets or dicts holding the variables the rules above mentioned; by default, the variables
+                      with rules in the rule base and those with a first read.
+    :return: The (conclusion, antecedent root) pairs of the rule, as returned by compile_rule; raises a ParseError if
+             the rule is invalid.
+    """
+    compiled = compile_rule(rule, knowledge_base)
+    if mentioned is None:
+        mentioned = (knowledge_base.rules, knowledge_base.first_reads)
+    index = len(knowledge_base.rules.get(compiled[0][0], ()))
+    knowledge_base.first_reads.update(rule_first_reads(rule, compiled, index, mentioned))
+    for conclusion, antecedent in compiled:
+        knowledge_base.add_rule(conclusion, antecedent)
+    if "<=>" in rule:
+        knowledge_base.add_equivalence(tuple(conclusion for conclusion, _ in compiled), compiled[0][1])
+    return compiled
+
+def validate_rule(rule: str, knowledge_base) -> bool:
+    """
+    Validates a single rule, ensuring it adheres to the defined syntax and structure, and adds it to the rule base.
     :param rule: The rule to validate.
-    :return: True if the rule is valid, raises a ValueError otherwise.
+    :param knowledge_base: The rule base the rule is added to.
+    :return: True if the rule is valid, raises a ParseError otherwise.
     """
-
-    rule = rule.replace(" ", "")
-
-    if not re.match(r'^[A-Z=!<>+|^() ]+$', rule):
-        raise ValueError(f"Error: Invalid characters in rule ({rule}).")
-
-    operators = re.findall(r'[<=>]+', rule)
-
-    if len(operators) != 1 or operators[0] not in ['=>', '<=>']:
-        raise ValueError(
-            f"Error: Rule must contain exactly one valid implication operator : => or <=> ({rule}).")
-    else:
-        relation = operators[0]
-
-    left_side, right_side = re.split(r'[<=>]+', rule, maxsplit=1)
-
-    if not left_side.strip() or not right_side.strip():
-        raise ValueError(
-            f"Error: Rule must have at least one operand on each side ({rule}).")
-
-    left_side = to_rpn(left_side)
-    right_side = to_rpn(right_side)
-    if re.search(r'[|^]', right_side):
-        raise ValueError(
-            f"Error: Right side of rule must not contain any operator ({rule}).")
-
-    if not is_valid_rpn(left_side) or not is_valid_rpn(right_side):
-        raise ValueError(f"Error: Rule is not valid ({rule}).")
-
-    if '+' in right_side:
-        divided_rules = divide_rule(left_side, right_side, relation)
-        for key, value in divided_rules.items():
-            if key not in global_dict:
-                global_dict[key] = []
-            global_dict[key].append(value)
-    else:
-        if right_side not in global_dict:
-            global_dict[right_side] = []
-        global_dict[right_side].append(construct_tree(left_side))
-
+    load_rule(rule, knowledge_base)
     return True
 
-def check_facts_in_rules(parsed_content):
+def check_facts_in_rules(parsed_content) -> List[str]:
     """
     Checks if all facts are present in at least one rule.
     :param parsed_content: Parsed content containing types and contents including rules.
+    :return: A warning for each fact that is not present in any rule.
     """
-    facts = set()
-    rules = []
+    facts = {}
+    used = set()
     for line_type, content in parsed_content:
         if line_type == "fact":
-            facts.update(content)
+            facts.update(dict.fromkeys(split_variables(content) or []))
         elif line_type == "rule":
-            rules.append(content)
-    for fact in facts:
-        if not any(fact in rule for rule in rules):
-            print(f"Warning: Fact '{fact}' is not present in any rule.")
+            used.update(TOKEN.findall(content))
+    return unused_fact_warnings(facts, used)
 
-def validate_file(parsed_content):
+def unused_fact_warnings(facts, used) -> List[str]:
     """
-    Validates the contents of a parsed file, including rules, facts, and queries.
-    :param parsed_content: The parsed content of the file.
-    :raises ValueError: If any part of the file content is invalid.
+    Lists the facts that no rule mentions, looking each one up in the index of the variables used by the rules.
+    :param facts: The facts, in the order they were declared.
+    :param used: The tokens of every rule.
+    :return: A warning for each fact that is not present in any rule.
     """
-    has_rule, has_fact, has_query = False, False, False
+    return [f"Warning: Fact '{fact}' is not present in any rule." for fact in facts if fact not in used]
 
-    check_facts_in_rules(parsed_content)
+def validate_file(parsed_content, knowledge_base, read_rule=validate_rule):
+    """
+    Validates the contents of a parsed file, including rules, facts, and queries, and fills the rule base with them.
+    The content is read in a single pass, so it can be a generator over the lines of a file: each rule is compiled as
+    soon as it is read, and only the rule base and the index of the variables used by the rules are kept. An invalid
+    line does not stop the pass, so every error of the file is reported at once, with the warnings about the facts
+    no rule mentions, invalid rules included.
+    :param parsed_content: The parsed content of the file, an iterable of (type, content) tuples.
+    :param knowledge_base: The rule base that receives the rules, facts, queries and warnings of the file.
+    :param read_rule: Called with each rule and the rule base; validate_rule by default, which compiles it.
+    :raises ParseError: If any part of the file content is invalid, listing every error with the number of the line
+                        it was found in, and carrying the warnings of the file.
+    """
+    has_rule, has_fact, has_query = False, False, False
+    facts = {}
+    used = set()
+    errors = []
 
-    for line_type, content in parsed_content:
-        if line_type == "unknown":
-            raise ValueError(f"Error: Unknown line type detected ({content}).")
+    for number, (line_type, content) in enumerate(parsed_content, 1):
+        try:
+            if line_type == "unknown":
+                raise ParseError(f"Error: Unknown line type detected ({content}).", content)
 
-        if line_type == "rule":
-            try:
-                validate_rule(content)
+            if line_type == "rule":
                 has_rule = True
-            except ValueError as e:
-                print(e)
-                exit(1)
-
-        if line_type == "fact":
-            has_fact = True
-            if not re.match(r'^[A-Z]*$', content):
-                raise ValueError(
-                    f"Error: Invalid characters in facts ({content}).")
-            for fact in content:
-                if fact not in global_dict or not any(node.value for node in global_dict[fact]):
-                    global_dict[fact] = [Rule.Node(fact, True)]
-
-        if line_type == "query":
-            has_query = True
-            if not re.match(r'^[A-Z]+$', content):
-                raise ValueError(
-                    f"Error: Invalid characters in query or query is empty ({content}).")
-            for query in content:
-                if query in queries:
-                    raise ValueError(
-                        f"Error: Duplicate query detected ({query}).")
-                queries.add(query)
+                used.update(TOKEN.findall(content))
+                read_rule(content, knowledge_base)
+
+            if line_type == "fact":
+                has_fact = True
+                variables = split_variables(content)
+                if variables is None:
+                    raise ParseError(
+                        f"Error: Invalid characters in facts ({content}).", content)
+                for fact in variables:
+                    knowledge_base.add_fact(fact)
+                    facts[fact] = None
+
+            if line_type == "query":
+                has_query = True
+                variables = split_variables(content)
+                if not variables:
+                    raise ParseError(
+                        f"Error: Invalid characters in query or query is empty ({content}).", content)
+                for query in variables:
+                    if query in knowledge_base.queries:
+                        raise ParseError(
+                            f"Error: Duplicate query detected ({query}).", content)
+                    knowledge_base.add_query(query)
+        except ParseError as error:
+            errors.append(ParseError(error.message, error.content, number, error.column))
 
     if not has_rule:
-        raise ValueError("Error: Missing rules.")
+        errors.append(ParseError("Error: Missing rules."))
     elif not has_fact:
-        raise ValueError(
-            "Error: Missing facts. Even if there are no facts, there must be an empty fact section, beginning with \"=\".")
+        errors.append(ParseError(
+            "Error: Missing facts. Even if there are no facts, there must be an empty fact section, beginning with \"=\"."))
     elif not has_query:
-        raise ValueError("Error: Missing queries.")
+        errors.append(ParseError("Error: Missing queries."))
+    warnings = unused_fact_warnings(facts, used)
+    if errors:
+        error = ParseError.combine(errors)
+        error.warnings = warnings
+        raise error
+
+    knowledge_base.warnings.extend(warnings)
+    drop_unused_first_reads(knowledge_base)
+
+def load_lines(lines, knowledge_base):
+    """
+    Parses, validates and compiles the lines of a rule file one at a time, without keeping them.
+    :param lines: An iterable over the lines, such as an open file.
+    :param knowledge_base: The rule base that receives the rules, facts, queries and warnings of the file.
+    :raises ParseError: If any part of the file content is invalid.
+    """
+    validate_file(map(parse_line, lines), knowledge_base)
+
+def load_slice(lines, knowledge_base, queries=None):
+    """
+    Loads a file like load_lines, but only compiles the rules the queries depend on. A first pass validates every line
+    without building any tree, and indexes each rule by the variables it concludes, with the variables of its
+    antecedent; the transitive support of the queries is then found in that index, and only its rules are compiled,
+    in the order of the file. The support does not stop at the initial facts, so the slice answers the same queries for
+    any facts. The other rules are checked but never compiled, so the errors and warnings are the same as for the
+    whole file, and the first reads of the variables (see load_rule) are found in the first pass, as in the whole file.
+    :param lines: The lines of the file, such as an open file.
+    :param knowledge_base: The rule base that receives the facts, queries and warnings of the file, and the rules of
+                           the slice.
+    :param queries: The variables to slice for; the queries of the file by default.
+    :raises ParseError: If any part of the file content is invalid, with the number of the line it was found in.
+    """
+    rules = []
+    premises = []
+    unmentioned = []
+    concluding = {}
+    mentioned = set()
+
+    def index_rule(rule, _):
+        variables, conclusions, _ = analyze_rule(rule)
+        unmentioned.append(unmentioned_variables(rule, variables, conclusions, (mentioned,)))
+        mentioned.update(unmentioned[-1])
+        mentioned.update(conclusions)
+        for conclusion in conclusions:
+            concluding.setdefault(conclusion.lstrip("!"), []).append(len(rules))
+        premises.append(tuple(variables))
+        rules.append(rule)
+
+    validate_file(map(parse_line, lines), knowledge_base, index_rule)
+
+    stack = list(knowledge_base.queries if queries is None else queries)
+    reached = set(stack)
+    needed = set()
+    while stack:
+        for position in concluding.get(stack.pop(), ()):
+            if position in needed:
+                continue
+            needed.add(position)
+            for premise in premises[position]:
+                if premise not in reached:
+                    reached.add(premise)
+                    stack.append(premise)
+
+    for position, variables in enumerate(unmentioned):
+        if position not in needed:
+            knowledge_base.first_reads.update((variable, (variable, -1)) for variable in variables)
+    for position in sorted(needed):
+        load_rule(rules[position], knowledge_base, (set(premises[position]).difference(unmentioned[position]),))
+    drop_unused_first_reads(knowledge_base)
 
 def read_file(file_path: str) -> list:
     """
@@ -327,19 +531,6 @@ def read_file(file_path: str) -> list:
             parsed_content.append(parse_line(line))
     return parsed_content
 
-def parse_file(parsed_content):
-    """
-    Parses the content of a file and validates it.
-    :param file_path: Path to the file to be parsed.
-    :return: True if the file content is valid, False otherwise.
-    """
-    try:
-        validate_file(parsed_content)
-    except ValueError as error:
-        print(error)
-        exit(1)
-    fill_known_undefined_variables(parsed_content)
-
 def check_file(file_path: str) -> bool:
     """
     Verifies if a file exists and can be opened.
@@ -0,0 +1,193 @@
+import json
+from typing import Dict, List, Optional, TextIO
+from Rule import Node, BEING_SOLVED
+
+SEPARATOR = "\n-----------------------------------\n"
+
+
+class Proof:
+    """
+    Represents one step of the reasoning that led to the value of a node.
+    Proofs form a DAG that mirrors the rule DAG: a node solved once has a single proof, referenced by every step
+    that used it, instead of being copied.
+    Attributes:
+        kind (str): 'RULE' when the node was solved here from its premises, 'KNOWN' when its value was already known
+                    (an initial fact, or a node solved without explanation), 'CIRCULAR' when the variable was reached
+                    again while being solved, and 'QUERY' for the answer to a query.
+        type (str): The type of the node, either 'OPERATOR' or 'VARIABLE'.
+        name (str): The name of the node, which is either a logical operator or a variable.
+        value (bool): The logical value of the node.
+        premises (List[Proof]): The proofs of the rules of a variable, or of the operands of an operator.
+    """
+
+    __slots__ = ("kind", "type", "name", "value", "premises")
+
+    def __init__(self, kind: str, type: str, name: str, value: bool, premises: Optional[List["Proof"]] = None):
+        self.kind = kind
+        self.type = type
+        self.name = name
+        self.value = value
+        self.premises = premises if premises is not None else []
+
+
+class Prover:
+    """
+    Solves nodes like Node.solve while recording their proofs, only when explanations are requested. It follows
+    Node.solve as its tracer, so the proofs describe the walk of an ordinary solve.
+    Attributes:
+        evaluation (Evaluation): The evaluation whose values are found and reused.
+        proofs (Dict[Node, Proof]): The proof of every node solved so far, shared between queries.
+        premises (List[List[Proof]]): The premises proved so far of each node being solved, innermost last.
+        proof (Proof): The last proof found.
+    """
+
+    def __init__(self, evaluation):
+        self.evaluation = evaluation
+        self.proofs: Dict[Node, Proof] = {}
+        self.premises: List[List[Proof]] = []
+        self.proof: Optional[Proof] = None
+
+    def prove(self, root: Node) -> Proof:
+        """
+        Solves a node and returns its proof. The values are stored in the evaluation by Node.solve itself, so both can
+        be used on the same evaluation.
+        Args:    root (Node): The node to solve.
+        Returns: Proof: The proof of the node.
+        """
+        root.solve(self.evaluation, self)
+        return self.proof
+
+    def enter(self, node: Node, value):
+        """
+        Proves a node reached by the walk whose value is known, or starts the premises of a node solved now, see
+        Node.solve.
+        Args:    node (Node): The node.
+                 value: Its value when it was reached.
+        """
+        if value is None:
+            self.premises.append([])
+            return
+        if value is BEING_SOLVED:
+            proof = Proof("CIRCULAR", node.type, node.name, False)
+        else:
+            proof = self.proofs.get(node)
+            if proof is None or proof.value != value:
+                proof = Proof("KNOWN", node.type, node.name, value)
+        self.conclude(proof)
+
+    def leave(self, node: Node, value):
+        """
+        Proves a node solved by the walk from the proofs of its rules or operands, see Node.solve. When the walk gives
+        up on a cycle, the premises of the node are dropped: it is solved again, and proved again, where it is read.
+        Args:    node (Node): The node.
+                 value: Its value, or Rule.BEING_SOLVED when the walk gave up.
+        """
+        if value is BEING_SOLVED:
+            self.premises.pop()
+            return
+        proof = Proof("RULE", node.type, node.name, value, self.premises.pop())
+        self.proofs[node] = proof
+        self.conclude(proof)
+
+    def conclude(self, proof: Proof):
+        """
+        Adds a proof to the premises of the node being solved.
+        Args:    proof (Proof): The proof.
+        """
+        if self.premises:
+            self.premises[-1].append(proof)
+        self.proof = proof
+
+    def prove_query(self, query: str) -> Proof:
+        """
+        Solves a queried variable like Evaluation.solve, and returns the proof of the answer.
+        Args:    query (str): The queried variable.
+        Returns: Proof: The proof of the answer, whose premises are the proofs of the rules of the variable; without
+                 premises if the rule base has neither rule nor fact for the variable.
+        """
+        knowledge_base = self.evaluation.knowledge_base
+        if query not in knowledge_base.rules and query not in self.evaluation.facts:
+            return Proof("QUERY", "VARIABLE", query, False)
+        proof = self.prove(knowledge_base.variables[query])
+        premises = proof.premises if proof.kind == "RULE" else [proof]
+        return Proof("QUERY", "VARIABLE", query, proof.value, premises)
+
+
+class TextWriter:
+    """
+    Streams proofs as the sentences of the reasoning, one line per step, as soon as each query is proved.
+    A proof already written is not developed again: it is only recalled as already solved.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.written = set()
+
+    def write(self, proof: Proof):
+        """
+        Writes the reasoning that answers a query, followed by the answer.
+        Args:    proof (Proof): The proof of a query, as returned by Prover.prove_query.
+        """
+        write = self.stream.write
+        write(f"Trying to solve '{proof.name}':\n")
+        if not proof.premises:
+            write(f"There is no rule for '{proof.name}'. Therefore, {proof.name}: False\n")
+        stack = [(premise, False) for premise in reversed(proof.premises)]
+
+        while stack:
+            step, done = stack.pop()
+            if done:
+                if step.name == "!":
+                    write(f"Operator '!' : not {step.premises[0].value} results in {step.value}\n")
+                else:
+                    write(f"Operator '{step.name}' : {step.premises[0].value} {step.name} {step.premises[1].value} results in {step.value}\n")
+            elif step.kind == "CIRCULAR":
+                write(f"We have a circular reference for '{step.name}'. Thus, {step.name}: False\n")
+            elif step.kind == "KNOWN" or step in self.written:
+                write(f"{step.type.capitalize()} '{step.name}' is already solved: {step.value}\n")
+            else:
+                self.written.add(step)
+                if not step.premises:
+                    write(f"There is no rule for '{step.name}'. Therefore, {step.name}: False\n")
+                if step.type == "OPERATOR":
+                    if step.name == "!":
+                        write(f"Operator '!'. We are looking to know the value of its operand: {step.premises[0].name}.\n")
+                    else:
+                        write(f"Operator '{step.name}'. We are looking to know the value of its operands: {' and '.join(premise.name for premise in step.premises)}.\n")
+                    stack.append((step, True))
+                stack.extend((premise, False) for premise in reversed(step.premises))
+
+        if proof.premises:
+            write(f"{proof.name}: {proof.value}\n")
+        write(SEPARATOR + "\n")
+
+
+class JsonWriter:
+    """
+    Streams proofs as newline-delimited JSON records. Each step is written once, after its premises, with an 'id'
+    that later records use to reference it, so shared steps are never duplicated. A record of kind 'QUERY' closes
+    the proof of each query.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.ids: Dict[Proof, int] = {}
+
+    def write(self, proof: Proof):
+        """
+        Writes the steps of a query that were not written yet, then the query record.
+        Args:    proof (Proof): The proof of a query, as returned by Prover.prove_query.
+        """
+        stack = [(proof, False)]
+        while stack:
+            step, done = stack.pop()
+            if step in self.ids:
+                continue
+            if not done:
+                stack.append((step, True))
+                stack.extend((premise, False) for premise in reversed(step.premises) if premise not in self.ids)
+                continue
+            self.ids[step] = len(self.ids)
+            record = {"id": self.ids[step], "kind": step.kind, "type": step.type, "name": step.name,
+                      "value": step.value, "premises": [self.ids[premise] for premise in step.premises]}
+            self.stream.write(json.dumps(record) + "\n")
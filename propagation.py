@@ -0,0 +1,399 @@
+from typing import Dict, Iterable, List, Optional, Set
+from KnowledgeBase import KnowledgeBase
+
+# Answers of the propagation engine
+TRUE = "True"
+FALSE = "False"
+UNDETERMINED = "Undetermined"
+CONTRADICTION = "Contradiction"
+
+
+def literal(index: int, positive: bool = True) -> int:
+    """
+    Encodes a literal: the node of the given index is 2 * index when positive, 2 * index + 1 when negated, so that
+    literal ^ 1 is its negation.
+    Args:    index (int): The index of the node.
+             positive (bool, optional): Whether the literal is the node itself rather than its negation. Defaults to True.
+    Returns: int: The literal.
+    """
+    return 2 * index + (not positive)
+
+
+def conclusion_literal(knowledge_base: KnowledgeBase, conclusion: str) -> int:
+    """
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             conclusion (str): A concluded variable, possibly negated ("!V").
+    Returns: int: The literal of the conclusion.
+    """
+    return literal(knowledge_base.variables[conclusion.lstrip("!")].index, not conclusion.startswith("!"))
+
+
+def open_variables(knowledge_base: KnowledgeBase) -> Set[str]:
+    """
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+    Returns: Set[str]: The variables mentioned by the antecedent of a '<=>' rule, which its conclusions can make true.
+    """
+    variables = set()
+    for _, root in knowledge_base.equivalences:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.name in variables:
+                continue
+            if node.type == "VARIABLE":
+                variables.add(node.name)
+            else:
+                stack += (node.left, node.right)
+    return variables
+
+
+def build_clauses(knowledge_base: KnowledgeBase, facts: Iterable[str]) -> List[List[int]]:
+    """
+    Turns a rule base into clauses over the nodes of its DAG. Every operator node is tied to its operands by the
+    clauses of its gate, so each antecedent is a single literal however large it is; a rule "X => V" becomes
+    (!X | V), a rule "X => !V" becomes (!X | !V), and a rule "X <=> V + W" also gives (!V | !W | X).
+    Like the backward engine, a variable is false unless something makes it true: every variable that is not a fact
+    implies the disjunction of the antecedents of its rules (its completion), so with no rule at all it is false.
+    A variable mentioned by the antecedent of a '<=>' rule can also be made true by its conclusions, so it is left open
+    instead, and may end up undetermined.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             facts (Iterable[str]): The initial facts, which become unit clauses.
+    Returns: List[List[int]]: The clauses, as lists of literals.
+    """
+    clauses = []
+    for node in knowledge_base.nodes:
+        if node.type == "VARIABLE":
+            continue
+        gate = literal(node.index)
+        right = literal(node.right.index)
+        if node.name == "!":
+            clauses += [[gate ^ 1, right ^ 1], [gate, right]]
+            continue
+        left = literal(node.left.index)
+        if node.name == "+":
+            clauses += [[gate ^ 1, left], [gate ^ 1, right], [gate, left ^ 1, right ^ 1]]
+        elif node.name == "|":
+            clauses += [[gate ^ 1, left, right], [gate, left ^ 1], [gate, right ^ 1]]
+        else:
+            clauses += [[gate ^ 1, left, right], [gate ^ 1, left ^ 1, right ^ 1],
+                        [gate, left ^ 1, right], [gate, left, right ^ 1]]
+
+    for conclusion, roots in knowledge_base.rules.items():
+        head = conclusion_literal(knowledge_base, conclusion)
+        clauses += [[literal(root.index) ^ 1, head] for root in roots]
+
+    for conclusions, root in knowledge_base.equivalences:
+        clauses.append([conclusion_literal(knowledge_base, conclusion) ^ 1 for conclusion in conclusions]
+                       + [literal(root.index)])
+
+    facts = set(facts)
+    unopened = knowledge_base.variables.keys() - open_variables(knowledge_base)
+    for variable, node in knowledge_base.variables.items():
+        if variable in facts:
+            clauses.append([literal(node.index)])
+        elif variable in unopened:
+            clauses.append([literal(node.index, False)]
+                           + [literal(root.index) for root in knowledge_base.rules.get(variable, ())])
+    return clauses
+
+
+class Solver:
+    """
+    A DPLL solver over the clauses of a rule base. Unit propagation uses two watched literals per clause, so assigning a
+    literal only visits the clauses watching its negation, and undoing an assignment costs nothing; when propagation
+    alone does not settle every variable, the search splits on the unassigned variables one at a time, trying False
+    first, and backtracks chronologically.
+    The completion of the rules lets the variables of a cycle support each other: with only "A => B" and "B => A", the
+    clauses allow A and B to be both true. Before any split, the variables no rule can make true without themselves
+    are made false (see unfounded), which gives the answer of the other engines, the least model of the rules. The
+    models found by the search are not checked this way.
+    Attributes:
+        values (List[Optional[bool]]): The value of each node, by index, or None while unassigned.
+        trail (List[int]): The assigned literals, in order.
+        levels (List[int]): The length of the trail when each decision level was opened.
+        decisions (List[int]): The indices of the variable nodes, the only ones the search splits on: the gate clauses
+                               settle the operator nodes once their operands are known.
+        conflict (bool): Whether the clauses are contradictory without any assumption.
+        gates (List[Tuple[int, str, int, int]]): The index, name and operand indices of each operator node, operands
+                                                 first (the left operand of '!' is -1).
+        parents (List[List[int]]): The indices of the operator nodes reading each node.
+        heads (Dict[int, List[int]]): The variables each antecedent root concludes, by the index of the root.
+        opened (Set[int]): The indices of the variables a '<=>' rule can make true (see open_variables).
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase, facts: Iterable[str]):
+        clauses = build_clauses(knowledge_base, facts)
+        self.values: List[Optional[bool]] = [None] * len(knowledge_base.nodes)
+        self.trail: List[int] = []
+        self.levels: List[int] = []
+        self.decisions: List[int] = [node.index for node in knowledge_base.nodes if node.type == "VARIABLE"]
+        self.watches: List[List[List[int]]] = [[] for _ in range(2 * len(knowledge_base.nodes))]
+        self.head = 0
+        self.conflict = False
+        self.gates = [(node.index, node.name, node.left.index if node.left is not None else -1, node.right.index)
+                      for node in knowledge_base.nodes if node.type != "VARIABLE"]
+        self.parents: List[List[int]] = [[] for _ in knowledge_base.nodes]
+        for index, _, left, right in self.gates:
+            self.parents[right].append(index)
+            if left >= 0:
+                self.parents[left].append(index)
+        self.heads: Dict[int, List[int]] = {}
+        for conclusion, roots in knowledge_base.rules.items():
+            if not conclusion.startswith("!"):
+                for root in roots:
+                    self.heads.setdefault(root.index, []).append(knowledge_base.variables[conclusion].index)
+        self.opened = {knowledge_base.variables[variable].index for variable in open_variables(knowledge_base)}
+
+        for clause in clauses:
+            literals = dict.fromkeys(clause)
+            if any(lit ^ 1 in literals for lit in literals):
+                continue
+            clause = list(literals)
+            if len(clause) == 1:
+                self.conflict = self.conflict or not self.assign(clause[0])
+            else:
+                self.watches[clause[0]].append(clause)
+                self.watches[clause[1]].append(clause)
+        self.conflict = self.conflict or not self.propagate()
+        while not self.conflict:
+            unfounded = self.unfounded()
+            if not unfounded:
+                break
+            for index in unfounded:
+                self.assign(literal(index, False))
+            self.conflict = not self.propagate()
+
+    def unfounded(self) -> List[int]:
+        """
+        Finds the unassigned variables that no rule can make true unless they already are, whatever the values of the
+        other unassigned variables. The variables that can be true are found from the facts and the variables assigned
+        true, each antecedent being evaluated with the others false or unknown, until no rule makes another one
+        possible; each node is evaluated again only when an operand it reads becomes possibly true or false.
+        Returns: List[int]: The indices of these variables.
+        """
+        values, parents, heads = self.values, self.parents, self.heads
+        can_true = [False] * len(values)
+        can_false = [False] * len(values)
+        for index in self.decisions:
+            can_true[index] = values[index] is True or (values[index] is None and index in self.opened)
+            can_false[index] = values[index] is not True
+        gates = {}
+        for gate in self.gates:
+            gates[gate[0]] = gate
+            self.evaluate(gate, can_true, can_false)
+        stack = [root for root in heads if can_true[root]]
+        while stack:
+            index = stack.pop()
+            for head in heads.get(index, ()):
+                if not can_true[head] and values[head] is None:
+                    can_true[head] = True
+                    stack.append(head)
+            for parent in parents[index]:
+                if self.evaluate(gates[parent], can_true, can_false):
+                    stack.append(parent)
+        return [index for index in self.decisions if values[index] is None and not can_true[index]]
+
+    @staticmethod
+    def evaluate(gate: tuple, can_true: List[bool], can_false: List[bool]) -> bool:
+        """
+        Finds whether an operator node can be true and whether it can be false, from the same of its operands.
+        Args:    gate (tuple): The operator node, see gates.
+                 can_true, can_false (List[bool]): Whether each node can be true, or false, which are updated.
+        Returns: bool: True if the node can now be true, or false, while it could not before.
+        """
+        index, name, left, right = gate
+        if name == "!":
+            true, false = can_false[right], can_true[right]
+        elif name == "+":
+            true, false = can_true[left] and can_true[right], can_false[left] or can_false[right]
+        elif name == "|":
+            true, false = can_true[left] or can_true[right], can_false[left] and can_false[right]
+        else:
+            true = can_true[left] and can_false[right] or can_false[left] and can_true[right]
+            false = can_true[left] and can_true[right] or can_false[left] and can_false[right]
+        changed = true and not can_true[index] or false and not can_false[index]
+        can_true[index], can_false[index] = true, false
+        return changed
+
+    def value(self, lit: int) -> Optional[bool]:
+        """
+        Returns: Optional[bool]: The value of a literal, or None while its node is unassigned.
+        """
+        value = self.values[lit >> 1]
+        return value if value is None or not lit & 1 else not value
+
+    def assign(self, lit: int) -> bool:
+        """
+        Makes a literal true, to be propagated.
+        Returns: bool: False if the literal was already false.
+        """
+        value = self.value(lit)
+        if value is None:
+            self.values[lit >> 1] = not lit & 1
+            self.trail.append(lit)
+        return value is not False
+
+    def propagate(self) -> bool:
+        """
+        Propagates the literals assigned since the last propagation, until every clause has a true literal or two
+        unassigned ones.
+        Returns: bool: False on a conflict, a clause whose literals are all false.
+        """
+        values, trail, watches = self.values, self.trail, self.watches
+        while self.head < len(trail):
+            false = trail[self.head] ^ 1
+            self.head += 1
+            watching = watches[false]
+            kept = 0
+            for position, clause in enumerate(watching):
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                other = clause[0]
+                value = values[other >> 1]
+                if value is not None and value != other & 1:
+                    watching[kept] = clause
+                    kept += 1
+                    continue
+                for candidate in range(2, len(clause)):
+                    lit = clause[candidate]
+                    value = values[lit >> 1]
+                    if value is None or value != lit & 1:
+                        clause[1], clause[candidate] = lit, false
+                        watches[lit].append(clause)
+                        break
+                else:
+                    watching[kept] = clause
+                    kept += 1
+                    if not self.assign(other):
+                        watching[kept:] = watching[position + 1:]
+                        return False
+            del watching[kept:]
+        return True
+
+    def backtrack(self, level: int):
+        """
+        Undoes the assignments of the decision levels above level.
+        """
+        if len(self.levels) <= level:
+            return
+        start = self.levels[level]
+        for lit in self.trail[start:]:
+            self.values[lit >> 1] = None
+        del self.trail[start:]
+        del self.levels[level:]
+        self.head = start
+
+    def decide(self, lit: int) -> bool:
+        """
+        Opens a decision level assigning a literal, and propagates it.
+        Returns: bool: False on a conflict.
+        """
+        self.levels.append(len(self.trail))
+        return self.assign(lit) and self.propagate()
+
+    def implied(self, lit: int) -> bool:
+        """
+        Checks by propagation alone whether a literal is impossible: assuming it leads to a conflict.
+        Returns: bool: True if the negation of the literal follows from the clauses.
+        """
+        possible = self.decide(lit)
+        self.backtrack(0)
+        return not possible
+
+    def search(self, assumption: Optional[int] = None) -> Optional[List[Optional[bool]]]:
+        """
+        Looks for an assignment of every variable satisfying the clauses, splitting on the variables propagation leaves
+        unassigned.
+        Args:    assumption (int, optional): A literal the assignment must make true. Defaults to None.
+        Returns: Optional[List[Optional[bool]]]: The value of each node in the assignment found, or None if there is none.
+        """
+        if self.conflict:
+            return None
+        if assumption is not None and not self.decide(assumption):
+            self.backtrack(0)
+            return None
+        base = len(self.levels)
+        stack = []
+        position = 0
+        model = None
+        while True:
+            while position < len(self.decisions) and self.values[self.decisions[position]] is not None:
+                position += 1
+            if position == len(self.decisions):
+                model = list(self.values)
+                break
+            stack.append((position, False))
+            if self.decide(literal(self.decisions[position], False)):
+                continue
+            while stack:
+                position, flipped = stack.pop()
+                self.backtrack(base + len(stack))
+                if not flipped:
+                    stack.append((position, True))
+                    if self.decide(literal(self.decisions[position])):
+                        break
+            else:
+                break
+        self.backtrack(0)
+        return model
+
+
+def solve_propagation(knowledge_base: KnowledgeBase, queries: Optional[Iterable[str]] = None,
+                      facts: Optional[Iterable[str]] = None, split: bool = False) -> Dict[str, str]:
+    """
+    Answers queries by propagation over the clauses of the rule base, which also reads the '<=>' rules both ways and
+    the negated conclusions. A query is True or False when the clauses force it, Undetermined when they allow both,
+    and Contradiction when they allow neither, which means the rules and the facts contradict each other.
+    Propagation alone is fast but incomplete: a query it cannot settle is reported Undetermined. With split, a query
+    left open is settled by searching for an assignment with each value; the models found are kept, so a query they
+    already show both ways costs no search.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             queries (Iterable[str], optional): The queried variables. Defaults to the queries of the file.
+             facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+             split (bool, optional): Whether to split on variables when propagation is not enough. Defaults to False.
+    Returns: Dict[str, str]: The answer of each query, in order: True, False, Undetermined or Contradiction.
+    """
+    queries = list(knowledge_base.queries if queries is None else queries)
+    facts = set(knowledge_base.facts if facts is None else facts)
+    solver = Solver(knowledge_base, facts)
+    if solver.conflict:
+        return {query: CONTRADICTION for query in queries}
+
+    seen = {}
+    if split:
+        model = solver.search()
+        if model is None:
+            return {query: CONTRADICTION for query in queries}
+        seen = {index: {value} for index, value in enumerate(model)}
+
+    results = {}
+    for query in queries:
+        node = knowledge_base.variables.get(query)
+        if node is None:
+            results[query] = TRUE if query in facts else FALSE
+            continue
+        value = solver.values[node.index]
+        if value is not None:
+            results[query] = TRUE if value else FALSE
+            continue
+        possible = []
+        for candidate in (True, False):
+            if candidate in seen.get(node.index, ()):
+                possible.append(candidate)
+            elif not split:
+                if not solver.implied(literal(node.index, candidate)):
+                    possible.append(candidate)
+            else:
+                model = solver.search(literal(node.index, candidate))
+                if model is not None:
+                    possible.append(candidate)
+                    for index, value in enumerate(model):
+                        seen[index].add(value)
+        if len(possible) == 2:
+            results[query] = UNDETERMINED
+        elif possible:
+            results[query] = TRUE if possible[0] else FALSE
+        else:
+            # Neither value is possible, so no assignment satisfies the clauses at all
+            return {query: CONTRADICTION for query in queries}
+    return results
@@ -0,0 +1,151 @@
+import argparse
+import os
+import time
+from typing import Dict, List, Tuple
+from runner import evaluate_files, list_files
+
+# The suites of a test corpus: their name, their folder, and what their cases must give: an error, answers equal to
+# the expected output of the same name, or answers without error
+SUITES = (("errors", "test_error_cases", "error"),
+          ("mandatory", "test_mandatory_cases", "expected"),
+          ("cycles", "test_cycle_cases", "expected"),
+          ("optional", "test_optionnal_cases", "success"))
+
+# The engines that answer cyclic rules their own way rather than like the original solver, which skip the cycles suite
+# unless it is asked for
+OWN_CYCLE_ENGINES = ("scc", "propagate")
+
+# The folder of the expected outputs of a test corpus
+EXPECTED_FOLDER = "test_expected_output"
+
+
+def read_expected(path: str) -> Dict[str, str]:
+    """
+    Reads an expected output, one "Query: value" line per query, as printed by main.py. Blank lines are ignored, like
+    the order of the lines and the spaces around the values.
+    Args:    path (str): Path to the expected output.
+    Returns: Dict[str, str]: The expected value of each query.
+    Raises:  OSError: If the file cannot be read.
+             ValueError: If a line is not a "Query: value" line.
+    """
+    expected = {}
+    with open(path, "r") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            query, separator, value = line.partition(":")
+            if not separator:
+                raise ValueError(f"Error: Invalid expected output line ({line.strip()}) in {path}.")
+            expected[query.strip()] = value.strip()
+    return expected
+
+
+def collect_cases(root: str, suites: List[str]) -> List[Tuple[str, str, str]]:
+    """
+    Lists the cases of the selected suites of a test corpus, laid out like unit_tests. When several suites are
+    selected, a corpus may lack the folders of some of them.
+    Args:    root (str): The folder of the corpus.
+             suites (List[str]): The names of the suites to run, see SUITES.
+    Returns: List[Tuple[str, str, str]]: The suite, the path and the expectation of each case, suite by suite, in name order.
+    Raises:  OSError: If a folder cannot be read.
+    """
+    cases = []
+    for name, folder, expectation in SUITES:
+        directory = os.path.join(root, folder)
+        if name in suites and (len(suites) == 1 or os.path.isdir(directory)):
+            cases.extend((name, path, expectation) for path in list_files(directory))
+    return cases
+
+
+def check_case(record: dict, expectation: str, expected_path: str) -> List[str]:
+    """
+    Compares the record of a case with what it must give.
+    Args:    record (dict): The record of the case, see runner.evaluate_file.
+             expectation (str): 'error', 'expected' or 'success', see SUITES.
+             expected_path (str): Path to the expected output, for an 'expected' case.
+    Returns: List[str]: The differences found, empty if the case passed.
+    """
+    if expectation == "error":
+        return [] if record["error"] is not None else ["expected an error, got none"]
+    if record["error"] is not None:
+        return [f"unexpected error: {record['error']}"]
+    if expectation == "success":
+        return []
+    try:
+        expected = read_expected(expected_path)
+    except (OSError, ValueError) as error:
+        return [str(error)]
+    actual = {query: str(value) for query, value in record["results"].items()}
+    differences = []
+    for query, value in expected.items():
+        if query not in actual:
+            differences.append(f"{query}: expected {value}, not answered")
+        elif actual[query] != value:
+            differences.append(f"{query}: expected {value}, got {actual[query]}")
+    differences.extend(f"{query}: {value} not expected" for query, value in actual.items() if query not in expected)
+    return differences
+
+
+def run_cases(cases: List[Tuple[str, str, str]], root: str, jobs: int = 1, engine: str = "backward") -> List[dict]:
+    """
+    Runs test cases in this process, or in a pool of worker processes, each rule file being loaded and solved through
+    runner.evaluate_file instead of a new interpreter per case.
+    Args:    cases (List[Tuple[str, str, str]]): The cases, see collect_cases.
+             root (str): The folder of the corpus, where the expected outputs are.
+             jobs (int, optional): The number of worker processes; 1 runs in this process. Defaults to 1.
+             engine (str, optional): The engine, see runner.evaluate_file. Defaults to 'backward'.
+    Returns: List[dict]: The result of each case, in order: its suite, path, differences, and the time spent loading
+             and solving it, in seconds.
+    """
+    results = []
+    records = evaluate_files([path for _, path, _ in cases], jobs, engine)
+    for (suite, path, expectation), record in zip(cases, records):
+        expected_path = os.path.join(root, EXPECTED_FOLDER, os.path.basename(path))
+        results.append({"suite": suite, "file": path, "differences": check_case(record, expectation, expected_path),
+                        "load_seconds": record["load_seconds"], "solve_seconds": record.get("solve_seconds", 0.0)})
+    return results
+
+
+def main():
+    """
+    Runs the test corpus selected on the command line and prints one line per case with its timing, the differences
+    of the cases that failed, and a summary. The exit status is 1 if any case failed.
+    """
+    parser = argparse.ArgumentParser(description="Runs the unit test cases in-process and compares their answers with the expected outputs.")
+    parser.add_argument("suites", nargs="?", choices=["errors", "optional", "mandatory", "cycles", "all"], default="all", help="The suites to run")
+    parser.add_argument("--root", metavar="DIR", help="The folder of the corpus, laid out like unit_tests", default="unit_tests")
+    parser.add_argument("--engine", choices=["backward", "forward", "scc", "propagate", "codegen", "vm"], default="backward", help="Inference engine used to answer the queries")
+    parser.add_argument("--jobs", type=int, metavar="N", help="Number of worker processes (default: one per CPU)", default=None)
+    parser.add_argument("--failures-only", action="store_true", help="Only print the cases that failed", default=False)
+    args = parser.parse_args()
+
+    suites = [name for name, _, _ in SUITES if name != "cycles" or args.engine not in OWN_CYCLE_ENGINES] \
+        if args.suites == "all" else [args.suites]
+    try:
+        cases = collect_cases(args.root, suites)
+    except OSError as error:
+        print(f"Error: {error}")
+        exit(1)
+
+    start = time.perf_counter()
+    results = run_cases(cases, args.root, args.jobs or os.cpu_count() or 1, args.engine)
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for result in results:
+        failed += bool(result["differences"])
+        if args.failures_only and not result["differences"]:
+            continue
+        case = os.path.join(result["suite"], os.path.basename(result["file"]))
+        status = "FAILED" if result["differences"] else "passed"
+        print(f"{case:<48}{status:>8}{result['load_seconds'] * 1000:>10.2f} ms{result['solve_seconds'] * 1000:>10.2f} ms")
+        for difference in result["differences"]:
+            print(f"    {difference}")
+    spent = sum(result["load_seconds"] + result["solve_seconds"] for result in results)
+    print(f"{len(results)} cases: {len(results) - failed} passed, {failed} failed in {elapsed:.2f} s ({spent:.2f} s in the cases)")
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
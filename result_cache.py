@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from KnowledgeBase import KnowledgeBase
+
+# Number of answer sets kept in memory
+CAPACITY = 1024
+
+# Size of the on-disk tier, in bytes, beyond which the least recently used entries are deleted
+MAX_BYTES = 64 << 20
+
+# Extension of an entry of the on-disk tier
+EXTENSION = ".json"
+
+# A sweep of the on-disk tier deletes entries until it is down to this fraction of its size, so that sweeps are far apart
+SWEEP_TARGET = 0.75
+
+# Number of entries written between two sweeps, even under the size: other processes may be writing to the directory
+SWEEP_WRITES = 1024
+
+
+def rules_digest(knowledge_base: KnowledgeBase) -> bytes:
+    """
+    Computes a canonical hash of the compiled rules: each node is hashed from its name and the hashes of its operands,
+    so the hash does not depend on the order the nodes were interned in, and the rules are hashed by conclusion, in
+    sorted order, each with the hashes of its antecedents in the order they are tried. Two rule bases with the same
+    hash give the same answers for the same facts and queries.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+    Returns: bytes: The SHA-256 digest of the rules.
+    """
+    hashes: List[bytes] = []
+    # An operator node is interned after its operands, so their hashes are already known
+    for node in knowledge_base.nodes:
+        hashes.append(hashlib.sha256(b"\0".join((node.name.encode(),
+                                                 hashes[node.left.index] if node.left else b"",
+                                                 hashes[node.right.index] if node.right else b""))).digest())
+    digest = hashlib.sha256()
+    for conclusion in sorted(knowledge_base.rules):
+        digest.update(conclusion.encode() + b"\0")
+        digest.update(b"".join(hashes[root.index] for root in knowledge_base.rules[conclusion]))
+    equivalences = sorted((" ".join(conclusions), hashes[root.index]) for conclusions, root in knowledge_base.equivalences)
+    for conclusions, root in equivalences:
+        digest.update(b"<=>" + conclusions.encode() + b"\0" + root)
+    return digest.digest()
+
+
+def file_digest(file_path: str) -> bytes:
+    """
+    Hashes the content of a rule file, so that its answers can be looked up without parsing it; the answers are
+    forgotten as soon as the content changes.
+    Args:    file_path (str): Path to the file.
+    Returns: bytes: The SHA-256 digest of the content.
+    Raises:  OSError: If the file cannot be read.
+    """
+    with open(file_path, "rb") as file:
+        return hashlib.sha256(file.read()).digest()
+
+
+def result_key(rules: bytes, facts: Iterable[str], queries: Iterable[str], engine: str) -> str:
+    """
+    Builds the key of a set of answers. The facts are a set, so their order does not matter, while the queries are
+    answered in order.
+    Args:    rules (bytes): The digest of the rules, from rules_digest or file_digest.
+             facts (Iterable[str]): The initial facts.
+             queries (Iterable[str]): The queried variables.
+             engine (str): The engine, with its options.
+    Returns: str: The key, a hexadecimal SHA-256 digest.
+    """
+    content = "\n".join((engine, " ".join(sorted(set(facts))), " ".join(queries)))
+    return hashlib.sha256(rules + content.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Keeps the answers of solves already done, by key (see result_key): a tier in memory, evicting the least recently
+    used entry beyond its capacity, and an optional tier on disk, one JSON file per entry, shared by every process
+    using the same directory and evicting the least recently used files beyond its size. A hit on disk is promoted to
+    memory, and its file touched. The size of the tier on disk is counted as entries are written, and the directory
+    is only listed to evict entries when the count goes beyond the size, or every SWEEP_WRITES entries.
+    Attributes:
+        capacity (int): The number of entries kept in memory.
+        entries (OrderedDict): The entries in memory, from least to most recently used.
+        directory (str): The directory of the tier on disk, or None.
+        max_bytes (int): The size of the tier on disk.
+        disk_bytes (int): The size of the tier on disk found by the last sweep, plus the entries written since, or None
+                          before the first sweep.
+        writes (int): The number of entries written since the last sweep.
+        counters (Dict[str, int]): The memory hits, disk hits, misses, entries stored, and evictions from each tier.
+    """
+
+    def __init__(self, capacity: int = CAPACITY, directory: Optional[str] = None, max_bytes: int = MAX_BYTES):
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.disk_bytes: Optional[int] = None
+        self.writes = 0
+        self.counters: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0,
+                                         "disk_evictions": 0}
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Args:    key (str): The key of the answers.
+        Returns: Optional[dict]: The cached entry, or None on a miss.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return entry
+        if self.directory is not None:
+            path = os.path.join(self.directory, key + EXTENSION)
+            try:
+                with open(path, "r") as file:
+                    entry = json.load(file)
+                os.utime(path)
+            except (OSError, ValueError):
+                entry = None
+            if entry is not None:
+                self.counters["disk_hits"] += 1
+                self.remember(key, entry)
+                return entry
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key: str, entry: dict):
+        """
+        Stores an entry in both tiers.
+        Args:    key (str): The key of the answers.
+                 entry (dict): The answers, with anything else to give back on a hit; it must be serializable as JSON.
+        """
+        self.counters["stores"] += 1
+        self.remember(key, entry)
+        if self.directory is not None:
+            self.write(key, entry)
+
+    def remember(self, key: str, entry: dict):
+        """
+        Stores an entry in memory, evicting the least recently used one beyond the capacity.
+        """
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def write(self, key: str, entry: dict):
+        """
+        Writes an entry to disk through a temporary file renamed into place, so that concurrent readers never see a
+        partial entry, and sweeps the tier when it may be too large. The tier is only an optimization: a directory
+        that cannot be written is ignored.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(descriptor, "w") as file:
+                json.dump(entry, file)
+                size = file.tell()
+            os.replace(temporary, os.path.join(self.directory, key + EXTENSION))
+        except OSError:
+            os.unlink(temporary)
+            return
+
+        self.writes += 1
+        if self.disk_bytes is not None:
+            # A replaced entry is counted twice until the next sweep, which only makes it come sooner
+            self.disk_bytes += size
+            if self.disk_bytes <= self.max_bytes and self.writes < SWEEP_WRITES:
+                return
+        self.sweep()
+
+    def sweep(self):
+        """
+        Measures the tier on disk, and deletes the least recently used entries while it is larger than its size, down
+        to SWEEP_TARGET of it.
+        """
+        self.writes = 0
+        try:
+            files = []
+            for name in os.listdir(self.directory):
+                if name.endswith(EXTENSION):
+                    status = os.stat(os.path.join(self.directory, name))
+                    files.append((status.st_mtime, status.st_size, name))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * SWEEP_TARGET if total > self.max_bytes else self.max_bytes
+        for _, size, name in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            self.counters["disk_evictions"] += 1
+        self.disk_bytes = total
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from functools import partial
+from multiprocessing import Pool
+from typing import Iterator, List, Optional, TextIO
+from parse import ParseError
+from KnowledgeBase import KnowledgeBase
+from cache import load_knowledge_base
+from forward import forward_chain
+from scc import solve_components
+from propagation import solve_propagation
+from codegen import solve_compiled
+from vm import CompactRuleBase
+
+# Number of records written to the output at once
+FLUSH_SIZE = 256
+
+
+def list_files(directory: str) -> List[str]:
+    """
+    Lists the rule files of a directory, in name order.
+    Args:    directory (str): The directory.
+    Returns: List[str]: The paths of its .txt files.
+    Raises:  OSError: If the directory cannot be read.
+    """
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith(".txt") and os.path.isfile(os.path.join(directory, name)))
+
+
+def evaluate_file(path: str, engine: str = "backward", cache_dir: Optional[str] = None) -> dict:
+    """
+    Loads a rule file and answers its queries, catching its errors so that one bad file does not stop a batch.
+    Args:    path (str): Path to the rule file.
+             engine (str, optional): 'backward', 'forward', 'scc', 'propagate', 'codegen' or 'vm'. Defaults to 'backward'.
+             cache_dir (str, optional): The compiled cache to load the file through, as for --cache ('' for next to
+                                        the file). Defaults to None, for no cache.
+    Returns: dict: The record of the file: its path, the answer to each query, its warnings, the error that stopped it
+             (or None), and the time spent loading and solving it, in seconds.
+    """
+    record = {"file": path, "results": {}, "warnings": [], "error": None}
+    start = time.perf_counter()
+    try:
+        if cache_dir is not None:
+            knowledge_base = load_knowledge_base(path, cache_dir)
+        else:
+            knowledge_base = KnowledgeBase.from_file(path)
+    except (ParseError, OSError, UnicodeDecodeError) as error:
+        record["error"] = str(error)
+        record["warnings"] = getattr(error, "warnings", [])
+        record["load_seconds"] = time.perf_counter() - start
+        return record
+    loaded = time.perf_counter()
+
+    if engine == "forward":
+        values = forward_chain(knowledge_base)
+        record["results"] = {query: values[query] for query in knowledge_base.queries}
+    elif engine == "scc":
+        record["results"] = solve_components(knowledge_base)
+    elif engine == "propagate":
+        record["results"] = solve_propagation(knowledge_base)
+    elif engine == "codegen":
+        record["results"] = solve_compiled(knowledge_base)
+    elif engine == "vm":
+        record["results"] = CompactRuleBase(knowledge_base).solve()
+    else:
+        record["results"] = knowledge_base.solve()
+    record["warnings"] = knowledge_base.warnings
+    record["load_seconds"] = loaded - start
+    record["solve_seconds"] = time.perf_counter() - loaded
+    return record
+
+
+def evaluate_files(paths: List[str], jobs: int = 1, engine: str = "backward", cache_dir: Optional[str] = None) -> Iterator[dict]:
+    """
+    Evaluates rule files in a pool of worker processes. The workers are started once and import the modules once,
+    then each receives files in chunks; the records come back in the order of paths.
+    Args:    paths (List[str]): The rule files.
+             jobs (int, optional): The number of worker processes; 1 evaluates in this process. Defaults to 1.
+             engine (str, optional): 'backward', 'forward', 'scc', 'propagate', 'codegen' or 'vm'. Defaults to 'backward'.
+             cache_dir (str, optional): The compiled cache, see evaluate_file. Defaults to None.
+    Returns: Iterator[dict]: The record of each file, see evaluate_file.
+    """
+    evaluate = partial(evaluate_file, engine=engine, cache_dir=cache_dir)
+    if jobs <= 1 or len(paths) <= 1:
+        yield from map(evaluate, paths)
+        return
+    chunk_size = max(1, len(paths) // (jobs * 4))
+    with Pool(jobs) as pool:
+        yield from pool.imap(evaluate, paths, chunk_size)
+
+
+def write_records(records: Iterator[dict], stream: TextIO) -> int:
+    """
+    Writes records as newline-delimited JSON, FLUSH_SIZE records per write.
+    Args:    records (Iterator[dict]): The records.
+             stream (TextIO): The output stream.
+    Returns: int: The number of records with an error.
+    """
+    errors = 0
+    buffer = []
+    for record in records:
+        errors += record["error"] is not None
+        buffer.append(json.dumps(record))
+        if len(buffer) == FLUSH_SIZE:
+            stream.write("\n".join(buffer) + "\n")
+            buffer = []
+    if buffer:
+        stream.write("\n".join(buffer) + "\n")
+    stream.flush()
+    return errors
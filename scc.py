@@ -0,0 +1,195 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+from Rule import Node
+from KnowledgeBase import KnowledgeBase
+
+
+def dependency_graph(knowledge_base: KnowledgeBase) -> Dict[str, List[str]]:
+    """
+    Builds the variable dependency graph of a rule base: the variables mentioned by the antecedents of the rules of
+    each variable. It only depends on the rules, so it is built once when the rule base is loaded.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+    Returns: Dict[str, List[str]]: The variables each concluded variable depends on, in the order of its rules.
+    """
+    graph = {}
+    for variable, roots in knowledge_base.rules.items():
+        if variable.startswith("!"):
+            continue
+        dependencies = []
+        seen = set()
+        stack = list(reversed(roots))
+        while stack:
+            node = stack.pop()
+            if node is None or node in seen:
+                continue
+            seen.add(node)
+            if node.type == "VARIABLE":
+                dependencies.append(node.name)
+            else:
+                stack.extend((node.right, node.left))
+        graph[variable] = dependencies
+    return graph
+
+
+def strongly_connected_components(graph: Dict[str, List[str]], roots: Iterable[str], facts: Set[str]) -> List[List[str]]:
+    """
+    Finds the strongly connected components of the dependency graph reachable from roots, with Tarjan's algorithm
+    driven by an explicit stack. The rules of the initial facts are ignored, so a fact depends on nothing.
+    Args:    graph (Dict[str, List[str]]): The dependency graph, as built by dependency_graph.
+             roots (Iterable[str]): The variables to start from.
+             facts (Set[str]): The initial facts.
+    Returns: List[List[str]]: The components, each one after every component it depends on.
+    """
+    def edges(variable: str):
+        return iter(()) if variable in facts else iter(graph.get(variable, ()))
+
+    index, low = {}, {}
+    stack, on_stack = [], set()
+    components = []
+
+    for root in roots:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, edges(root))]
+        while work:
+            variable, successors = work[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, edges(successor)))
+                    break
+                if successor in on_stack:
+                    low[variable] = min(low[variable], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[variable])
+                if low[variable] == index[variable]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == variable:
+                            break
+                    components.append(component)
+    return components
+
+
+def evaluate(root: Node, values: Dict[str, bool], cache: Dict[Node, bool]) -> bool:
+    """
+    Computes the value of an antecedent from the current values of its variables, with an explicit stack.
+    Args:    root (Node): The root of the antecedent.
+             values (Dict[str, bool]): The value of every variable the antecedent mentions.
+             cache (Dict[Node, bool]): The operator values already computed, which are added to.
+    Returns: bool: The value of the antecedent.
+    """
+    def value(node: Optional[Node]) -> bool:
+        if node is None:
+            return False
+        return values[node.name] if node.type == "VARIABLE" else cache[node]
+
+    stack = [root]
+    while stack:
+        node = stack[-1]
+        if node.type == "VARIABLE" or node in cache:
+            stack.pop()
+            continue
+        missing = [child for child in (node.left, node.right)
+                   if child is not None and child.type == "OPERATOR" and child not in cache]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        if node.name == "!":
+            cache[node] = not value(node.right)
+        elif node.name == "+":
+            cache[node] = value(node.left) and value(node.right)
+        elif node.name == "|":
+            cache[node] = value(node.left) or value(node.right)
+        else:
+            cache[node] = value(node.left) != value(node.right)
+    return value(root)
+
+
+def settle(component: List[str], knowledge_base: KnowledgeBase, graph: Dict[str, List[str]], values: Dict[str, bool]):
+    """
+    Resolves a cyclic component by fixed-point iteration. Every variable starts False and is evaluated again whenever
+    a variable of the component it depends on changes, until nothing changes. Without negation inside the cycle the
+    values only go from False to True, so this reaches the least fixed point, the same whatever the order. A variable
+    that keeps flipping, which only a negation inside the cycle can cause, is settled as False, like a circular
+    reference for Node.solve.
+    Args:    component (List[str]): The variables of the component.
+             knowledge_base (KnowledgeBase): The rule base.
+             graph (Dict[str, List[str]]): The dependency graph.
+             values (Dict[str, bool]): The values of the variables of the components solved so far, which are added to.
+    """
+    members = set(component)
+    dependents = {variable: [] for variable in component}
+    for variable in component:
+        for dependency in dict.fromkeys(graph.get(variable, ())):
+            if dependency in members:
+                dependents[dependency].append(variable)
+
+    changes = dict.fromkeys(component, 0)
+    for variable in component:
+        values[variable] = False
+    work = deque(component)
+    queued = set(component)
+    while work:
+        variable = work.popleft()
+        queued.discard(variable)
+        if changes[variable] > 2:
+            continue
+        cache = {}
+        value = any(evaluate(root, values, cache) for root in knowledge_base.rules.get(variable, ()))
+        if value == values[variable]:
+            continue
+        changes[variable] += 1
+        if changes[variable] > 2:
+            if not values[variable]:
+                continue
+            value = False
+        values[variable] = value
+        for dependent in dependents[variable]:
+            if dependent not in queued:
+                queued.add(dependent)
+                work.append(dependent)
+
+
+def solve_components(knowledge_base: KnowledgeBase, queries: Optional[Iterable[str]] = None,
+                     facts: Optional[Iterable[str]] = None, graph: Optional[Dict[str, List[str]]] = None) -> Dict[str, bool]:
+    """
+    Solves queries component by component: the strongly connected components of the variables the queries depend on
+    are solved in topological order, each exactly once, a single variable from the values of the components before
+    it and a cycle by fixed-point iteration. The answers then no longer depend on the order of the queries.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             queries (Iterable[str], optional): The queried variables. Defaults to the queries of the file.
+             facts (Iterable[str], optional): The initial facts. Defaults to the facts of the file.
+             graph (Dict[str, List[str]], optional): The dependency graph, to reuse it between solves. Defaults to None,
+                                                      for building it.
+    Returns: Dict[str, bool]: The value of each query, in order.
+    """
+    queries = list(knowledge_base.queries if queries is None else queries)
+    facts = set(knowledge_base.facts if facts is None else facts)
+    if graph is None:
+        graph = dependency_graph(knowledge_base)
+    order = {variable: node.index for variable, node in knowledge_base.variables.items()}
+    values = {}
+    cache = {}
+
+    for component in strongly_connected_components(graph, queries, facts):
+        variable = component[0]
+        if variable in facts:
+            values[variable] = True
+        elif len(component) == 1 and variable not in graph.get(variable, ()):
+            values[variable] = any(evaluate(root, values, cache) for root in knowledge_base.rules.get(variable, ()))
+        else:
+            settle(sorted(component, key=lambda member: order.get(member, -1)), knowledge_base, graph, values)
+    return {query: values[query] for query in queries}
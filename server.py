@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import json
+import os
+import stat
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from parse import ParseError, split_variables
+from KnowledgeBase import KnowledgeBase
+from forward import forward_chain
+from scc import solve_components
+from propagation import solve_propagation
+from codegen import solve_compiled
+from result_cache import CAPACITY, ResultCache, result_key, rules_digest
+from cache import dump, loads
+
+# Rule bases with more nodes than this are solved in the worker pool instead of the event loop
+OFFLOAD_NODES = 20000
+
+# Seconds between two checks of the modification time of the rule files
+RELOAD_INTERVAL = 1.0
+
+# Longest request line read, in bytes; a longer one is answered with an error and skipped
+REQUEST_LIMIT = 1 << 20
+
+# Rule bases loaded by a worker process, by name: the digest of the version loaded, and the rule base
+_worker_bases: Dict[str, Tuple[bytes, KnowledgeBase]] = {}
+
+
+def solve(knowledge_base: KnowledgeBase, queries: List[str], facts: Optional[List[str]], engine: str) -> Dict[str, object]:
+    """
+    Answers queries on a rule base with one of the engines of main.py, in a new evaluation.
+    Args:    knowledge_base (KnowledgeBase): The rule base.
+             queries (List[str]): The queried variables.
+             facts (List[str], optional): The initial facts, or None for the facts of the file.
+             engine (str): 'backward', 'forward', 'scc', 'propagate' or 'codegen'.
+    Returns: Dict[str, object]: The value of each query, in order: a bool, or a string for the propagate engine.
+    """
+    if engine == "forward":
+        values = forward_chain(knowledge_base, facts, queries)
+        return {query: values.get(query, query in (knowledge_base.facts if facts is None else facts)) for query in queries}
+    if engine == "scc":
+        return solve_components(knowledge_base, queries, facts)
+    if engine == "propagate":
+        return solve_propagation(knowledge_base, queries, facts)
+    if engine == "codegen":
+        return solve_compiled(knowledge_base, queries, facts)
+    return knowledge_base.solve(queries, facts)
+
+
+def solve_in_worker(name: str, digest: bytes, blob: bytes, queries: List[str], facts: List[str], engine: str) -> Dict[str, bool]:
+    """
+    Answers queries in a worker process on the version of a rule base the server validated, sent compiled rather than
+    read again from a file that may have changed since. Each worker only builds the rule base again when its digest
+    changes.
+    Args:    name (str): The name of the rule base.
+             digest (bytes): The digest of the version of the rules, see RuleBase.digest.
+             blob (bytes): The rule base, as serialized by cache.dump with that digest.
+             queries, engine: See solve.
+             facts (List[str]): The initial facts.
+    Returns: Dict[str, bool]: The value of each query, in order.
+    """
+    loaded = _worker_bases.get(name)
+    if loaded is None or loaded[0] != digest:
+        loaded = (digest, loads(blob, digest))
+        _worker_bases[name] = loaded
+    return solve(loaded[1], queries, facts, engine)
+
+
+class RuleBase:
+    """
+    A rule file served by the daemon.
+    Attributes:
+        name (str): The name requests refer to it by.
+        path (str): Path to the rule file.
+        modified (float): The modification time of the file when the version served was loaded.
+        checked (float): The modification time of the file when it was last read, valid or not.
+        knowledge_base (KnowledgeBase): The compiled rule base.
+        digest (bytes): The canonical hash of its rules, which keys its answers in the result cache.
+        blob (bytes): The rule base serialized by cache.dump, for the worker processes, or None while it has no more
+                      nodes than OFFLOAD_NODES.
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.modified = self.checked = os.stat(path).st_mtime
+        self.set(KnowledgeBase.from_file(path))
+
+    def set(self, knowledge_base: KnowledgeBase):
+        """
+        Serves a new version of the rules, with its digest and, for a large rule base, its serialized form.
+        """
+        self.knowledge_base = knowledge_base
+        self.digest = rules_digest(knowledge_base)
+        self.blob = dump(knowledge_base, self.digest) if len(knowledge_base.nodes) > OFFLOAD_NODES else None
+
+    def reload(self) -> bool:
+        """
+        Loads the file again if it changed since it was last read. A file that became invalid keeps being served in its
+        last valid version, by the event loop and the workers alike, and is not read again until it changes.
+        Returns: bool: True if the rule base was reloaded.
+        Raises:  ParseError: If the file changed but is no longer valid.
+        """
+        modified = os.stat(self.path).st_mtime
+        if modified == self.checked:
+            return False
+        self.checked = modified
+        knowledge_base = KnowledgeBase.from_file(self.path)
+        self.modified = modified
+        self.set(knowledge_base)
+        return True
+
+
+class Server:
+    """
+    Answers requests on rule bases loaded once, over a Unix-domain socket or a localhost TCP port.
+    Each request is one line of JSON: {"base": name, "facts": "AB" or ["Rain", ...], "queries": ..., "engine": ...,
+    "id": ...}, every field but base being optional; the reply is one line of JSON with the same id and either the
+    results or an error. A line that is not a JSON object, or is longer than the limit, has no id to read, so its reply
+    has "id": null. Small rule bases are solved right in the event loop, which avoids any hop to another thread or
+    process; larger ones are sent to a process pool, whose workers receive the rule base serialized by cache.dump and
+    keep it until its digest changes.
+    The answers are kept in a result cache keyed by the hash of the rules, the facts, the queries and the engine, so a
+    repeated request is answered without solving anything ("cached": true in the reply); a rule file that changes
+    gets another hash, so its old answers are never used again.
+    Attributes:
+        bases (Dict[str, RuleBase]): The served rule bases, by name.
+        pool (ProcessPoolExecutor): The worker pool for large rule bases.
+        results (ResultCache): The answers already given.
+        limit (int): The longest request line read, in bytes.
+    """
+
+    def __init__(self, bases: Dict[str, RuleBase], jobs: Optional[int] = None, cache_size: int = CAPACITY,
+                 limit: int = REQUEST_LIMIT):
+        self.bases = bases
+        self.pool = ProcessPoolExecutor(jobs)
+        self.results = ResultCache(cache_size)
+        self.limit = limit
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Serves the requests of a connection until it is closed.
+        """
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as error:
+                    # The last request may have no newline
+                    line = error.partial
+                    if not line:
+                        break
+                except asyncio.LimitOverrunError:
+                    line = None
+                if line is None:
+                    reply = {"id": None, "error": f"Error: Request longer than {self.limit} bytes."}
+                elif not line.strip():
+                    continue
+                else:
+                    try:
+                        reply = await self.answer(line)
+                    except Exception as error:
+                        # A request must never close the connection without a reply
+                        reply = {"error": f"Error: Cannot answer the request ({type(error).__name__}: {error})."}
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+                if line is None:
+                    await self.skip_line(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def skip_line(reader: asyncio.StreamReader):
+        """
+        Drops the rest of a request line longer than the limit, up to its newline.
+        Raises:  asyncio.IncompleteReadError: If the connection is closed first.
+        """
+        while True:
+            try:
+                await reader.readuntil(b"\n")
+                return
+            except asyncio.LimitOverrunError as error:
+                await reader.readexactly(error.consumed)
+
+    async def answer(self, line: bytes) -> dict:
+        """
+        Answers one request.
+        Args:    line (bytes): The request, a JSON object.
+        Returns: dict: The reply.
+        """
+        try:
+            request = json.loads(line.strip())
+        except ValueError as error:
+            return {"id": None, "error": f"Error: Invalid JSON ({error})."}
+        if not isinstance(request, dict):
+            return {"id": None, "error": "Error: A request must be a JSON object."}
+        reply = {"id": request.get("id")}
+        try:
+            name = request.get("base")
+            base = self.bases.get(name) if isinstance(name, str) else None
+            if base is None:
+                raise ValueError(f"Error: Unknown rule base ({request.get('base')}).")
+            knowledge_base = base.knowledge_base
+            facts = self.variables(request.get("facts"), "facts")
+            queries = self.variables(request.get("queries"), "queries")
+            if queries == []:
+                raise ValueError(f"Error: Invalid queries ({request.get('queries')}): a request must query a variable.")
+            if queries is None:
+                queries = knowledge_base.queries
+            engine = request.get("engine", "backward")
+            if engine not in ("backward", "forward", "scc", "propagate", "codegen"):
+                raise ValueError(f"Error: Unknown engine ({engine}).")
+            key = result_key(base.digest, knowledge_base.facts if facts is None else facts, queries, engine)
+            cached = self.results.get(key)
+            if cached is not None:
+                reply["results"] = cached["results"]
+                reply["cached"] = True
+                return reply
+            if base.blob is not None:
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(self.pool, solve_in_worker, base.name, base.digest, base.blob, queries,
+                                                     sorted(knowledge_base.facts) if facts is None else facts, engine)
+            else:
+                results = solve(knowledge_base, queries, facts, engine)
+            self.results.put(key, {"results": results})
+            reply["results"] = results
+        except (ValueError, OSError) as error:
+            reply["error"] = str(error)
+        return reply
+
+    @staticmethod
+    def variables(value, field: str) -> Optional[List[str]]:
+        """
+        Reads the facts or the queries of a request, written like in a file ("AB", "Rain Cold") or as a list of names.
+        Args:    value: The field of the request, or None.
+                 field (str): The name of the field, for the error message.
+        Returns: Optional[List[str]]: The variables, or None if the field is missing.
+        Raises:  ValueError: If the field is invalid.
+        """
+        if value is None:
+            return None
+        variables = split_variables(value) if isinstance(value, str) else None
+        if isinstance(value, list) and all(isinstance(name, str) and split_variables(name) == [name] for name in value):
+            variables = value
+        if variables is None:
+            raise ValueError(f"Error: Invalid {field} ({value}).")
+        return variables
+
+    async def watch(self, interval: float = RELOAD_INTERVAL):
+        """
+        Reloads the rule files that changed, every interval seconds.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for base in self.bases.values():
+                try:
+                    if base.reload():
+                        print(f"Reloaded {base.name} ({base.path}).", flush=True)
+                except (ParseError, OSError) as error:
+                    print(f"Cannot reload {base.name}: {error}", flush=True)
+
+    async def serve(self, socket_path: Optional[str] = None, port: Optional[int] = None):
+        """
+        Listens on a Unix-domain socket or on a localhost TCP port until cancelled.
+        """
+        if socket_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=socket_path, limit=self.limit)
+        else:
+            server = await asyncio.start_server(self.handle, host="127.0.0.1", port=port, limit=self.limit)
+        watcher = asyncio.ensure_future(self.watch())
+        print(f"Serving {', '.join(self.bases)} on {socket_path or f'127.0.0.1:{port}'}.", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.pool.shutdown(cancel_futures=True)
+
+
+def main():
+    """
+    Loads the rule files given on the command line and serves them until interrupted.
+    A rule file is named after its file name without extension, or as given with NAME=PATH.
+    """
+    parser = argparse.ArgumentParser(description="Answers queries on rule files loaded once, over a local socket.")
+    parser.add_argument("rule_files", nargs="+", metavar="[NAME=]PATH", help="The rule files to serve")
+    transport = parser.add_mutually_exclusive_group(required=True)
+    transport.add_argument("--socket", metavar="PATH", help="Listen on a Unix-domain socket", default=None)
+    transport.add_argument("--port", type=int, help="Listen on a localhost TCP port", default=None)
+    parser.add_argument("--jobs", type=int, metavar="N", help="Number of worker processes for large rule bases", default=None)
+    parser.add_argument("--cache-size", type=int, metavar="N", help="Number of answer sets kept in the result cache", default=CAPACITY)
+    parser.add_argument("--request-limit", type=int, metavar="BYTES", help="Longest request line read", default=REQUEST_LIMIT)
+    args = parser.parse_args()
+
+    bases = {}
+    for argument in args.rule_files:
+        name, _, path = argument.rpartition("=")
+        name = name or os.path.splitext(os.path.basename(path))[0]
+        try:
+            bases[name] = RuleBase(name, path)
+        except (ParseError, OSError) as error:
+            print(f"Cannot load {path}: {error}")
+            exit(1)
+
+    if args.socket is not None and os.path.exists(args.socket) and stat.S_ISSOCK(os.stat(args.socket).st_mode):
+        os.unlink(args.socket)
+    try:
+        asyncio.run(Server(bases, args.jobs, args.cache_size, args.request_limit).serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
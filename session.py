@@ -0,0 +1,424 @@
+import sys
+from typing import Dict, List, Optional, TextIO, Tuple
+import parse
+from parse import join_variables, split_variables
+from KnowledgeBase import KnowledgeBase
+from incremental import IncrementalSession
+
+HELP = """Commands:
+  A + B => C          Add a rule
+  =AB                 Set the initial facts
+  ?EF                 Answer queries now
+  assert A B          Make variables initial facts
+  retract A B         Make variables no longer initial facts
+  remove N | RULE     Remove a rule, by its number in show or its text
+  edit N RULE         Replace the rule of number N
+  show                List the rules, facts and queries
+  snapshot [NAME]     Record the current state (named after its number by default)
+  restore NAME        Go back to a recorded state
+  undo                Undo the last change
+  help                Show this help
+  quit                Leave the session"""
+
+
+class Snapshot:
+    """
+    A recorded state of a session. Recording one copies nothing: it only keeps the changes made since the snapshot it
+    was derived from, so the snapshots form a tree whose root is the loaded file, and the state of each one is
+    rebuilt by undoing and replaying the changes between it and the current state.
+    Attributes:
+        parent (Snapshot): The snapshot it was derived from, or None for the loaded file.
+        changes (Tuple[tuple, ...]): The commands applied since the parent, each a tuple of changes.
+        depth (int): The number of snapshots above it.
+    """
+    __slots__ = ("parent", "changes", "depth")
+
+    def __init__(self, parent: Optional["Snapshot"] = None, changes: Tuple[tuple, ...] = ()):
+        self.parent = parent
+        self.changes = changes
+        self.depth = 0 if parent is None else parent.depth + 1
+
+
+class Session:
+    """
+    Keeps a compiled rule base in memory while rules and facts are added, edited and removed, and answers queries
+    right away: every change goes through an IncrementalSession, which only solves again what depends on it.
+    A change is one of ("fact", variable, added) and ("rule", text, key, position, added), the key holding the compiled
+    rule (see compile_rule), and each command is recorded as the tuple of its changes, so it can be undone by applying
+    their inverses in reverse order without compiling anything again.
+    Attributes:
+        incremental (IncrementalSession): The rule base and the evaluation kept up to date.
+        rules (List[Tuple[str, tuple]]): The text of each rule, in order, with the key of its compiled form.
+        head (Snapshot): The snapshot the current state was derived from.
+        changes (List[Tuple[tuple, ...]]): The commands applied since head.
+        snapshots (Dict[str, Snapshot]): The recorded snapshots, by name.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase, rules: List[Tuple[str, tuple]]):
+        """
+        Starts a session on a rule base.
+        Args:    knowledge_base (KnowledgeBase): The rule base, which is copied; its nodes are shared.
+                 rules (List[Tuple[str, tuple]]): The text of its rules, in order, with their key (see compile_rule).
+        """
+        self.incremental = IncrementalSession(knowledge_base)
+        self.rules = rules
+        self.head = Snapshot()
+        self.changes: List[Tuple[tuple, ...]] = []
+        self.snapshots: Dict[str, Snapshot] = {}
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "Session":
+        """
+        Starts a session on a rule file.
+        Args:    file_path (str): Path to the file.
+        Returns: Session: The session.
+        Raises:  parse.ParseError: If the content is not a valid rule base.
+                 OSError: If the file cannot be read.
+        """
+        rules = []
+
+        def read_rule(rule, knowledge_base):
+            compiled = parse.load_rule(rule, knowledge_base)
+            rules.append((rule, ("<=>" in rule, tuple(compiled))))
+
+        knowledge_base = KnowledgeBase()
+        with open(file_path, "r") as file:
+            parse.validate_file(map(parse.parse_line, file), knowledge_base, read_rule)
+        return cls(knowledge_base, rules)
+
+    @property
+    def knowledge_base(self) -> KnowledgeBase:
+        """
+        Returns: KnowledgeBase: The current rule base, with its queries; its facts are the ones of the file.
+        """
+        return self.incremental.knowledge_base
+
+    @property
+    def facts(self) -> List[str]:
+        """
+        Returns: List[str]: The current initial facts, sorted.
+        """
+        return sorted(self.incremental.evaluation.facts)
+
+    def compile_rule(self, rule: str) -> tuple:
+        """
+        Compiles a rule into the rule base, without adding it, and gives its key, which identifies it by its compiled
+        form, so that "A+B=>C" and "A + B => C" are the same rule.
+        Args:    rule (str): The rule.
+        Returns: tuple: Whether it is written with '<=>', and its (conclusion, antecedent root) pairs.
+        Raises:  parse.ParseError: If the rule is invalid.
+        """
+        return "<=>" in rule, tuple(parse.compile_rule(rule, self.knowledge_base))
+
+    def rule_key(self, rule: str) -> tuple:
+        """
+        Finds the key of a rule (see compile_rule) without compiling it: its nodes are looked up in the rule base, not
+        added to it, and a rule with a node the rule base does not have gets None as antecedent, which no rule has.
+        Args:    rule (str): The rule.
+        Returns: tuple: The key of the rule.
+        Raises:  parse.ParseError: If the rule is invalid.
+        """
+        table = self.knowledge_base.node_table
+        antecedent, conclusions, relation = parse.parse_rule(rule, lambda name, left, right: table.get((name, left, right)))
+        return relation == "<=>", tuple((conclusion, antecedent) for conclusion in conclusions)
+
+    def rule_positions(self, key: tuple, position: int) -> List[int]:
+        """
+        Finds the index of a rule among the rules of each of its conclusions in the rule base, which keeps them in the
+        order of the session.
+        Args:    key (tuple): The key of the rule.
+                 position (int): Its position among the rules of the session.
+        Returns: List[int]: The index for each of its conclusions, in order.
+        """
+        counts = {conclusion: 0 for conclusion, _ in key[1]}
+        for _, (_, compiled) in self.rules[:position]:
+            for conclusion, _ in compiled:
+                if conclusion in counts:
+                    counts[conclusion] += 1
+        return [counts[conclusion] for conclusion, _ in key[1]]
+
+    def find_rule(self, reference: str) -> int:
+        """
+        Finds a rule from its number in show, or from its text.
+        Args:    reference (str): The number or the text of the rule.
+        Returns: int: The position of the rule.
+        Raises:  ValueError: If there is no such rule.
+        """
+        if reference.isdigit():
+            if not 1 <= int(reference) <= len(self.rules):
+                raise ValueError(f"Error: No rule number {reference}.")
+            return int(reference) - 1
+        key = self.rule_key(reference)
+        for position, (_, rule_key) in enumerate(self.rules):
+            if rule_key == key:
+                return position
+        raise ValueError(f"Error: No such rule ({reference}).")
+
+    def apply(self, change: tuple, inverse: bool = False):
+        """
+        Applies a change, or its inverse.
+        Args:    change (tuple): The change.
+                 inverse (bool, optional): Whether to undo it instead. Defaults to False.
+        """
+        if change[0] == "fact":
+            _, variable, added = change
+            if added != inverse:
+                self.incremental.assert_fact(variable)
+            else:
+                self.incremental.retract_fact(variable)
+        else:
+            _, rule, key, position, added = change
+            positions = self.rule_positions(key, position)
+            if added != inverse:
+                self.incremental.add_rule(rule, key[1], positions)
+                self.rules.insert(position, (rule, key))
+            else:
+                self.incremental.remove_rule(rule, key[1], positions)
+                del self.rules[position]
+
+    def update_first_reads(self):
+        """
+        Finds again the first reads of the variables (KnowledgeBase.first_reads) from the rules in their order, after
+        a command changed the rules. They only change answers on a cycle of the rules, so they are left as they are
+        while there is none, and found again once a rule makes one.
+        """
+        if not self.incremental.cyclic_variables():
+            return
+        first_reads, counts = {}, {}
+        for rule, (_, compiled) in self.rules:
+            first = compiled[0][0]
+            first_reads.update(parse.rule_first_reads(rule, list(compiled), counts.get(first, 0), (counts, first_reads)))
+            for conclusion, _ in compiled:
+                counts[conclusion] = counts.get(conclusion, 0) + 1
+        self.incremental.set_first_reads({variable: first_read for variable, first_read in first_reads.items()
+                                          if variable in counts})
+
+    def commit(self, changes: List[tuple]) -> Dict[str, bool]:
+        """
+        Applies the changes of a command and records it.
+        Args:    changes (List[tuple]): The changes, checked to be possible.
+        Returns: Dict[str, bool]: The new answer of every query of the rule base that changed.
+        """
+        before = dict(self.incremental.answers)
+        for change in changes:
+            self.apply(change)
+        self.update_first_reads()
+        if changes:
+            self.changes.append(tuple(changes))
+        return {query: answer for query, answer in self.incremental.answers.items() if before.get(query) != answer}
+
+    def add_rule(self, rule: str) -> Dict[str, bool]:
+        """
+        Adds a rule after the others.
+        Args:    rule (str): The rule, written like in a file.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        Raises:  parse.ParseError: If the rule is invalid.
+        """
+        return self.commit([("rule", rule, self.compile_rule(rule), len(self.rules), True)])
+
+    def remove_rule(self, reference: str) -> Dict[str, bool]:
+        """
+        Removes a rule.
+        Args:    reference (str): The number of the rule in show, or its text.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        Raises:  ValueError: If there is no such rule, or parse.ParseError if the text is not a valid rule.
+        """
+        position = self.find_rule(reference)
+        return self.commit([("rule", *self.rules[position], position, False)])
+
+    def edit_rule(self, reference: str, rule: str) -> Dict[str, bool]:
+        """
+        Replaces a rule, keeping its position; undo restores the previous rule.
+        Args:    reference (str): The number of the rule in show, or its text.
+                 rule (str): The new rule.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        Raises:  ValueError: If there is no such rule, or parse.ParseError if a rule is invalid.
+        """
+        position = self.find_rule(reference)
+        key = self.compile_rule(rule)
+        return self.commit([("rule", *self.rules[position], position, False), ("rule", rule, key, position, True)])
+
+    def set_facts(self, facts: List[str], replace: bool = True, added: bool = True) -> Dict[str, bool]:
+        """
+        Changes the initial facts.
+        Args:    facts (List[str]): The variables.
+                 replace (bool, optional): Whether they replace every initial fact. Defaults to True.
+                 added (bool, optional): Without replace, whether they are asserted or retracted. Defaults to True.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        """
+        current = self.incremental.evaluation.facts
+        if replace:
+            changes = [("fact", fact, False) for fact in sorted(current - set(facts))]
+            changes += [("fact", fact, True) for fact in dict.fromkeys(facts) if fact not in current]
+        else:
+            changes = [("fact", fact, added) for fact in dict.fromkeys(facts) if (fact in current) != added]
+        return self.commit(changes)
+
+    def answer(self, queries: List[str]) -> Dict[str, bool]:
+        """
+        Answers queries in the current state, reusing every value still valid. Queries that reach a cycle of the rules
+        are solved in a new evaluation instead, as the order they would be solved in would change the values kept.
+        Args:    queries (List[str]): The queried variables.
+        Returns: Dict[str, bool]: The value of each query, in order.
+        """
+        incremental = self.incremental
+        variables = incremental.knowledge_base.variables
+        if incremental.reaches_cycle(variables[query] for query in queries if query in variables):
+            return incremental.knowledge_base.solve(queries, incremental.evaluation.facts)
+        incremental.grow()
+        return {query: incremental.evaluation.solve(query) for query in queries}
+
+    def snapshot(self, name: Optional[str] = None) -> str:
+        """
+        Records the current state. It costs the length of the changes since the last snapshot, whatever the size of
+        the rule base.
+        Args:    name (str, optional): The name of the snapshot. Defaults to its number.
+        Returns: str: The name of the snapshot.
+        """
+        if self.changes:
+            self.head = Snapshot(self.head, tuple(self.changes))
+            self.changes = []
+        name = name or str(len(self.snapshots) + 1)
+        self.snapshots[name] = self.head
+        return name
+
+    def undo(self) -> Dict[str, bool]:
+        """
+        Undoes the last command, going back through the snapshots the current state was derived from.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        Raises:  ValueError: If there is nothing to undo.
+        """
+        if not self.changes:
+            if self.head.parent is None:
+                raise ValueError("Error: Nothing to undo.")
+            self.changes = list(self.head.changes)
+            self.head = self.head.parent
+        before = dict(self.incremental.answers)
+        for change in reversed(self.changes.pop()):
+            self.apply(change, inverse=True)
+        self.update_first_reads()
+        return {query: answer for query, answer in self.incremental.answers.items() if before.get(query) != answer}
+
+    def restore(self, name: str) -> Dict[str, bool]:
+        """
+        Goes back to a snapshot: the changes since the snapshot both states derive from are undone, and those leading
+        to the target are replayed. The changes since the last snapshot are lost unless one was recorded.
+        Args:    name (str): The name of the snapshot.
+        Returns: Dict[str, bool]: The new answer of every query that changed.
+        Raises:  ValueError: If there is no such snapshot.
+        """
+        target = self.snapshots.get(name)
+        if target is None:
+            raise ValueError(f"Error: No snapshot named '{name}'.")
+        before = dict(self.incremental.answers)
+        for command in reversed(self.changes):
+            for change in reversed(command):
+                self.apply(change, inverse=True)
+        self.changes = []
+
+        source, path = self.head, []
+        while source is not target:
+            if source.depth >= target.depth:
+                for command in reversed(source.changes):
+                    for change in reversed(command):
+                        self.apply(change, inverse=True)
+                source = source.parent
+            else:
+                path.append(target)
+                target = target.parent
+        for snapshot in reversed(path):
+            for command in snapshot.changes:
+                for change in command:
+                    self.apply(change)
+        self.update_first_reads()
+        self.head = self.snapshots[name]
+        return {query: answer for query, answer in self.incremental.answers.items() if before.get(query) != answer}
+
+    def show(self) -> str:
+        """
+        Returns: str: The numbered rules, then the facts and the queries, written like in a file.
+        """
+        lines = [f"{number}: {rule}" for number, (rule, _) in enumerate(self.rules, 1)]
+        lines.append("=" + join_variables(self.facts))
+        lines.append("?" + join_variables(self.knowledge_base.queries))
+        return "\n".join(lines)
+
+    def execute(self, line: str) -> Optional[str]:
+        """
+        Runs one command of a session.
+        Args:    line (str): The command.
+        Returns: Optional[str]: What to print, or None for nothing.
+        Raises:  ValueError: If the command is invalid or cannot be applied (parse.ParseError for an invalid rule).
+        """
+        line = line.split("#", 1)[0].strip()
+        command, _, argument = line.partition(" ")
+        argument = argument.strip()
+        if not line:
+            return None
+        if command == "help":
+            return HELP
+        if command == "show":
+            return self.show()
+        if command == "snapshot":
+            return f"Snapshot {self.snapshot(argument or None)}."
+        if command == "restore":
+            return format_answers(self.restore(argument))
+        if command == "undo":
+            return format_answers(self.undo())
+        if command == "remove":
+            return format_answers(self.remove_rule(argument))
+        if command == "edit":
+            reference, _, rule = argument.partition(" ")
+            return format_answers(self.edit_rule(reference, rule.strip()))
+        if command in ("assert", "retract"):
+            variables = split_variables(argument)
+            if not variables:
+                raise ValueError(f"Error: Invalid variables ({argument}).")
+            return format_answers(self.set_facts(variables, replace=False, added=command == "assert"))
+
+        line_type, content = parse.parse_line(line)
+        if line_type == "rule":
+            return format_answers(self.add_rule(content))
+        if line_type in ("fact", "query"):
+            variables = split_variables(content)
+            if variables is None or (line_type == "query" and not variables):
+                raise ValueError(f"Error: Invalid variables ({content}).")
+            if line_type == "fact":
+                return format_answers(self.set_facts(variables))
+            return format_answers(self.answer(variables))
+        raise ValueError(f"Error: Unknown command ({line}).")
+
+
+def format_answers(answers: Dict[str, bool]) -> Optional[str]:
+    """
+    Returns: Optional[str]: One "query: value" line per answer, or None if there is none.
+    """
+    return "\n".join(f"{query}: {value}" for query, value in answers.items()) or None
+
+
+def run_session(session: Session, stream: TextIO, output: TextIO = sys.stdout, prompt: bool = False) -> bool:
+    """
+    Runs the commands of a stream, one per line, until its end or a quit command. An invalid command prints its error
+    and the session goes on.
+    Args:    session (Session): The session.
+             stream (TextIO): The commands, such as stdin or a script.
+             output (TextIO, optional): Where the answers are printed. Defaults to stdout.
+             prompt (bool, optional): Whether to print a prompt before each command, for a terminal. Defaults to False.
+    Returns: bool: True if every command succeeded.
+    """
+    succeeded = True
+    while True:
+        if prompt:
+            output.write("> ")
+            output.flush()
+        line = stream.readline()
+        if not line or line.strip() in ("quit", "exit"):
+            return succeeded
+        try:
+            result = session.execute(line)
+        except ValueError as error:
+            result = str(error)
+            succeeded = False
+        if result is not None:
+            output.write(result + "\n")
+            output.flush()
@@ -0,0 +1,115 @@
+import json
+import time
+from contextlib import contextmanager
+from typing import Dict, TextIO
+from Rule import BEING_SOLVED
+
+
+class Stats:
+    """
+    Collects the counters of an instrumented solve, when they are requested with --stats. The counters are gathered
+    by a Profiler that Node.solve calls as its tracer, so an ordinary solve only checks that it has no tracer.
+    Attributes:
+        phases (Dict[str, float]): The wall time of each phase, in seconds.
+        queries (Dict[str, Dict[str, int]]): For each query, the nodes visited, the variables solved and the variables
+                                             whose value was already known, and the circular references met.
+        rules_tried (Dict[str, int]): The number of rules evaluated for each variable.
+    """
+
+    COUNTERS = ("visits", "variables_solved", "variables_cached", "circular")
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.queries: Dict[str, Dict[str, int]] = {}
+        self.rules_tried: Dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Times the code run in the with block, adding it to the wall time of a phase.
+        Args:    name (str): The name of the phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    def as_dict(self) -> dict:
+        """
+        Returns: dict: Every counter, with the totals over the queries.
+        """
+        totals = {counter: sum(query[counter] for query in self.queries.values()) for counter in self.COUNTERS}
+        return {"phases": self.phases, "totals": totals, "queries": self.queries, "rules_tried": self.rules_tried}
+
+    def write_text(self, stream: TextIO):
+        """
+        Writes the counters as a readable report.
+        Args:    stream (TextIO): The output stream.
+        """
+        write = stream.write
+        for name, seconds in self.phases.items():
+            write(f"{name + ' time':<24}{seconds * 1000:>12.3f} ms\n")
+        for query, counters in self.queries.items():
+            write(f"Query '{query}': " + ", ".join(f"{counter.replace('_', ' ')} {value}" for counter, value in counters.items()) + "\n")
+        busiest = sorted(self.rules_tried.items(), key=lambda item: -item[1])[:10]
+        if busiest:
+            write("Rules tried: " + ", ".join(f"{variable} {count}" for variable, count in busiest) + "\n")
+
+    def write_json(self, stream: TextIO):
+        """
+        Writes the counters as a single JSON object.
+        Args:    stream (TextIO): The output stream.
+        """
+        stream.write(json.dumps(self.as_dict()) + "\n")
+
+
+class Profiler:
+    """
+    Solves queries like Evaluation.solve while counting what the walk does, only when statistics are requested.
+    It follows Node.solve as its tracer, so the counters describe the walk of an ordinary solve.
+    Attributes:
+        evaluation (Evaluation): The evaluation whose values are found and reused.
+        stats (Stats): The statistics the counters are added to.
+        counters (Dict[str, int]): The counters of the query being solved.
+    """
+
+    def __init__(self, evaluation, stats: Stats):
+        self.evaluation = evaluation
+        self.stats = stats
+        self.counters: Dict[str, int] = {}
+
+    def solve(self, query: str) -> bool:
+        """
+        Solves a queried variable, counting the visits of the walk under the name of the query.
+        Args:    query (str): The queried variable.
+        Returns: bool: The value of the variable; False if the rule base knows nothing about it.
+        """
+        self.counters = self.stats.queries.setdefault(query, dict.fromkeys(Stats.COUNTERS, 0))
+        root = self.evaluation.knowledge_base.variables.get(query)
+        if root is None:
+            return query in self.evaluation.facts
+        return root.solve(self.evaluation, self)
+
+    def enter(self, node, value):
+        """
+        Counts a node reached by the walk, see Node.solve.
+        Args:    node (Node): The node.
+                 value: Its value when it was reached.
+        """
+        counters = self.counters
+        counters["visits"] += 1
+        if value is None:
+            if node.type == "VARIABLE":
+                rules_tried = self.stats.rules_tried
+                counters["variables_solved"] += 1
+                rules_tried[node.name] = rules_tried.get(node.name, 0) + len(self.evaluation.rules.get(node.name, ()))
+        elif value is BEING_SOLVED:
+            counters["circular"] += 1
+        elif node.type == "VARIABLE":
+            counters["variables_cached"] += 1
+
+    def leave(self, node, value):
+        """
+        Nothing is counted when a node is solved, see Node.solve.
+        """
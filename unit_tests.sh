@@ -6,6 +6,10 @@ TEST_ERROR_FOLDER="./unit_tests/test_error_cases"
 TEST_MANDATORY_FOLDER="./unit_tests/test_mandatory_cases"
 TEST_EXPECTED_FOLDER="./unit_tests/test_expected_output"
 TEST_OPTIONNAL_FOLDER="./unit_tests/test_optionnal_cases"
+TEST_SESSION_FOLDER="./unit_tests/test_session_cases"
+TEST_CYCLE_FOLDER="./unit_tests/test_cycle_cases"
+TEST_SERVER_FOLDER="./unit_tests/test_server_cases"
+TEST_PROPAGATE_FOLDER="./unit_tests/test_propagate_cases"
 
 # Couleurs
 RED='\033[0;31m'
@@ -13,7 +17,7 @@ GREEN='\033[0;32m'
 BLUE='\033[0;34m'
 NO_COLOR='\033[0m'
 
-echo -e "${BLUE}You can run this program with the options 'errors', 'optional', 'mandatory', or 'all'.${NO_COLOR}"
+echo -e "${BLUE}You can run this program with the options 'errors', 'optional', 'mandatory', 'cycles', 'propagate', 'session', 'server', 'regression', or 'all'.${NO_COLOR}"
 echo ""
 
 compare_output() {
@@ -36,15 +40,24 @@ compare_output() {
 
 error_tests() {
     for test_file in $TEST_ERROR_FOLDER/*.txt; do
+        test_case=$(basename "$test_file")
         echo "Testing $test_case..."
-        python3 $PYTHON_SCRIPT "$test_file"
+        python3 $PYTHON_SCRIPT "$test_file" > temp_output.txt
         if [ $? -eq 1 ]; then
             echo -e "${GREEN}Test Passed${NO_COLOR}"
+            # The cases with an expected output also check the messages, their lines and columns
+            if [ -f "${TEST_EXPECTED_FOLDER}/${test_case}" ]; then
+                compare_output "${TEST_EXPECTED_FOLDER}/${test_case}" "temp_output.txt"
+            else
+                cat temp_output.txt
+            fi
         else
+            cat temp_output.txt
             echo -e "${RED}Test Failed${NO_COLOR}"
         fi
         echo ""
     done
+    rm -f temp_output.txt temp_expected_output.txt temp_actual_output.txt
 }
 
 optional_tests() {
@@ -61,7 +74,7 @@ optional_tests() {
 }
 
 mandatory_tests() {
-    for test_file in $TEST_MANDATORY_FOLDER/*.txt; do
+    for test_file in ${1:-$TEST_MANDATORY_FOLDER}/*.txt; do
         echo "----------------------------------------"
         test_case=$(basename "$test_file")
         echo "Testing $test_case..."
@@ -76,6 +89,71 @@ mandatory_tests() {
     rm temp_output.txt temp_expected_output.txt temp_actual_output.txt
 }
 
+propagate_tests() {
+    for test_file in $TEST_PROPAGATE_FOLDER/*.txt; do
+        echo "----------------------------------------"
+        test_case=$(basename "$test_file")
+        echo "Testing $test_case..."
+        split=""
+        if [[ "$test_case" == *_split.txt ]]; then
+            split="--split"
+        fi
+        python3 $PYTHON_SCRIPT "$test_file" --engine propagate $split > temp_output.txt
+
+        if [ $? -eq 0 ]; then
+            compare_output "${TEST_EXPECTED_FOLDER}/${test_case}" "temp_output.txt"
+        else
+            echo -e "${RED}Test Failed${NO_COLOR}"
+        fi
+    done
+    rm temp_output.txt temp_expected_output.txt temp_actual_output.txt
+}
+
+session_tests() {
+    for test_file in $TEST_SESSION_FOLDER/*.txt; do
+        echo "----------------------------------------"
+        test_case=$(basename "$test_file")
+        echo "Testing $test_case..."
+        python3 $PYTHON_SCRIPT "$test_file" --session < "${test_file%.txt}.commands" > temp_output.txt
+
+        if [ $? -eq 0 ]; then
+            compare_output "${TEST_EXPECTED_FOLDER}/${test_case}" "temp_output.txt"
+        else
+            echo -e "${RED}Test Failed${NO_COLOR}"
+        fi
+    done
+    rm temp_output.txt temp_expected_output.txt temp_actual_output.txt
+}
+
+server_tests() {
+    for test_file in $TEST_SERVER_FOLDER/*.txt; do
+        echo "----------------------------------------"
+        test_case=$(basename "$test_file")
+        echo "Testing $test_case..."
+        python3 unit_tests/server_client.py "$test_file" < "${test_file%.txt}.requests" > temp_output.txt
+
+        if [ $? -eq 0 ]; then
+            compare_output "${TEST_EXPECTED_FOLDER}/${test_case}" "temp_output.txt"
+        else
+            echo -e "${RED}Test Failed${NO_COLOR}"
+        fi
+    done
+    rm temp_output.txt temp_expected_output.txt temp_actual_output.txt
+}
+
+regression_tests() {
+    for engine in backward forward scc codegen vm; do
+        echo "----------------------------------------"
+        echo "Testing regression.py with the $engine engine..."
+        python3 regression.py all --engine $engine --failures-only
+        if [ $? -eq 0 ]; then
+            echo -e "${GREEN}Test Passed${NO_COLOR}"
+        else
+            echo -e "${RED}Test Failed${NO_COLOR}"
+        fi
+    done
+}
+
 case "$1" in
     errors)
         error_tests
@@ -86,9 +164,29 @@ case "$1" in
     mandatory)
         mandatory_tests
         ;;
+    cycles)
+        mandatory_tests "$TEST_CYCLE_FOLDER"
+        ;;
+    propagate)
+        propagate_tests
+        ;;
+    session)
+        session_tests
+        ;;
+    server)
+        server_tests
+        ;;
+    regression)
+        regression_tests
+        ;;
     all)
         error_tests
         mandatory_tests
+        mandatory_tests "$TEST_CYCLE_FOLDER"
+        propagate_tests
+        session_tests
+        server_tests
+        regression_tests
         optional_tests
         ;;
     *)
@@ -0,0 +1,55 @@
+"""
+Starts server.py in this process on a temporary Unix-domain socket, sends it the request lines read from stdin over a
+single connection, and prints each reply, for unit_tests.sh. The requests are limited to LIMIT bytes, so a long line
+fits in a test file.
+Usage: python3 unit_tests/server_client.py RULE_FILE < REQUESTS
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from server import RuleBase, Server
+
+LIMIT = 256
+
+
+async def round_trip(rule_file: str, requests: list) -> list:
+    """
+    Serves a rule file and sends it requests, one line each, waiting for the reply to each one before the next.
+    Args:    rule_file (str): The rule file, served under its file name without extension.
+             requests (list): The request lines, as bytes without newline.
+    Returns: list: The reply lines, as str.
+    """
+    name = os.path.splitext(os.path.basename(rule_file))[0]
+    server = Server({name: RuleBase(name, rule_file)}, jobs=1, limit=LIMIT)
+    replies = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "server.sock")
+        serving = asyncio.ensure_future(server.serve(socket_path=path))
+        while not os.path.exists(path):
+            await asyncio.sleep(0.01)
+        reader, writer = await asyncio.open_unix_connection(path)
+        for request in requests:
+            writer.write(request + b"\n")
+            await writer.drain()
+            replies.append((await reader.readline()).decode().rstrip("\n"))
+        writer.close()
+        serving.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await serving
+    return replies
+
+
+def main():
+    requests = [line.rstrip(b"\n") for line in sys.stdin.buffer]
+    with contextlib.redirect_stdout(io.StringIO()):
+        replies = asyncio.run(round_trip(sys.argv[1], requests))
+    print("\n".join(replies))
+
+
+if __name__ == "__main__":
+    main()